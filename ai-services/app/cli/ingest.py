@@ -0,0 +1,99 @@
+"""
+Ingiere un archivo de texto, CSV o JSONL en el índice del RAG.
+
+Por defecto envía el archivo en streaming a POST /api/ingest de la app en ejecución, así el
+índice en uso se actualiza sin reiniciar. Con --local corre la ingesta en este proceso
+(la app debe estar detenida; la próxima vez que arranque verá los documentos nuevos).
+
+Uso (desde ai-services/):
+    python -m app.cli.ingest "../tipos de chains langchain/Data.csv"
+    python -m app.cli.ingest notas.txt --url http://127.0.0.1:8000
+    python -m app.cli.ingest reseñas.jsonl --local --tamano 400 --solapamiento 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+READ_SIZE = 64 * 1024
+# Cada cuánto se consulta el progreso de una ingesta remota (segundos)
+POLL_INTERVAL = 1.0
+
+
+def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+async def aread_chunks(path: str):
+    for chunk in read_chunks(path):
+        yield chunk
+
+
+def ingest_remote(args) -> dict:
+    params = {"filename": os.path.basename(args.archivo)}
+    if args.formato:
+        params["format"] = args.formato
+    if args.columnas:
+        params["text_columns"] = args.columnas
+    if args.tamano is not None:
+        params["chunk_size"] = args.tamano
+    if args.solapamiento is not None:
+        params["chunk_overlap"] = args.solapamiento
+    response = httpx.post(
+        f"{args.url}/api/ingest", params=params, content=read_chunks(args.archivo), timeout=None
+    )
+    if response.is_error:
+        raise SystemExit(f"Error {response.status_code}: {response.text}")
+    # 202: el archivo se recibió y la ingesta sigue en la app; se sigue su progreso en Location
+    job = response.json()
+    while job["status"] in ("uploading", "running"):
+        print(f"{job['status']}: {job['chunks']} fragmentos, {job['bytes']}/{job['size']} bytes", flush=True)
+        time.sleep(POLL_INTERVAL)
+        job = httpx.get(response.headers["location"]).raise_for_status().json()
+    if job["status"] == "failed":
+        raise SystemExit(f"Falló la ingesta: {job['error']}")
+    return job
+
+
+async def ingest_local(args) -> dict:
+    from app.services.ingestion import IngestionService, detect_format
+    from app.services.ollama_service import OllamaService
+
+    await OllamaService._load_retriever()
+    fmt = args.formato or detect_format(args.archivo)
+    columns = args.columnas.split(",") if args.columnas else None
+    job = await IngestionService.ingest(
+        aread_chunks(args.archivo), os.path.basename(args.archivo), fmt, columns, args.tamano, args.solapamiento
+    )
+    return job.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivo")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--formato", choices=["text", "csv", "jsonl"])
+    parser.add_argument("--columnas", help="columnas del CSV que forman el texto, separadas por coma")
+    parser.add_argument("--local", action="store_true", help="ingerir en este proceso sin pasar por la API")
+    parser.add_argument("--tamano", type=int, help="caracteres por fragmento (por defecto INGEST_CHUNK_SIZE)")
+    parser.add_argument("--solapamiento", type=int, help="caracteres de solapamiento (por defecto INGEST_CHUNK_OVERLAP)")
+    args = parser.parse_args()
+    if args.tamano is not None and args.tamano <= 0:
+        parser.error("--tamano debe ser mayor que 0")
+    if args.solapamiento is not None and args.solapamiento < 0:
+        parser.error("--solapamiento no puede ser negativo")
+    if args.tamano is not None and args.solapamiento is not None and args.solapamiento >= args.tamano:
+        parser.error("--solapamiento debe ser menor que --tamano")
+
+    result = asyncio.run(ingest_local(args)) if args.local else ingest_remote(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Resume las trazas por etapa (data/traces.jsonl y sus archivos rotados) para ver dónde se va el tiempo.
+
+Por cada ruta muestra, para cada etapa (embed_query, retrieval, prompt_format, queue_wait,
+llm, ...), cuántas veces aparece, p50/p95 y qué porcentaje del tiempo total de la petición
+representa. Con --lentas lista además las peticiones más lentas con su desglose.
+
+Uso (desde ai-services/):
+    python -m app.cli.traces
+    python -m app.cli.traces --ruta /api/request-with-langchain --lentas 5
+    python -m app.cli.traces --archivo /var/log/ai/traces.jsonl --ultimos-min 30
+"""
+
+import argparse
+import glob
+import json
+import time
+
+from app.config import settings
+
+
+def trace_files(path: str) -> list:
+    """Archivos de trazas del más viejo al más nuevo: traces.jsonl.N, ..., .2, .1 y traces.jsonl."""
+    rotated = [name for name in glob.glob(f"{glob.escape(path)}.*") if name.rpartition(".")[2].isdigit()]
+    # Por el número y no como texto, que pondría .10 antes que .2
+    return sorted(rotated, key=lambda name: int(name.rpartition(".")[2]), reverse=True) + [path]
+
+
+def read_traces(path: str, route: str = None, since: float = None):
+    for name in trace_files(path):
+        try:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    trace = json.loads(line)
+                    if route and trace["route"] != route:
+                        continue
+                    if since and trace["ts"] < since:
+                        continue
+                    yield trace
+        except FileNotFoundError:
+            continue
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def summarize(traces: list) -> dict:
+    """{ruta: {"requests": n, "total_ms": [...], "stages": {etapa: [ms, ...]}}}"""
+    routes = {}
+    for trace in traces:
+        summary = routes.setdefault(trace["route"], {"requests": 0, "total_ms": [], "stages": {}})
+        summary["requests"] += 1
+        summary["total_ms"].append(trace["ms"])
+        for span in trace["spans"]:
+            summary["stages"].setdefault(span["name"], []).append(span["ms"])
+    return routes
+
+
+def print_summary(routes: dict):
+    for route, summary in sorted(routes.items(), key=lambda item: -sum(item[1]["total_ms"])):
+        total = sum(summary["total_ms"])
+        print(
+            f"\n{route}  ({summary['requests']} peticiones, p50 {percentile(summary['total_ms'], 50):.1f} ms, "
+            f"p95 {percentile(summary['total_ms'], 95):.1f} ms)"
+        )
+        print(f"  {'etapa':<22}{'n':>7}{'p50 ms':>11}{'p95 ms':>11}{'% del total':>13}")
+        for stage, values in sorted(summary["stages"].items(), key=lambda item: -sum(item[1])):
+            share = sum(values) / total * 100 if total else 0.0
+            print(f"  {stage:<22}{len(values):>7}{percentile(values, 50):>11.1f}{percentile(values, 95):>11.1f}{share:>12.1f}%")
+
+
+def print_slowest(traces: list, count: int):
+    print("\nPeticiones más lentas:")
+    for trace in sorted(traces, key=lambda t: -t["ms"])[:count]:
+        stages = ", ".join(f"{s['name']} {s['ms']:.0f}" for s in sorted(trace["spans"], key=lambda s: s["start_ms"]))
+        print(f"  {trace['ms']:>9.1f} ms  {trace['request_id']}  {trace['route']}  [{stages}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo", default=settings.TRACE_PATH)
+    parser.add_argument("--ruta", help="solo esta ruta (ej. /api/request-with-langchain)")
+    parser.add_argument("--ultimos-min", type=float, help="solo las trazas de los últimos N minutos")
+    parser.add_argument("--lentas", type=int, default=0, help="listar las N peticiones más lentas")
+    args = parser.parse_args()
+
+    since = time.time() - args.ultimos_min * 60 if args.ultimos_min else None
+    traces = list(read_traces(args.archivo, args.ruta, since))
+    if not traces:
+        raise SystemExit(f"No hay trazas en {args.archivo}")
+    print_summary(summarize(traces))
+    if args.lentas:
+        print_slowest(traces, args.lentas)
+
+
+if __name__ == "__main__":
+    main()
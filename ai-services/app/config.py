@@ -3,7 +3,132 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OLLAMA_API_URL: str = "http://localhost:11434"  # Cambiar a tu servidor local
+    # Varios servidores de Ollama (ej. OLLAMA_API_URLS='["http://gpu1:11434", "http://gpu2:11434"]');
+    # vacío = solo OLLAMA_API_URL
+    OLLAMA_API_URLS: list[str] = []
+    # Sondeo de salud de cada backend (segundos; 0 = sin sondeos) y errores seguidos que abren su circuit breaker
+    OLLAMA_HEALTH_INTERVAL: float = 10.0
+    OLLAMA_MAX_FAILURES: int = 3
     # OLLAMA_API_KEY no es necesaria para el modelo local
     # OLLAMA_API_KEY: str = None
 
-settings = Settings()
\ No newline at end of file
+    # Pool de conexiones keep-alive compartido por toda la aplicación
+    OLLAMA_MAX_CONNECTIONS: int = 100
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OLLAMA_KEEPALIVE_EXPIRY: float = 30.0  # segundos que una conexión ociosa queda abierta
+
+    # Timeouts (segundos). La lectura es larga porque una generación puede tardar minutos
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_READ_TIMEOUT: float = 300.0
+    OLLAMA_WRITE_TIMEOUT: float = 30.0
+    OLLAMA_POOL_TIMEOUT: float = 30.0  # espera máxima por una conexión libre del pool
+
+    # Resiliencia: plazo por llamada en segundos (por ruta en OLLAMA_DEADLINES; en los streams
+    # cuenta hasta el primer token; 0 = sin plazo), reintentos de errores de conexión con backoff
+    # exponencial con jitter (base y tope en ms) limitados a OLLAMA_RETRY_BUDGET llamadas extra por
+    # petición, duplicado opcional hacia otro backend tras el p95 de la ruta (hedging), y
+    # enfriamiento del circuit breaker (segundos; se duplica en cada prueba fallida hasta el máximo)
+    OLLAMA_DEADLINE: float = 120.0
+    OLLAMA_DEADLINES: dict[str, float] = {}
+    OLLAMA_RETRIES: int = 2
+    OLLAMA_RETRY_BASE_MS: float = 100.0
+    OLLAMA_RETRY_MAX_MS: float = 2000.0
+    OLLAMA_RETRY_BUDGET: float = 0.1
+    OLLAMA_HEDGE: bool = False
+    OLLAMA_HEDGE_MIN_DELAY_MS: float = 100.0
+    OLLAMA_BREAKER_COOLDOWN: float = 5.0
+    OLLAMA_BREAKER_MAX_COOLDOWN: float = 60.0
+
+    # Índice de vectores del RAG (archivos <ruta>.f32/.txt/.off/.json, abiertos con mmap)
+    EMBEDDING_MODEL: str = "llama3.2:latest"
+    VECTOR_INDEX_PATH: str = "data/vector_index"
+
+    # Segmento del índice donde se agregan los documentos de la API de ingesta
+    INGEST_INDEX_PATH: str = "data/ingested"
+    # Ingesta: tamaño de cada fragmento (caracteres), solapamiento y fragmentos por lote de embeddings
+    INGEST_CHUNK_SIZE: int = 800
+    INGEST_CHUNK_OVERLAP: int = 100
+    INGEST_BATCH_SIZE: int = 64
+
+    # Recuperación: documentos por consulta y, desde RETRIEVAL_ANN_THRESHOLD vectores, índice
+    # aproximado IVF que revisa RETRIEVAL_ANN_NPROBE listas por consulta
+    RETRIEVAL_K: int = 4
+    RETRIEVAL_ANN_THRESHOLD: int = 100_000
+    RETRIEVAL_ANN_NPROBE: int = 16
+
+    # Caché de embeddings: LRU en memoria + SQLite opcional (cadena vacía = solo memoria)
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite"
+
+    # Micro-lotes de embeddings: se espera hasta EMBEDDING_BATCH_WAIT_MS o EMBEDDING_BATCH_SIZE textos
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0
+
+    # Caché de respuestas exactas: LRU con TTL (segundos) + SQLite opcional
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_TTL: float = 3600
+    RESPONSE_CACHE_PATH: str = "data/response_cache.sqlite"
+
+    # Caché semántica: similitud coseno mínima para reutilizar una respuesta, por defecto y por
+    # ruta (ej. SEMANTIC_CACHE_THRESHOLDS='{"request-with-langchain": 0.95}'), y entradas por ruta
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_THRESHOLDS: dict[str, float] = {}
+    SEMANTIC_CACHE_SIZE: int = 1000
+
+    # Single-flight: peticiones idénticas simultáneas (misma ruta, modelo y prompt salvo espacios) de
+    # las rutas sin historial comparten una sola recuperación y generación, también en streaming
+    SINGLE_FLIGHT: bool = True
+
+    # Streams SSE: tokens seguidos que se juntan en un solo evento, hasta STREAM_COALESCE_MS desde
+    # el último evento enviado o STREAM_COALESCE_CHARS caracteres (0 = un evento por token)
+    STREAM_COALESCE_MS: int = 0
+    STREAM_COALESCE_CHARS: int = 256
+
+    # Control de admisión: generaciones simultáneas por backend de Ollama, peticiones en espera antes de
+    # responder 429, y prioridad por ruta (número menor = se atiende antes; sin valor = 5)
+    SCHEDULER_MAX_INFLIGHT: int = 4
+    SCHEDULER_MAX_QUEUE: int = 64
+    SCHEDULER_PRIORITIES: dict[str, int] = {
+        "request-with-langchain": 1,
+        "chat-langchain": 1,
+        "simple-request": 2,
+        "request-with-history": 2,
+    }
+
+    # Sesiones de /request-with-history: presupuesto de tokens por turno (persona + resumen +
+    # historial + pregunta), largo máximo del resumen de los turnos viejos (SESSION_SUMMARIZE=false
+    # los descarta sin resumir), sesiones en memoria, expiración (segundos) y SQLite opcional
+    SESSION_TOKEN_BUDGET: int = 2048
+    SESSION_SUMMARIZE: bool = True
+    SESSION_SUMMARY_TOKENS: int = 256
+    SESSION_MAX: int = 10000
+    SESSION_TTL: float = 86400
+    SESSION_PATH: str = "data/sessions.sqlite"
+
+    # Residencia de modelos: modelos a precargar en cada backend (vacío = el de chat y el de
+    # embeddings), keep_alive en segundos dentro y fuera del horario laboral (-1 = siempre
+    # cargado) y cada cuántos segundos el keeper renueva la carga en horario laboral
+    RESIDENCY_MODELS: list[str] = []
+    RESIDENCY_KEEP_ALIVE: int = 3600
+    RESIDENCY_IDLE_KEEP_ALIVE: int = 300
+    RESIDENCY_START_HOUR: int = 8
+    RESIDENCY_END_HOUR: int = 20
+    RESIDENCY_WEEKDAYS: list[int] = [0, 1, 2, 3, 4]  # lunes = 0
+    RESIDENCY_INTERVAL: float = 120
+
+    # Trazas por etapa: fracción de peticiones muestreadas (0 = ninguna; el encabezado X-Trace: 1
+    # fuerza una), archivo JSONL y su rotación (bytes por archivo, archivos viejos que se conservan)
+    TRACE_SAMPLE_RATE: float = 0.05
+    TRACE_PATH: str = "data/traces.jsonl"
+    TRACE_MAX_BYTES: int = 10_000_000
+    TRACE_BACKUPS: int = 5
+
+    # /api/batch: ítems por lote y máximo de ítems en curso a la vez por lote
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_MAX_CONCURRENCY: int = 32
+
+    @property
+    def ollama_urls(self) -> list[str]:
+        return self.OLLAMA_API_URLS or [self.OLLAMA_API_URL]
+
+settings = Settings()
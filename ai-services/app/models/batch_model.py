@@ -0,0 +1,25 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from app.models.request_model import QueryRequest
+
+# Rutas que se pueden usar como destino de un lote
+BatchRoute = Literal["simple-request", "request-with-history", "request-with-langchain", "chat-langchain"]
+
+class BatchRequest(BaseModel):
+    items: List[QueryRequest] = Field(..., min_length=1)
+    route: BatchRoute = "simple-request"
+    # Ítems del lote en curso a la vez (además, cada uno pasa por el control de admisión)
+    concurrency: int = Field(8, ge=1)
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[str] = None
+    # Si el ítem falló: mensaje y código HTTP que habría devuelto la ruta
+    error: Optional[str] = None
+    status: int = 200
+    elapsed_ms: float
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+    errors: int
+    elapsed_ms: float
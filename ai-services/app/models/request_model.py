@@ -1,4 +1,7 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class QueryRequest(BaseModel):
-    prompt: str
\ No newline at end of file
+    prompt: str
+    # Solo /request-with-history: id de la conversación; sin él se abre una sesión nueva
+    session_id: Optional[str] = None
@@ -1,4 +1,11 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class QueryResponse(BaseModel):
-    result: str
\ No newline at end of file
+    result: str
+
+class ChatResponse(QueryResponse):
+    session_id: str
+    # Tokens enviados en este turno: estimados al armar el prompt y los que contó Ollama
+    prompt_tokens: int
+    prompt_eval_count: Optional[int] = None
@@ -0,0 +1,47 @@
+from typing import Optional
+from fastapi import APIRouter
+from app.services.ollama_service import OllamaService
+
+
+router = APIRouter()
+
+@router.get("/cache")
+def cache_stats():
+    return {
+        "responses": OllamaService.response_cache.stats(),
+        "semantic": OllamaService.semantic_cache.stats(),
+        "embeddings": OllamaService.embeddings.stats(),
+    }
+
+@router.delete("/cache")
+def purge_cache(route: Optional[str] = None):
+    """Borra las cachés de respuestas completas, o solo las de una ruta (ej. request-with-langchain)."""
+    return {
+        "purged": OllamaService.response_cache.purge(route),
+        "purged_semantic": OllamaService.semantic_cache.purge(route),
+    }
+
+@router.get("/embedding-batches")
+def embedding_batches():
+    """Histograma de tamaños de los micro-lotes enviados a /api/embed."""
+    return OllamaService.embeddings.embeddings.stats()
+
+@router.get("/single-flight")
+def single_flight():
+    """Llamadas compartidas en curso y peticiones que se sumaron a una idéntica, por ruta."""
+    return OllamaService.single_flight.stats()
+
+@router.get("/scheduler")
+def scheduler_stats():
+    """Generaciones en curso, en cola y rechazadas por el control de admisión."""
+    return OllamaService.scheduler.stats()
+
+@router.get("/backends")
+def backends():
+    """Estado de cada servidor de Ollama del pool: salud, peticiones en curso y modelos cargados."""
+    return OllamaService.pool.stats()
+
+@router.get("/residency")
+def residency():
+    """Modelos precargados, keep_alive vigente y arranques en frío observados."""
+    return OllamaService.residency.stats()
@@ -0,0 +1,38 @@
+import time
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.models.batch_model import BatchRequest, BatchResponse
+from app.services.batch_service import BatchService
+
+
+router = APIRouter()
+
+def _validate(batch: BatchRequest):
+    try:
+        BatchService.validate(batch)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(batch: BatchRequest):
+    """Ejecuta todos los ítems contra `route` y devuelve los resultados en el orden de entrada."""
+    _validate(batch)
+    started = time.perf_counter()
+    results = [result async for result in BatchService.run(batch)]
+    results.sort(key=lambda r: r.index)
+    return BatchResponse(
+        results=results,
+        errors=sum(r.error is not None for r in results),
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+@router.post("/batch/stream")
+async def run_batch_stream(batch: BatchRequest):
+    """Igual que /batch, pero envía cada resultado como una línea NDJSON apenas termina (con su `index`)."""
+    _validate(batch)
+
+    async def lines():
+        async for result in BatchService.run(batch):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.ollama_service import OllamaService
+
+
+router = APIRouter()
+
+@router.get("/ready")
+def readiness():
+    """200 cuando las cadenas están construidas y precalentadas; 503 mientras dura el warmup."""
+    status = OllamaService.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -0,0 +1,52 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from app.services.ingestion import FORMATS, IngestionService, detect_format
+
+
+router = APIRouter()
+
+@router.post("/ingest")
+async def ingest(
+    request: Request,
+    filename: str = "upload",
+    format: Optional[str] = None,
+    text_columns: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+):
+    """
+    Ingiere el cuerpo de la petición (texto, CSV o JSONL) en el índice del RAG. Responde 202 con
+    el trabajo apenas termina de recibir el archivo; la ingesta sigue en segundo plano y su
+    progreso se consulta en la URL del encabezado Location. El formato se deduce de `filename` o
+    del Content-Type si no se indica; `text_columns` (separadas por coma) elige qué columnas de
+    un CSV forman el texto. `chunk_size` y `chunk_overlap` reemplazan INGEST_CHUNK_SIZE e
+    INGEST_CHUNK_OVERLAP (se necesita 0 <= chunk_overlap < chunk_size).
+    """
+    fmt = format or detect_format(filename, request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {fmt}")
+    columns = text_columns.split(",") if text_columns else None
+    try:
+        IngestionService.chunker(chunk_size, chunk_overlap)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = await IngestionService.submit(request.stream(), filename, fmt, columns, chunk_size, chunk_overlap)
+    return JSONResponse(
+        job.to_dict(),
+        status_code=202,
+        headers={"Location": str(request.url_for("get_job", job_id=job.id))},
+    )
+
+@router.get("/ingest/jobs")
+def list_jobs():
+    return [job.to_dict() for job in IngestionService.jobs.values()]
+
+@router.get("/ingest/jobs/{job_id}")
+@router.get("/ingest/{job_id}")
+def get_job(job_id: str):
+    """Progreso de una ingesta (también mientras está corriendo)."""
+    job = IngestionService.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingesta no encontrada")
+    return job.to_dict()
@@ -1,30 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException
-import requests
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.models.request_model import QueryRequest
-from app.models.response_model import QueryResponse
+from app.models.response_model import ChatResponse, QueryResponse
+from app.services.backend_pool import UPSTREAM_ERRORS
+from app.services.ndjson import TokenCoalescer
 from app.services.ollama_service import OllamaService
 
 
 router = APIRouter()
 
+
+async def _coalesce_tokens(events):
+    """Junta eventos {"token": ...} seguidos según STREAM_COALESCE_MS / STREAM_COALESCE_CHARS."""
+    if not settings.STREAM_COALESCE_MS:
+        async for event in events:
+            yield event
+        return
+    coalescer = TokenCoalescer(settings.STREAM_COALESCE_MS / 1000, settings.STREAM_COALESCE_CHARS)
+    try:
+        async for event in events:
+            if "token" in event:
+                text = coalescer.add(event["token"])
+                if text is not None:
+                    yield {"token": text}
+                continue
+            text = coalescer.flush()
+            if text is not None:
+                yield {"token": text}
+            yield event
+    except Exception:
+        # Si el stream se corta con un error, los tokens retenidos salen antes del evento de error
+        text = coalescer.flush()
+        if text is not None:
+            yield {"token": text}
+        raise
+    text = coalescer.flush()
+    if text is not None:
+        yield {"token": text}
+
+
+async def _sse(events):
+    """Convierte los eventos del servicio a Server-Sent Events (event: token | done | error)."""
+    try:
+        async for event in _coalesce_tokens(events):
+            name, data = next(iter(event.items()))
+            payload = data if isinstance(data, dict) else {name: data}
+            yield f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    except UPSTREAM_ERRORS as e:
+        # Los encabezados ya se enviaron: el error se informa como un evento más
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+
+async def _ndjson(lines):
+    try:
+        async for line in lines:
+            yield line
+    except UPSTREAM_ERRORS as e:
+        # Mismo formato que usa Ollama para informar un error en medio del stream
+        yield json.dumps({"error": str(e)}).encode() + b"\n"
+
+
+async def _primed(first, events):
+    yield first
+    async for event in events:
+        yield event
+
+
+async def _stream_response(events) -> StreamingResponse:
+    # Se espera el primer evento antes de responder: así una cola llena (429) o un error de
+    # Ollama previo al primer token se informan con el código HTTP correspondiente
+    try:
+        first = await events.__anext__()
+    except UPSTREAM_ERRORS as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _sse(_primed(first, events)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/simple-request", response_model=QueryResponse)
-def simple_query_ollama(request: QueryRequest):
+async def simple_query_ollama(request: QueryRequest):
     try:
-        return OllamaService.simple_query_api(request)
-    except requests.RequestException as e:
+        return await OllamaService.simple_query_api(request)
+    except UPSTREAM_ERRORS as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/simple-request/stream")
+async def simple_query_ollama_stream(request: QueryRequest):
+    return await _stream_response(OllamaService.stream_simple_query(request))
     
-@router.post("/request-with-history", response_model=QueryResponse)
-def query_ollama(request: QueryRequest):
+@router.post("/simple-request/ndjson")
+async def simple_query_ollama_ndjson(request: QueryRequest):
+    """Reenvía el NDJSON de /api/generate de Ollama tal cual (un objeto por token, el último con done)."""
+    lines = OllamaService.stream_simple_query_ndjson(request)
+    try:
+        first = await lines.__anext__()
+    except UPSTREAM_ERRORS as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _ndjson(_primed(first, lines)),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/request-with-history", response_model=ChatResponse)
+async def query_ollama(request: QueryRequest):
     try:
-        return OllamaService.chat_api(request)
-    except requests.RequestException as e:
+        return await OllamaService.chat_api(request)
+    except UPSTREAM_ERRORS as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/request-with-history/stream")
+async def query_ollama_stream(request: QueryRequest):
+    return await _stream_response(OllamaService.stream_chat(request))
+    
+@router.get("/request-with-history/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = await OllamaService.sessions.aget(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sesión inexistente o expirada")
+    return session.to_dict()
+
+@router.delete("/request-with-history/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await OllamaService.sessions.adelete(session_id):
+        raise HTTPException(status_code=404, detail="Sesión inexistente o expirada")
+    return {"deleted": session_id}
     
 @router.post("/request-with-langchain", response_model=QueryResponse)
-def query_ollama_langchain(request: QueryRequest):
+async def query_ollama_langchain(request: QueryRequest):
     try:
-        # return OllamaService.chat_langchain(request)
-        return OllamaService.chat_with_template(request)
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        # return await OllamaService.chat_langchain(request)
+        return await OllamaService.chat_with_template(request)
+    except UPSTREAM_ERRORS as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/request-with-langchain/stream")
+async def query_ollama_langchain_stream(request: QueryRequest):
+    return await _stream_response(OllamaService.stream_with_template(request))
@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from ollama import ResponseError
+
+from app.services import metrics, resilience
+from app.services.ollama_client import OllamaClient
+from app.services.resilience import CircuitBreaker, DeadlineExceededError, LatencyTracker, RetryBudget
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailableError(Exception):
+    """Ningún backend de Ollama está sano en este momento."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        # Segundos hasta que algún circuit breaker deje pasar una prueba (para Retry-After)
+        self.retry_after = retry_after
+
+
+# Errores de una llamada a Ollama: los de httpx (cliente propio) y los del cliente de
+# `ollama` que usa LangChain (ResponseError, ConnectionError si el servidor no responde)
+UPSTREAM_ERRORS = (httpx.HTTPError, ResponseError, ConnectionError)
+
+
+def _is_backend_failure(error: Exception) -> bool:
+    """Errores que indican un backend caído o sobrecargado (no un pedido inválido)."""
+    if isinstance(error, DeadlineExceededError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError))
+
+
+class Backend:
+    """Un servidor de Ollama del pool, con su cliente HTTP, sus modelos de LangChain y su estado."""
+
+    def __init__(self, url: str, model: str, temperature: float, embedding_model: str, breaker: CircuitBreaker):
+        self.url = url
+        self.client: OllamaClient = None
+        self.llm = ChatOllama(model=model, temperature=temperature, base_url=url)
+        self.embeddings = OllamaEmbeddings(model=embedding_model, base_url=url)
+        self.outstanding = 0
+        self.breaker = breaker
+        # Modelos descargados (/api/tags) y cargados en memoria (/api/ps); None = aún sin sondear
+        self.available = None
+        self.loaded = set()
+        self.requests = 0
+        self.last_probe = None
+        self.last_error = None
+
+    @property
+    def healthy(self) -> bool:
+        """Con el circuito cerrado; uno abierto o semiabierto todavía no se considera sano."""
+        return self.breaker.state == "closed"
+
+    @property
+    def failures(self) -> int:
+        return self.breaker.failures
+
+    def has_model(self, model: str) -> bool:
+        return self.available is None or model in self.available
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.stats(),
+            "available": sorted(self.available) if self.available is not None else None,
+            "loaded": sorted(self.loaded),
+            "last_probe": self.last_probe,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """
+    Pool de servidores de Ollama con balanceo por menor cantidad de peticiones en curso.
+
+    Cada petición elige, entre los backends sanos que tienen el modelo, el que menos
+    peticiones tiene en curso; a igualdad prefiere uno que ya tenga el modelo cargado en
+    memoria. Cada backend tiene un circuit breaker que se abre tras `max_failures` errores
+    seguidos, contando peticiones que fallan o vencen su plazo y sondeos fallidos por igual;
+    vuelve al pool cuando un sondeo periódico (/api/tags y /api/ps) responde bien o cuando pasa
+    la petición de prueba del estado semiabierto.
+
+    Expone post() y stream() con la misma firma que OllamaClient, tomando el modelo del payload.
+    Además aplican el plazo de la llamada, reintentan los errores de conexión con backoff
+    exponencial con jitter (en otro backend si lo hay) y post() puede duplicar la petición en
+    otro backend si tarda más que el p95 de la ruta (hedging). Reintentos y duplicados gastan
+    de un presupuesto proporcional a las peticiones, para no multiplicar la carga en una caída.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        model: str,
+        temperature: float,
+        embedding_model: str,
+        max_failures: int = 3,
+        breaker_cooldown: float = 5.0,
+        breaker_max_cooldown: float = 60.0,
+        retries: int = 2,
+        retry_base: float = 0.1,
+        retry_max: float = 2.0,
+        retry_budget: float = 0.1,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.1,
+    ):
+        self.backends = [
+            Backend(url, model, temperature, embedding_model, CircuitBreaker(max_failures, breaker_cooldown, breaker_max_cooldown))
+            for url in urls
+        ]
+        self.model = model
+        self.temperature = temperature
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.budget = RetryBudget(retry_budget)
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyTracker()
+        # keep_alive que se agrega a cada llamada (lo fija ResidencyManager); None = el de Ollama
+        self.keep_alive = None
+        self._health_task: asyncio.Task = None
+
+    def start(self, health_interval: float = 0):
+        """Abre un cliente HTTP por backend y, si `health_interval` > 0, lanza los sondeos periódicos."""
+        for backend in self.backends:
+            backend.client = OllamaClient(backend.url)
+        if health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop(health_interval))
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for backend in self.backends:
+            if backend.client is not None:
+                await backend.client.aclose()
+                backend.client = None
+
+    def pick(self, model: str = None, exclude=()) -> Backend:
+        """
+        Elige backend entre los que tienen el circuito cerrado (o listo para una prueba), evitando
+        los de `exclude` si hay otros. Sin ninguno disponible falla enseguida con 503.
+        """
+        model = model or self.model
+        available = [b for b in self.backends if b.breaker.available()]
+        if not available:
+            retry_after = min(b.breaker.retry_after() for b in self.backends) if self.backends else None
+            raise NoBackendAvailableError(
+                f"Ningún backend de Ollama disponible ({len(self.backends)} con el circuito abierto)", retry_after
+            )
+        available = [b for b in available if b.url not in exclude] or available
+        candidates = [b for b in available if b.has_model(model)] or available
+        # Los circuitos cerrados antes que una prueba de uno semiabierto
+        return min(candidates, key=lambda b: (not b.healthy, b.outstanding, model not in b.loaded))
+
+    @asynccontextmanager
+    async def lease(self, model: str = None, exclude=()):
+        """Reserva el backend elegido durante el bloque y registra en su circuit breaker si la llamada falló."""
+        with self.lease_sync(model, exclude) as backend:
+            try:
+                yield backend
+            except asyncio.CancelledError:
+                # Un plazo que vence dentro del bloque llega como cancelación: cuenta como error del
+                # backend. Otras cancelaciones (cliente desconectado, duplicado que perdió) no.
+                if resilience.deadline_expired():
+                    self._record_failure(backend, "superó el plazo de la llamada")
+                raise
+
+    @contextmanager
+    def lease_sync(self, model: str = None, exclude=()):
+        """Como lease, para llamadas síncronas (ej. los métodos sync de PooledEmbeddings)."""
+        backend = self.pick(model, exclude)
+        trial = backend.breaker.acquire()
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        except Exception as e:
+            if _is_backend_failure(e):
+                self._record_failure(backend, e)
+            raise
+        else:
+            self._record_success(backend)
+        finally:
+            backend.outstanding -= 1
+            if trial and backend.breaker.state == "half_open":
+                backend.breaker.release()
+
+    def _record_success(self, backend: Backend):
+        if backend.breaker.state != "closed":
+            logger.info("Backend %s vuelve al pool", backend.url)
+            metrics.CIRCUIT_OPEN.labels(backend.url).set(0)
+        backend.breaker.record_success()
+
+    def _record_failure(self, backend: Backend, error):
+        backend.last_error = str(error)
+        if backend.breaker.record_failure():
+            metrics.CIRCUIT_OPEN.labels(backend.url).set(1)
+            logger.warning(
+                "Circuito abierto para %s tras %d errores (%.0f s): %s",
+                backend.url, backend.failures, backend.breaker.cooldown, error,
+            )
+
+    def _with_keep_alive(self, payload: dict) -> dict:
+        if self.keep_alive is None or "keep_alive" in payload:
+            return payload
+        return {**payload, "keep_alive": self.keep_alive}
+
+    async def _retry_or_raise(self, error: Exception, attempt: int, route: str):
+        """Espera el backoff si `error` se puede reintentar y queda presupuesto; si no, lo relanza."""
+        if attempt > self.retries or not resilience.is_retryable(error) or not self.budget.withdraw():
+            raise error
+        metrics.UPSTREAM_RETRIES.labels(route).inc()
+        logger.info("Reintento %d de %s tras %s", attempt, route, error)
+        await asyncio.sleep(resilience.backoff(attempt, self.retry_base, self.retry_max))
+
+    async def _post_with_retries(self, path: str, payload: dict, route: str, tried: set) -> dict:
+        attempt = 0
+        while True:
+            try:
+                async with self.lease(payload.get("model"), exclude=tried) as backend:
+                    tried.add(backend.url)
+                    return await backend.client.post(path, payload)
+            except Exception as e:
+                attempt += 1
+                await self._retry_or_raise(e, attempt, route)
+
+    async def _post_hedged(self, path: str, payload: dict, route: str) -> dict:
+        """
+        Lanza la petición y, si no respondió en el p95 de la ruta, un duplicado en otro backend;
+        se queda con la primera respuesta y cancela la otra.
+        """
+        tried = set()
+        primary = asyncio.ensure_future(self._post_with_retries(path, payload, route, tried))
+        tasks = {primary}
+        try:
+            p95 = self.latencies.percentile(route, 95)
+            if p95 is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=max(p95, self.hedge_min_delay))
+            other = [b for b in self.backends if b.breaker.available() and b.url not in tried]
+            # Solo se duplica hacia otro backend: en el mismo la copia competiría con la original
+            if done or not other or not self.budget.withdraw():
+                return await primary
+            hedge = asyncio.ensure_future(self._post_with_retries(path, payload, route, set(tried)))
+            tasks.add(hedge)
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # Si la primera en terminar falló se espera a la otra
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None or not tasks:
+                    winner = winner or done.pop()
+                    metrics.HEDGED_REQUESTS.labels(route, "primary" if winner is primary else "hedge").inc()
+                    return winner.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def post(self, path: str, payload: dict, route: str = None, deadline: float = None) -> dict:
+        payload = self._with_keep_alive(payload)
+        route = route or path
+        self.budget.deposit()
+        started = time.perf_counter()
+        async with resilience.deadline(deadline, route):
+            if self.hedge:
+                data = await self._post_hedged(path, payload, route)
+            else:
+                data = await self._post_with_retries(path, payload, route, set())
+        self.latencies.observe(route, time.perf_counter() - started)
+        return data
+
+    async def stream(self, path: str, payload: dict, route: str = None, deadline: float = None, raw: bool = False):
+        """
+        Como OllamaClient.stream, con el plazo aplicado hasta el primer objeto (después cuida el
+        timeout de lectura) y reintentos solo antes de haber entregado nada. Con raw=True genera
+        las líneas NDJSON sin decodificar (OllamaClient.stream_lines).
+        """
+        payload = self._with_keep_alive(payload)
+        route = route or path
+        self.budget.deposit()
+        tried, attempt = set(), 0
+        while True:
+            started = False
+            try:
+                async with self.lease(payload.get("model"), exclude=tried) as backend:
+                    tried.add(backend.url)
+                    items = backend.client.stream_lines(path, payload) if raw else backend.client.stream(path, payload)
+                    async for data in resilience.first_within(items, deadline, route):
+                        started = True
+                        yield data
+                return
+            except Exception as e:
+                if started:
+                    raise
+                attempt += 1
+                await self._retry_or_raise(e, attempt, route)
+
+    async def probe(self, backend: Backend):
+        try:
+            tags, ps = await asyncio.gather(backend.client.get("/api/tags"), backend.client.get("/api/ps"))
+        except (httpx.HTTPError, ValueError) as e:
+            # Un sondeo fallido cuenta como cualquier otro error: abre el circuito tras max_failures
+            self._record_failure(backend, e)
+        else:
+            self._record_success(backend)
+            backend.available = {m["name"] for m in tags.get("models", [])}
+            backend.loaded = {m["name"] for m in ps.get("models", [])}
+        backend.last_probe = time.time()
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(b) for b in self.backends))
+
+    async def _health_loop(self, interval: float):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(interval)
+
+    def stats(self) -> list:
+        return [b.stats() for b in self.backends]
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings de Ollama repartidos entre los backends del pool (cada lote va a uno solo)."""
+
+    def __init__(self, pool: BackendPool, model: str):
+        self.pool = pool
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.pool.lease_sync(self.model) as backend:
+            return backend.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.pool.lease_sync(self.model) as backend:
+            return backend.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with self.pool.lease(self.model) as backend:
+            return await backend.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with self.pool.lease(self.model) as backend:
+            return await backend.embeddings.aembed_query(text)
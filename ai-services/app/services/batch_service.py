@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.models.batch_model import BatchItemResult, BatchRequest
+from app.services import request_context
+from app.services.backend_pool import UPSTREAM_ERRORS, NoBackendAvailableError
+from app.services.ollama_service import OllamaService
+from app.services.resilience import DeadlineExceededError
+from app.services.scheduler import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Método del servicio que atiende cada ruta destino de un lote
+HANDLERS = {
+    "simple-request": OllamaService.simple_query_api,
+    "request-with-history": OllamaService.chat_api,
+    "request-with-langchain": OllamaService.chat_with_template,
+    "chat-langchain": OllamaService.chat_langchain,
+}
+
+
+class BatchService:
+    """
+    Ejecuta los ítems de un lote en paralelo con a lo sumo `concurrency` en curso.
+
+    Cada ítem es una llamada normal al servicio (caché, control de admisión, pool de
+    backends), pero sin pagar una petición HTTP por ítem. Un ítem que falla se informa con
+    su error y código HTTP sin cortar el resto del lote.
+    """
+
+    @staticmethod
+    def _status(error: Exception) -> int:
+        if isinstance(error, QueueFullError):
+            return 429
+        if isinstance(error, NoBackendAvailableError):
+            return 503
+        if isinstance(error, DeadlineExceededError):
+            return 504
+        return 500
+
+    @classmethod
+    async def _run_item(cls, handler, index: int, item, semaphore: asyncio.Semaphore) -> BatchItemResult:
+        async with semaphore:
+            # Estado propio por ítem: los encabezados de cada llamada (X-Cache, ...) no van a la respuesta del lote
+            request_context.begin()
+            started = time.perf_counter()
+            try:
+                response = await handler(item)
+                return BatchItemResult(index=index, result=response.result, elapsed_ms=(time.perf_counter() - started) * 1000)
+            except (*UPSTREAM_ERRORS, QueueFullError, NoBackendAvailableError, DeadlineExceededError) as e:
+                error = e
+            except Exception as e:
+                logger.exception("Falló el ítem %d del lote", index)
+                error = e
+            return BatchItemResult(
+                index=index,
+                error=str(error) or type(error).__name__,
+                status=cls._status(error),
+                elapsed_ms=(time.perf_counter() - started) * 1000,
+            )
+
+    @classmethod
+    def validate(cls, batch: BatchRequest):
+        if len(batch.items) > settings.BATCH_MAX_ITEMS:
+            raise ValueError(f"El lote tiene {len(batch.items)} ítems; el máximo es {settings.BATCH_MAX_ITEMS}")
+
+    @classmethod
+    async def run(cls, batch: BatchRequest):
+        """Genera el resultado de cada ítem a medida que termina (no en el orden de entrada)."""
+        handler = HANDLERS[batch.route]
+        semaphore = asyncio.Semaphore(min(batch.concurrency, settings.BATCH_MAX_CONCURRENCY))
+        tasks = [
+            asyncio.create_task(cls._run_item(handler, index, item, semaphore))
+            for index, item in enumerate(batch.items)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Si el cliente corta el stream no se siguen generando los ítems pendientes
+            for task in tasks:
+                task.cancel()
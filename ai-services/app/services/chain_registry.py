@@ -0,0 +1,55 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ChainRegistry:
+    """
+    Registro de cadenas de LangChain con nombre, construidas una sola vez al iniciar la app.
+
+    Cada cadena se registra con una función que la construye y una entrada de prueba.
+    build_all() las arma y warmup() ejecuta cada una con su entrada de prueba, así la primera
+    petición real no paga ni la construcción ni la carga del modelo en Ollama.
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._chains = {}
+        self.warmup_done = False
+        self.warmup_ms = {}
+        self.warmup_errors = {}
+
+    def register(self, name: str, builder, probe):
+        self._builders[name] = (builder, probe)
+
+    def build_all(self):
+        for name, (builder, _) in self._builders.items():
+            self._chains[name] = builder()
+
+    def get(self, name: str):
+        return self._chains[name]
+
+    async def warmup(self):
+        for name, (_, probe) in self._builders.items():
+            started = time.perf_counter()
+            try:
+                await self._chains[name].ainvoke(probe)
+            except Exception as e:
+                logger.warning("Falló el warmup de la cadena %s: %s", name, e)
+                self.warmup_errors[name] = str(e)
+            self.warmup_ms[name] = (time.perf_counter() - started) * 1000
+        self.warmup_done = True
+
+    @property
+    def ready(self) -> bool:
+        return self.warmup_done and not self.warmup_errors
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_done": self.warmup_done,
+            "chains": sorted(self._chains),
+            "warmup_ms": self.warmup_ms,
+            "errors": self.warmup_errors,
+        }
@@ -0,0 +1,102 @@
+import asyncio
+from collections import Counter
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Agrupa en micro-lotes las consultas de embedding concurrentes.
+
+    Cada aembed_query encola su texto y espera. Un worker junta los textos que lleguen
+    durante `max_wait_ms` (o hasta `max_batch`) y los envía al modelo en una sola llamada
+    a aembed_documents, que en Ollama es un único POST /api/embed con una lista de entradas.
+    Después reparte a cada llamador su vector. Los métodos síncronos no se agrupan.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch: int = 32, max_wait_ms: float = 5):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Counter()
+        self._queue = None
+        self._loop = None
+        self._worker = None
+        # El event loop solo guarda referencias débiles a las tareas: sin este set un envío en
+        # curso podría ser recolectado y dejar a sus llamadores esperando para siempre
+        self._flushes = set()
+
+    def stats(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * n for size, n in self.batch_sizes.items())
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0,
+            "histogram": dict(sorted(self.batch_sizes.items())),
+        }
+
+    def _ensure_worker(self):
+        # La cola y el worker pertenecen al event loop en curso (uvicorn usa uno solo;
+        # TestClient o scripts pueden crear otro)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # El lote se envía en otra tarea para seguir juntando el siguiente mientras tanto
+            flush = loop.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list):
+        self.batch_sizes[len(batch)] += 1
+        try:
+            vectors = await self.embeddings.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def aclose(self):
+        """Deja de juntar lotes y espera a que terminen los envíos en curso."""
+        if self._worker is not None and self._loop is asyncio.get_running_loop():
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Un lote explícito (ej. el corpus) ya viaja en una sola llamada
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Caché de embeddings direccionada por contenido delante de otro modelo de embeddings.
+
+    La clave es sha256(modelo + texto), así que un texto idéntico nunca se vuelve a embeber.
+    Tiene dos niveles:
+        - memoria: LRU acotado a `max_items` vectores float32
+        - disco (opcional): tabla SQLite en `path`, sobrevive a los reinicios
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, max_items: int = 10000, path: str = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_items = max_items
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+        }
+
+    def _connection(self):
+        # La conexión se abre recién al primer uso para no tocar el disco al importar
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        return self._db
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> dict:
+        """Busca las claves en memoria y luego en disco; devuelve {clave: vector} de las encontradas."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.hits += 1
+            pending = [k for k in dict.fromkeys(keys) if k not in found]
+            if pending and self.path:
+                placeholders = ",".join("?" * len(pending))
+                rows = self._connection().execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", pending
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    found[key] = vector
+                    self.disk_hits += 1
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> List[np.ndarray]:
+        """Guarda los vectores como float32 y los devuelve así: un acierto y un fallo dan el mismo vector."""
+        arrays = [np.asarray(v, dtype=np.float32) for v in vectors]
+        with self._lock:
+            self.misses += len(keys)
+            for key, vector in zip(keys, arrays):
+                self._remember(key, vector)
+            if self.path:
+                db = self._connection()
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(k, v.tobytes()) for k, v in zip(keys, arrays)],
+                )
+                db.commit()
+        return arrays
+
+    # Con SQLite, las lecturas y el commit corren en un hilo para no bloquear el event loop
+    async def _alookup(self, keys: List[str]) -> dict:
+        if self.path:
+            return await asyncio.to_thread(self._lookup, keys)
+        return self._lookup(keys)
+
+    async def _astore(self, keys: List[str], vectors: List[List[float]]) -> List[np.ndarray]:
+        if self.path:
+            return await asyncio.to_thread(self._store, keys, vectors)
+        return self._store(keys, vectors)
+
+    @staticmethod
+    def _missing(keys: List[str], texts: List[str], found: dict) -> dict:
+        # Textos faltantes sin duplicados, en orden de aparición
+        return {k: t for k, t in zip(keys, texts) if k not in found}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(t) for t in texts]
+        found = self._lookup(keys)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            found.update(zip(missing, self._store(list(missing), vectors)))
+        return [found[k].tolist() for k in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(t) for t in texts]
+        found = await self._alookup(keys)
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            found.update(zip(missing, await self._astore(list(missing), vectors)))
+        return [found[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Una sola consulta va por aembed_query del modelo (que puede agruparla en un micro-lote)
+        key = self.key(text)
+        found = await self._alookup([key])
+        if key in found:
+            return found[key].tolist()
+        vector = await self.embeddings.aembed_query(text)
+        return (await self._astore([key], [vector]))[0].tolist()
@@ -0,0 +1,337 @@
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.config import settings
+from app.services.ollama_service import OllamaService
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("text", "csv", "jsonl")
+# Tamaño de cada escritura y lectura del archivo temporal de una subida
+SPOOL_BLOCK = 1024 * 1024
+# Campos que se usan como texto de cada línea JSONL, en orden de preferencia
+JSON_TEXT_FIELDS = ("text", "content", "body", "Review")
+MAX_JOBS = 100
+
+
+def detect_format(filename: str, content_type: str = None) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv" or "csv" in (content_type or ""):
+        return "csv"
+    if extension in (".jsonl", ".ndjson") or "ndjson" in (content_type or "") or "jsonl" in (content_type or ""):
+        return "jsonl"
+    return "text"
+
+
+async def iter_lines(byte_chunks):
+    """Decodifica UTF-8 de a pedazos y genera líneas completas sin juntar todo el archivo."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    async for chunk in byte_chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_csv_records(lines, text_columns: Optional[List[str]] = None):
+    """
+    Genera un texto por fila de CSV con el formato "columna: valor" por línea.
+    Para archivos tipo Data.csv (Product, Review) queda "Product: ...\\nReview: ...".
+    """
+    header, pending = None, ""
+    async for line in lines:
+        pending = f"{pending}\n{line}" if pending else line
+        # Comillas impares: un campo entre comillas continúa en la línea siguiente
+        if pending.count('"') % 2:
+            continue
+        row = next(csv.reader([pending]), [])
+        pending = ""
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        record = dict(zip(header, row))
+        text = "\n".join(f"{c}: {record[c]}" for c in (text_columns or header) if record.get(c))
+        if text:
+            yield text
+
+
+async def iter_jsonl_records(lines):
+    async for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record, dict):
+            text = next((record[f] for f in JSON_TEXT_FIELDS if record.get(f)), None)
+            yield text if text is not None else json.dumps(record, ensure_ascii=False)
+        else:
+            yield str(record)
+
+
+class Chunker:
+    """Parte texto en fragmentos de ~`size` caracteres, cortando en espacios y con `overlap` de solapamiento."""
+
+    def __init__(self, size: int, overlap: int):
+        # Con overlap >= size la ventana no avanza: el corte nunca pasaría del solapamiento
+        if size <= 0 or not 0 <= overlap < size:
+            raise ValueError(f"Tamaño de fragmento inválido: se necesita 0 <= solapamiento ({overlap}) < tamaño ({size})")
+        self.size = size
+        self.overlap = overlap
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        chunks = []
+        while len(self.buffer) >= self.size:
+            cut = self.buffer.rfind(" ", self.overlap + 1, self.size)
+            cut = cut if cut > 0 else self.size
+            chunks.append(self.buffer[:cut].strip())
+            self.buffer = self.buffer[max(cut - self.overlap, 1):]
+        return [c for c in chunks if c]
+
+    def flush(self) -> List[str]:
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+@dataclass
+class IngestJob:
+    filename: str
+    format: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "running"
+    # Bytes recibidos (subida completa) y bytes ya procesados por la ingesta
+    size: Optional[int] = None
+    bytes: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "format": self.format,
+            "status": self.status,
+            "size": self.size,
+            "bytes": self.bytes,
+            "progress": round(self.bytes / self.size, 4) if self.size else None,
+            "chunks": self.chunks,
+            "elapsed_s": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks / elapsed, 2) if elapsed > 0 else 0.0,
+            "error": self.error,
+        }
+
+
+class IngestionService:
+    """
+    Ingesta en streaming hacia el índice del RAG.
+
+    Lee el archivo a medida que llega, lo parte en fragmentos, los embebe por lotes y los
+    agrega al segmento de ingesta del índice. Mientras un lote se embebe se sigue leyendo y
+    fragmentando el siguiente, y las consultas continúan atendiéndose con normalidad.
+    """
+
+    jobs = OrderedDict()
+    # Ingestas en segundo plano (se guardan para que no las junte el GC)
+    _tasks = set()
+
+    @classmethod
+    def get_job(cls, job_id: str) -> Optional[IngestJob]:
+        return cls.jobs.get(job_id)
+
+    @classmethod
+    def _new_job(cls, filename: str, fmt: str) -> IngestJob:
+        job = IngestJob(filename=filename, format=fmt)
+        cls.jobs[job.id] = job
+        while len(cls.jobs) > MAX_JOBS:
+            cls.jobs.popitem(last=False)
+        return job
+
+    @staticmethod
+    async def _count_bytes(job: IngestJob, byte_chunks):
+        async for chunk in byte_chunks:
+            job.bytes += len(chunk)
+            yield chunk
+
+    @classmethod
+    async def _chunks(cls, job: IngestJob, byte_chunks, text_columns, chunker: Chunker):
+        lines = iter_lines(cls._count_bytes(job, byte_chunks))
+        if job.format == "text":
+            async for line in lines:
+                for chunk in chunker.feed(line + "\n"):
+                    yield chunk
+            for chunk in chunker.flush():
+                yield chunk
+            return
+
+        records = iter_csv_records(lines, text_columns) if job.format == "csv" else iter_jsonl_records(lines)
+        async for record in records:
+            # Cada registro es un documento; solo se parte si supera el tamaño de fragmento
+            for chunk in chunker.feed(record) + chunker.flush():
+                yield chunk
+
+    @classmethod
+    async def _batches(cls, chunks, size: int):
+        batch = []
+        async for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @classmethod
+    async def _store(cls, job: IngestJob, batch: List[str], embedding: asyncio.Task):
+        vectors = await embedding
+        await OllamaService.append_documents(batch, vectors)
+        job.chunks += len(batch)
+
+    @staticmethod
+    def chunker(size: Optional[int] = None, overlap: Optional[int] = None) -> Chunker:
+        """Chunker con los valores pedidos o los de la configuración; ValueError si no son válidos."""
+        return Chunker(
+            settings.INGEST_CHUNK_SIZE if size is None else size,
+            settings.INGEST_CHUNK_OVERLAP if overlap is None else overlap,
+        )
+
+    @classmethod
+    async def ingest(
+        cls,
+        byte_chunks,
+        filename: str,
+        fmt: str,
+        text_columns: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ) -> IngestJob:
+        """Ingiere `byte_chunks` y devuelve el trabajo terminado (o fallido)."""
+        cls._check_format(fmt)
+        chunker = cls.chunker(chunk_size, chunk_overlap)
+        job = cls._new_job(filename, fmt)
+        await cls._run(job, byte_chunks, text_columns, chunker)
+        return job
+
+    @classmethod
+    async def submit(
+        cls,
+        byte_chunks,
+        filename: str,
+        fmt: str,
+        text_columns: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ) -> IngestJob:
+        """
+        Recibe la subida en un archivo temporal y devuelve el trabajo mientras la ingesta (embeber y
+        agregar al índice, lo que tarda) sigue en segundo plano; su progreso se consulta con get_job.
+
+        El cuerpo se termina de recibir antes de devolver porque una respuesta HTTP no puede salir
+        mientras se sigue leyendo la petición; la subida va a disco sin embeber nada.
+        """
+        cls._check_format(fmt)
+        chunker = cls.chunker(chunk_size, chunk_overlap)
+        job = cls._new_job(filename, fmt)
+        job.status = "uploading"
+        try:
+            path = await cls._spool(job, byte_chunks)
+        except Exception as e:
+            job.status, job.error, job.finished = "failed", str(e), time.time()
+            raise
+        job.status = "running"
+        task = asyncio.create_task(cls._run_spooled(job, path, text_columns, chunker))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+        return job
+
+    @staticmethod
+    def _check_format(fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (usar uno de {', '.join(FORMATS)})")
+
+    @staticmethod
+    async def _spool(job: IngestJob, byte_chunks) -> str:
+        fd, path = tempfile.mkstemp(prefix="ingest-", suffix=f"-{job.id}")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pending, pending_size = [], 0
+                job.size = 0
+                async for chunk in byte_chunks:
+                    pending.append(chunk)
+                    pending_size += len(chunk)
+                    job.size += len(chunk)
+                    # Se escribe de a bloques grandes en un hilo para no bloquear el event loop
+                    if pending_size >= SPOOL_BLOCK:
+                        await asyncio.to_thread(f.write, b"".join(pending))
+                        pending, pending_size = [], 0
+                await asyncio.to_thread(f.write, b"".join(pending))
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path
+
+    @staticmethod
+    async def _read_file(path: str):
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, SPOOL_BLOCK):
+                yield chunk
+
+    @classmethod
+    async def _run_spooled(cls, job: IngestJob, path: str, text_columns: Optional[List[str]], chunker: Chunker):
+        try:
+            await cls._run(job, cls._read_file(path), text_columns, chunker)
+        finally:
+            os.unlink(path)
+
+    @classmethod
+    async def _run(cls, job: IngestJob, byte_chunks, text_columns: Optional[List[str]], chunker: Chunker):
+        # Los fragmentos ingeridos no pasan por la caché de embeddings: ya quedan guardados en el índice
+        embeddings = OllamaService.embeddings.embeddings
+        in_flight = None
+        try:
+            batches = cls._batches(cls._chunks(job, byte_chunks, text_columns, chunker), settings.INGEST_BATCH_SIZE)
+            async for batch in batches:
+                if in_flight:
+                    await cls._store(job, *in_flight)
+                in_flight = (batch, asyncio.create_task(embeddings.aembed_documents(batch)))
+            if in_flight:
+                await cls._store(job, *in_flight)
+                in_flight = None
+            await OllamaService.rebuild_ann()
+            job.status = "done"
+        except asyncio.CancelledError:
+            if in_flight:
+                in_flight[1].cancel()
+            job.status, job.error, job.finished = "failed", "cancelada al detener la app", time.time()
+            raise
+        except Exception as e:
+            if in_flight:
+                in_flight[1].cancel()
+            logger.warning("Falló la ingesta %s (%s): %s", job.id, job.filename, e)
+            job.status, job.error = "failed", str(e)
+        job.finished = time.time()
+
+    @classmethod
+    async def shutdown(cls):
+        """Cancela las ingestas en segundo plano al detener la app."""
+        for task in list(cls._tasks):
+            task.cancel()
+        await asyncio.gather(*cls._tasks, return_exceptions=True)
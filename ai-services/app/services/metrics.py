@@ -0,0 +1,107 @@
+"""
+Métricas de Prometheus de la aplicación (se exponen en GET /metrics).
+
+Las duraciones van en segundos y los tokens en unidades, como recomienda Prometheus.
+Ejemplos de consultas:
+    tokens/s de generación:  rate(ollama_eval_tokens_total[5m]) / rate(ollama_eval_duration_seconds_sum[5m])
+    tamaño típico de prompt:  histogram_quantile(0.95, rate(ollama_prompt_tokens_per_request_bucket[5m]))
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets pensados para LLMs: desde milisegundos (caché) hasta minutos (generaciones largas)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 150, 200)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Duración de cada petición HTTP (en streams, hasta el último evento)",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Tiempo hasta el primer token en las rutas streaming",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT = Histogram(
+    "scheduler_queue_wait_seconds",
+    "Espera en la cola del control de admisión antes de llamar a Ollama",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+GENERATION = Histogram(
+    "scheduler_generation_seconds",
+    "Duración de una generación una vez admitida",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+RETRIEVAL_LATENCY = Histogram(
+    "retrieval_latency_seconds",
+    "Búsqueda de documentos del RAG con el embedding ya calculado",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_REJECTED = Counter(
+    "scheduler_rejected_total",
+    "Peticiones rechazadas con 429 por cola llena",
+    ["route"],
+)
+SINGLE_FLIGHT_SAVED = Counter(
+    "single_flight_saved_calls_total",
+    "Peticiones que se sumaron a una idéntica en curso en lugar de hacer su propia llamada a Ollama",
+    ["route"],
+)
+
+# Resiliencia de las llamadas a Ollama
+UPSTREAM_RETRIES = Counter("ollama_retries_total", "Reintentos tras errores de conexión con Ollama", ["route"])
+HEDGED_REQUESTS = Counter(
+    "ollama_hedged_requests_total",
+    "Peticiones duplicadas tras el p95 de la ruta, según cuál respondió primero",
+    ["route", "winner"],
+)
+DEADLINE_EXCEEDED = Counter("ollama_deadline_exceeded_total", "Llamadas a Ollama cortadas por superar su plazo", ["route"])
+CIRCUIT_OPEN = Gauge("ollama_circuit_open", "1 mientras el circuit breaker del backend está abierto", ["backend"])
+
+# Uso reportado por Ollama en la última respuesta de cada generación
+PROMPT_TOKENS_TOTAL = Counter("ollama_prompt_eval_tokens_total", "Tokens de prompt evaluados", ["route", "model"])
+EVAL_TOKENS_TOTAL = Counter("ollama_eval_tokens_total", "Tokens generados", ["route", "model"])
+PROMPT_TOKENS = Histogram(
+    "ollama_prompt_tokens_per_request",
+    "Tokens de prompt por generación (para detectar prompts que crecen)",
+    ["route", "model"],
+    buckets=TOKEN_BUCKETS,
+)
+EVAL_TOKENS = Histogram("ollama_eval_tokens_per_request", "Tokens generados por respuesta", ["route", "model"], buckets=TOKEN_BUCKETS)
+EVAL_DURATION = Histogram(
+    "ollama_eval_duration_seconds", "Tiempo de generación de tokens", ["route", "model"], buckets=LATENCY_BUCKETS
+)
+LOAD_DURATION = Histogram(
+    "ollama_load_duration_seconds", "Tiempo de carga del modelo (arranques en frío)", ["route", "model"], buckets=LATENCY_BUCKETS
+)
+TOKENS_PER_SECOND = Histogram(
+    "ollama_eval_tokens_per_second", "Velocidad de generación por respuesta", ["route", "model"], buckets=RATE_BUCKETS
+)
+
+
+def observe_usage(route: str, model: str, metadata: dict):
+    """Registra los contadores de uso y tiempos (en ns) del último objeto de una respuesta de Ollama."""
+    labels = (route, model)
+    prompt_tokens = metadata.get("prompt_eval_count")
+    if prompt_tokens is not None:
+        PROMPT_TOKENS_TOTAL.labels(*labels).inc(prompt_tokens)
+        PROMPT_TOKENS.labels(*labels).observe(prompt_tokens)
+    eval_tokens = metadata.get("eval_count")
+    if eval_tokens is not None:
+        EVAL_TOKENS_TOTAL.labels(*labels).inc(eval_tokens)
+        EVAL_TOKENS.labels(*labels).observe(eval_tokens)
+    eval_duration = metadata.get("eval_duration")
+    if eval_duration:
+        EVAL_DURATION.labels(*labels).observe(eval_duration / 1e9)
+        if eval_tokens:
+            TOKENS_PER_SECOND.labels(*labels).observe(eval_tokens / (eval_duration / 1e9))
+    load_duration = metadata.get("load_duration")
+    if load_duration is not None:
+        LOAD_DURATION.labels(*labels).observe(load_duration / 1e9)
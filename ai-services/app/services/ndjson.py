@@ -0,0 +1,123 @@
+"""
+Decodificación incremental del NDJSON de Ollama (un objeto JSON por línea) a partir de bytes.
+
+No depende del resto de la app; ejemplosOllama/ejemploOllamaPeticionPost/ndjson_stream.py es una
+copia reducida para que el ejemplo funcione por sí solo.
+Con orjson instalado se usa para decodificar (varias veces más rápido que json y acepta bytes
+sin pasar por str); si no, json de la biblioteca estándar.
+"""
+
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class NDJSONDecoder:
+    """
+    Separa un stream de bytes en líneas NDJSON completas, sin decodificar a str ni copiar más de
+    lo necesario: los pedazos que llegan se juntan solo si una línea quedó partida entre dos.
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed_lines(self, chunk: bytes) -> list:
+        """Devuelve las líneas (bytes, sin el salto de línea) que se completaron con `chunk`."""
+        if self._pending:
+            chunk = self._pending + chunk
+        lines = chunk.split(b"\n")
+        self._pending = lines.pop()
+        return [line for line in lines if line.strip()]
+
+    def feed(self, chunk: bytes) -> list:
+        """Como feed_lines, pero devuelve los objetos ya decodificados."""
+        return [loads(line) for line in self.feed_lines(chunk)]
+
+    def close_lines(self) -> list:
+        """Lo que quedó después del último salto de línea (Ollama siempre lo envía, pero por las dudas)."""
+        pending, self._pending = self._pending, b""
+        return [pending] if pending.strip() else []
+
+    def close(self) -> list:
+        return [loads(line) for line in self.close_lines()]
+
+
+def iter_lines(chunks):
+    """Genera las líneas NDJSON de un iterable de bytes (ej. requests `iter_content(chunk_size=None)`)."""
+    decoder = NDJSONDecoder()
+    for chunk in chunks:
+        yield from decoder.feed_lines(chunk)
+    yield from decoder.close_lines()
+
+
+def iter_objects(chunks):
+    for line in iter_lines(chunks):
+        yield loads(line)
+
+
+async def aiter_lines(chunks):
+    """
+    Versión asíncrona de iter_lines (ej. httpx `aiter_bytes()`). Las líneas se pueden reenviar tal
+    cual, agregando b"\\n", a una respuesta application/x-ndjson sin decodificarlas ni volver a
+    serializarlas.
+    """
+    decoder = NDJSONDecoder()
+    async for chunk in chunks:
+        for line in decoder.feed_lines(chunk):
+            yield line
+    for line in decoder.close_lines():
+        yield line
+
+
+async def aiter_objects(chunks):
+    decoder = NDJSONDecoder()
+    async for chunk in chunks:
+        for data in decoder.feed(chunk):
+            yield data
+    for data in decoder.close():
+        yield data
+
+
+class TokenCoalescer:
+    """
+    Junta fragmentos de texto de un stream para escribirlos de a varios.
+
+    add() devuelve el texto a escribir o None si conviene esperar: se escribe cuando pasaron
+    `max_delay` segundos desde la última escritura o se juntaron `max_chars` caracteres. El primer
+    fragmento sale enseguida (no agrega latencia al primer token) y al final hay que llamar a
+    flush(). Un fragmento retenido espera a que llegue el siguiente o a flush().
+    """
+
+    __slots__ = ("max_delay", "max_chars", "_parts", "_size", "_last")
+
+    def __init__(self, max_delay: float = 0.05, max_chars: int = 256):
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._last = float("-inf")
+
+    def add(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or time.monotonic() - self._last >= self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Devuelve lo acumulado (None si no hay nada) y reinicia la ventana."""
+        self._last = time.monotonic()
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return text
@@ -0,0 +1,68 @@
+import httpx
+from app.config import settings
+from app.services import ndjson
+
+
+class OllamaClient:
+    """
+    Cliente HTTP asíncrono hacia Ollama.
+
+    Mantiene un único httpx.AsyncClient durante toda la vida de la aplicación, de modo que
+    las peticiones reutilizan conexiones keep-alive en lugar de abrir un socket TCP nuevo
+    por cada consulta. Los límites del pool y los timeouts se leen de la configuración.
+    """
+
+    def __init__(self, base_url: str = None):
+        self.base_url = base_url or settings.OLLAMA_API_URL
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.OLLAMA_CONNECT_TIMEOUT,
+                read=settings.OLLAMA_READ_TIMEOUT,
+                write=settings.OLLAMA_WRITE_TIMEOUT,
+                pool=settings.OLLAMA_POOL_TIMEOUT,
+            ),
+        )
+
+    async def get(self, path: str) -> dict:
+        response = await self._client.get(path)
+        response.raise_for_status()
+        return ndjson.loads(response.content)
+
+    async def post(self, path: str, payload: dict) -> dict:
+        """Envía un POST a `path` y devuelve el cuerpo JSON; lanza httpx.HTTPStatusError si falla."""
+        response = await self._client.post(path, json=payload)
+        response.raise_for_status()
+        # Decodifica los bytes directamente (con orjson si está instalado) en lugar de pasar por str
+        return ndjson.loads(response.content)
+
+    async def stream(self, path: str, payload: dict):
+        """
+        Envía un POST con `stream: True` y genera cada objeto JSON a medida que Ollama lo emite.
+
+        Ollama responde en NDJSON: un objeto por línea, el último con `done: true`.
+        """
+        async for data in ndjson.aiter_objects(self._stream_bytes(path, payload)):
+            yield data
+
+    async def stream_lines(self, path: str, payload: dict):
+        """Como stream, pero genera cada línea NDJSON sin decodificar (bytes, sin el salto de línea)."""
+        async for line in ndjson.aiter_lines(self._stream_bytes(path, payload)):
+            yield line
+
+    async def _stream_bytes(self, path: str, payload: dict):
+        async with self._client.stream("POST", path, json={**payload, "stream": True}) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+    async def aclose(self):
+        await self._client.aclose()
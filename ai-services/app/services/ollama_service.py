@@ -1,116 +1,690 @@
-import requests
+import asyncio
+import json
+import logging
+import time
 from app.config import settings
 from app.models.request_model import QueryRequest
-from app.models.response_model import QueryResponse
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import DocArrayInMemorySearch
+from app.models.response_model import ChatResponse, QueryResponse
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.schema.runnable import RunnableMap
 from langchain.schema.output_parser import StrOutputParser
-from langchain_ollama import ChatOllama
-from langchain_core.messages import AIMessage
-from langchain_ollama import OllamaEmbeddings
+from app.services.backend_pool import Backend, BackendPool, PooledEmbeddings
+from app.services.chain_registry import ChainRegistry
+from app.services.embedding_batcher import BatchedEmbeddings
+from app.services.embedding_cache import CachedEmbeddings
+from app.services import metrics, ndjson, request_context, tracing
+from app.services.resilience import deadline, first_within
+from app.services.residency import ResidencyManager
+from app.services.response_cache import ResponseCache
+from app.services.retrieval_engine import RetrievalEngine
+from app.services.scheduler import AdmissionController
+from app.services.semantic_cache import SemanticCache
+from app.services.session_store import Session, SessionStore
+from app.services.single_flight import SingleFlight
+from app.services.vector_index import IndexRetriever, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Corpus del RAG. Si cambia (o cambia EMBEDDING_MODEL) el índice en disco se reconstruye solo
+CORPUS = [
+    "El sol es una estrella.",
+    "Los delfines son mamíferos.",
+    "La Torre Eiffel está en París.",
+    "Las ballenas azules son los animales más grandes del planeta.",
+    "El agua cubre el 70 porciento de la superficie de la Tierra.",
+    "El ajedrez es un juego de estrategia muy antiguo.",
+    "Las medusas existen desde hace más de 500 millones de años.",
+    "El español es el segundo idioma más hablado en el mundo.",
+    "Las hormigas pueden cargar hasta 50 veces su propio peso.",
+    "El café se originó en Etiopía.",
+    "El Sahara es el desierto más grande del mundo.",
+    "El cerebro humano tiene alrededor de 86 mil millones de neuronas.",
+    "La Gran Muralla China mide más de 21,000 kilómetros.",
+    "Los gatos tienen 32 músculos en cada oreja.",
+    "Los koalas duermen hasta 22 horas al día.",
+]
+
+RAG_TEMPLATE = """Responda la pregunta basándose únicamente en el siguiente contexto:
+            {context}
+
+            Question: {question}
+        """
+
+CHAT_PERSONA = "You are a senior Java programmer."
+
+SUMMARY_TEMPLATE = """Resume en pocas frases la siguiente conversación, conservando nombres, datos y decisiones.
+
+Resumen previo: {summary}
+
+Conversación:
+{turns}
+
+Resumen:"""
+
+TRANSLATE_SYSTEM_PROMPT = "You are a helpful assistant that translates English to French. Translate the user sentence."
+
+# Campos de uso y tiempos que Ollama envía en el último objeto de una respuesta (done: true)
+USAGE_FIELDS = (
+    "prompt_eval_count",
+    "eval_count",
+    "total_duration",
+    "load_duration",
+    "prompt_eval_duration",
+    "eval_duration",
+)
+
+
+def _final_event(metadata: dict, started: float, first_token_at: float) -> dict:
+    """Arma el evento final de un stream con el uso reportado por Ollama y los tiempos medidos."""
+    now = time.perf_counter()
+    event = {field: metadata.get(field) for field in USAGE_FIELDS if field in metadata}
+    event["ttft_ms"] = (first_token_at - started) * 1000 if first_token_at else None
+    event["elapsed_ms"] = (now - started) * 1000
+    # Espera en la cola del control de admisión, separada del tiempo de generación
+    state = request_context.current()
+    event["queue_wait_ms"] = state.get("queue_wait_ms", 0)
+    # X-Generation-Ms no llega en un stream (los encabezados ya salieron): va en el evento final
+    event["generation_ms"] = state.get("generation_ms")
+    return event
 
 
 class OllamaService:
-    llm = ChatOllama(
+    # Servidores de Ollama con balanceo por menor cantidad de peticiones en curso; los
+    # clientes HTTP se abren en startup() y se cierran en shutdown()
+    pool = BackendPool(
+        settings.ollama_urls,
         model="llama3.2:latest",
         temperature=0,
-        # other params...
+        embedding_model=settings.EMBEDDING_MODEL,
+        max_failures=settings.OLLAMA_MAX_FAILURES,
+        breaker_cooldown=settings.OLLAMA_BREAKER_COOLDOWN,
+        breaker_max_cooldown=settings.OLLAMA_BREAKER_MAX_COOLDOWN,
+        retries=settings.OLLAMA_RETRIES,
+        retry_base=settings.OLLAMA_RETRY_BASE_MS / 1000,
+        retry_max=settings.OLLAMA_RETRY_MAX_MS / 1000,
+        retry_budget=settings.OLLAMA_RETRY_BUDGET,
+        hedge=settings.OLLAMA_HEDGE,
+        hedge_min_delay=settings.OLLAMA_HEDGE_MIN_DELAY_MS / 1000,
+    )
+    # Caché por contenido delante de Ollama: preguntas repetidas y reinicios no re-embeben.
+    # Las consultas que no están en caché se agrupan en micro-lotes hacia /api/embed
+    embedding_batcher = BatchedEmbeddings(
+        PooledEmbeddings(pool, model=settings.EMBEDDING_MODEL),
+        max_batch=settings.EMBEDDING_BATCH_SIZE,
+        max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS,
+    )
+    embeddings = CachedEmbeddings(
+        embedding_batcher,
+        model=settings.EMBEDDING_MODEL,
+        max_items=settings.EMBEDDING_CACHE_SIZE,
+        path=settings.EMBEDDING_CACHE_PATH or None,
+    )
+    # Respuestas de prompts deterministas (temperature=0), en memoria con TTL y en SQLite
+    response_cache = ResponseCache(
+        max_items=settings.RESPONSE_CACHE_SIZE,
+        ttl=settings.RESPONSE_CACHE_TTL,
+        path=settings.RESPONSE_CACHE_PATH or None,
     )
-    vectorstore = DocArrayInMemorySearch.from_texts(
-        [
-            "El sol es una estrella.",
-            "Los delfines son mamíferos.",
-            "La Torre Eiffel está en París.",
-            "Las ballenas azules son los animales más grandes del planeta.",
-            "El agua cubre el 70 porciento de la superficie de la Tierra.",
-            "El ajedrez es un juego de estrategia muy antiguo.",
-            "Las medusas existen desde hace más de 500 millones de años.",
-            "El español es el segundo idioma más hablado en el mundo.",
-            "Las hormigas pueden cargar hasta 50 veces su propio peso.",
-            "El café se originó en Etiopía.",
-            "El Sahara es el desierto más grande del mundo.",
-            "El cerebro humano tiene alrededor de 86 mil millones de neuronas.",
-            "La Gran Muralla China mide más de 21,000 kilómetros.",
-            "Los gatos tienen 32 músculos en cada oreja.",
-            "Los koalas duermen hasta 22 horas al día.",
-        ],
-        embedding=OllamaEmbeddings(
-            model="llama3.2:latest",
-        ),
+    # Respuestas a preguntas parecidas (paráfrasis), comparando embeddings de las preguntas
+    semantic_cache = SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        thresholds=settings.SEMANTIC_CACHE_THRESHOLDS,
+        capacity=settings.SEMANTIC_CACHE_SIZE,
     )
-    retriever = vectorstore.as_retriever()
-
-    def simple_query_api(query: QueryRequest) -> QueryResponse:
-        url = f"{settings.OLLAMA_API_URL}/api/generate"
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(
-            url,
-            json={"model": "llama3.2:latest", "prompt": query.prompt, "stream": False},
-            headers=headers,
+    # Se abre (o reconstruye) en el warmup; ya no se embebe el corpus al importar el módulo
+    retriever: IndexRetriever = None
+    # Cadenas construidas una vez en startup() y reutilizadas en cada petición
+    chains = ChainRegistry()
+    warmup_task: asyncio.Task = None
+    # Límite de generaciones simultáneas hacia Ollama, con cola por prioridad de ruta
+    scheduler = AdmissionController(
+        max_inflight=settings.SCHEDULER_MAX_INFLIGHT * len(settings.ollama_urls),
+        max_queue=settings.SCHEDULER_MAX_QUEUE,
+        priorities=settings.SCHEDULER_PRIORITIES,
+    )
+    # Modelos precargados y keep_alive según horario, para no pagar la carga en la primera petición
+    residency = ResidencyManager(
+        pool,
+        models=settings.RESIDENCY_MODELS or [pool.model, settings.EMBEDDING_MODEL],
+        hot_keep_alive=settings.RESIDENCY_KEEP_ALIVE,
+        idle_keep_alive=settings.RESIDENCY_IDLE_KEEP_ALIVE,
+        start_hour=settings.RESIDENCY_START_HOUR,
+        end_hour=settings.RESIDENCY_END_HOUR,
+        weekdays=settings.RESIDENCY_WEEKDAYS,
+        interval=settings.RESIDENCY_INTERVAL,
+    )
+    # Historial de /request-with-history por id de sesión
+    # Peticiones idénticas en curso de las rutas sin historial comparten una sola llamada
+    single_flight = SingleFlight(enabled=settings.SINGLE_FLIGHT)
+    sessions = SessionStore(
+        max_sessions=settings.SESSION_MAX,
+        ttl=settings.SESSION_TTL,
+        path=settings.SESSION_PATH or None,
+    )
+    # Sesiones con un resumen en curso y tareas en segundo plano (se guardan para que no las junte el GC)
+    _folding = set()
+    _background = set()
+    # Un solo append a la vez en este proceso (entre workers, el lock de archivo de VectorIndex) y
+    # versión del segmento de ingesta en disco que se cargó, para reabrirlo si otro worker lo cambió
+    _append_lock = asyncio.Lock()
+    _ingest_stamp = None
+
+    @classmethod
+    async def startup(cls):
+        """Crea el cliente HTTP y las cadenas, y lanza el warmup; se llama una vez al iniciar la app."""
+        cls.pool.start(settings.OLLAMA_HEALTH_INTERVAL)
+        cls.residency.apply()
+        cls.residency.start()
+        cls._register_chains()
+        cls.chains.build_all()
+        # El warmup corre en segundo plano para que la app acepte conexiones (y /api/ready
+        # pueda responder) mientras se carga el modelo
+        cls.warmup_task = asyncio.create_task(cls._warmup())
+
+    @classmethod
+    def _register_chains(cls):
+        cls.chains.register(
+            "rag_prompt",
+            lambda: ChatPromptTemplate.from_template(RAG_TEMPLATE),
+            probe={"context": [], "question": "warmup"},
         )
+        # Las cadenas que llaman al modelo se arman una vez por backend; el warmup deja el
+        # modelo cargado en cada servidor del pool
+        for backend in cls.pool.backends:
+            cls.chains.register(
+                f"rag_answer@{backend.url}",
+                # Sin parser: del AIMessage se leen el texto y el uso (load_duration, tokens)
+                lambda llm=backend.llm: llm,
+                probe="Responde solo: ok",
+            )
+            cls.chains.register(
+                f"translate@{backend.url}",
+                lambda llm=backend.llm: ChatPromptTemplate.from_messages(
+                    [("system", TRANSLATE_SYSTEM_PROMPT), ("human", "{input}")]
+                )
+                | llm,
+                probe={"input": "ok"},
+            )
+            cls.chains.register(
+                f"summarize@{backend.url}",
+                lambda llm=backend.llm: ChatPromptTemplate.from_template(SUMMARY_TEMPLATE) | llm | StrOutputParser(),
+                probe={"summary": "", "turns": "user: hola"},
+            )
+
+    @classmethod
+    def _chain(cls, name: str, backend: Backend):
+        return cls.chains.get(f"{name}@{backend.url}")
+
+    @classmethod
+    async def _warmup(cls):
+        # Primero se cargan los modelos en todos los backends, en paralelo
+        await cls.residency.preload()
+        try:
+            await cls._load_retriever()
+        except Exception as e:
+            # Sin índice en disco y sin Ollama: la app arranca igual y se reintenta en la
+            # primera consulta RAG
+            logger.warning("No se pudo preparar el índice de vectores: %s", e)
+        await cls.chains.warmup()
+
+    @classmethod
+    def readiness(cls) -> dict:
+        usable = {b.url for b in cls.pool.backends if b.healthy and b.has_model(cls.pool.model)}
+        status = {**cls.chains.status(), "retriever": cls.retriever is not None, "backends": len(usable)}
+        # Cuenta todo error de warmup salvo el de una cadena "nombre@backend" de un backend expulsado
+        # (o sin el modelo): ese no bloquea la disponibilidad de los demás
+        errors = [name for name in status["errors"] if "@" not in name or name.partition("@")[2] in usable]
+        status["ready"] = status["warmup_done"] and not errors and status["retriever"] and bool(usable)
+        return status
+
+    @classmethod
+    def _engine(cls, index: VectorIndex) -> RetrievalEngine:
+        return RetrievalEngine(
+            index.vectors,
+            ann_threshold=settings.RETRIEVAL_ANN_THRESHOLD,
+            nprobe=settings.RETRIEVAL_ANN_NPROBE,
+        )
+
+    @classmethod
+    async def _load_retriever(cls):
+        """Abre el índice en disco con mmap; solo embebe el corpus si falta o quedó desactualizado."""
+        fingerprint = VectorIndex.fingerprint_of(settings.EMBEDDING_MODEL, CORPUS)
+        index = VectorIndex.open(settings.VECTOR_INDEX_PATH)
+        if index is None or index.fingerprint != fingerprint:
+            logger.info("Reconstruyendo el índice de vectores en %s", settings.VECTOR_INDEX_PATH)
+            vectors = await cls.embeddings.aembed_documents(CORPUS)
+            index = VectorIndex.build(settings.VECTOR_INDEX_PATH, settings.EMBEDDING_MODEL, CORPUS, vectors)
+        indexes = [index]
+
+        # Documentos agregados por la API de ingesta, en un segmento aparte que solo crece
+        cls._ingest_stamp = VectorIndex.stamp(settings.INGEST_INDEX_PATH)
+        ingested = VectorIndex.open(settings.INGEST_INDEX_PATH)
+        if ingested is not None and ingested.model != settings.EMBEDDING_MODEL:
+            logger.warning(
+                "Se ignora %s: fue embebido con %s y el modelo actual es %s",
+                settings.INGEST_INDEX_PATH, ingested.model, settings.EMBEDDING_MODEL,
+            )
+        elif ingested is not None:
+            indexes.append(ingested)
+
+        segments = []
+        for index in indexes:
+            engine = cls._engine(index)
+            # Con corpus grandes el entrenamiento del IVF tarda: se hace en un hilo aparte
+            await asyncio.to_thread(engine.build_ann)
+            segments.append((index, engine))
+        cls.retriever = IndexRetriever(segments=segments, embeddings=cls.embeddings, k=settings.RETRIEVAL_K)
+        return cls.retriever
+
+    @classmethod
+    async def append_documents(cls, texts: list, vectors: list):
+        """
+        Agrega documentos ya embebidos al segmento de ingesta y los hace visibles de inmediato.
+        Las búsquedas en curso siguen usando el segmento anterior hasta terminar.
+        """
+        async with cls._append_lock:
+            await cls._append_documents(texts, vectors)
+
+    @classmethod
+    async def _append_documents(cls, texts: list, vectors: list):
+        retriever = await cls._get_retriever()
+        # Lock de archivo: otros workers de uvicorn pueden estar agregando al mismo segmento
+        index = await asyncio.to_thread(
+            VectorIndex.append_shared, settings.INGEST_INDEX_PATH, settings.EMBEDDING_MODEL, texts, vectors
+        )
+        cls._replace_ingested(retriever, index)
+
+    @classmethod
+    def _replace_ingested(cls, retriever: IndexRetriever, index: VectorIndex) -> RetrievalEngine:
+        position = next(
+            (i for i, (seg, _) in enumerate(retriever.segments) if seg.path == index.path), len(retriever.segments)
+        )
+        engine = cls._engine(index)
+        retriever.replace_segment(position, index, engine)
+        cls._ingest_stamp = VectorIndex.stamp(index.path)
+        # Las respuestas guardadas por similitud pueden haber quedado desactualizadas
+        cls.semantic_cache.purge("request-with-langchain")
+        return engine
+
+    @classmethod
+    def _reload_ingested(cls, retriever: IndexRetriever):
+        """Reabre el segmento de ingesta si otro worker le agregó documentos desde la última lectura."""
+        stamp = VectorIndex.stamp(settings.INGEST_INDEX_PATH)
+        if stamp is None or stamp == cls._ingest_stamp:
+            return
+        index = VectorIndex.open(settings.INGEST_INDEX_PATH)
+        if index is None or index.model != settings.EMBEDDING_MODEL:
+            cls._ingest_stamp = stamp
+            return
+        engine = cls._replace_ingested(retriever, index)
+        if engine.count >= engine.ann_threshold:
+            # Mientras se entrena el IVF el segmento se busca en forma exacta
+            task = asyncio.create_task(asyncio.to_thread(engine.build_ann))
+            cls._background.add(task)
+            task.add_done_callback(cls._background.discard)
+
+    @classmethod
+    async def rebuild_ann(cls):
+        """Reentrena el índice aproximado de los segmentos que superen el umbral (tras una ingesta)."""
+        retriever = await cls._get_retriever()
+        for index, engine in retriever.segments:
+            await asyncio.to_thread(engine.build_ann)
+
+    @classmethod
+    async def _get_retriever(cls) -> IndexRetriever:
+        retriever = cls.retriever or await cls._load_retriever()
+        cls._reload_ingested(retriever)
+        return retriever
 
-        if response.status_code == 200:
-            return QueryResponse(result=response.json().get("response", ""))
-        else:
-            response.raise_for_status()
+    @classmethod
+    async def shutdown(cls):
+        """Cierra el pool de conexiones al detener la app."""
+        if cls.warmup_task is not None:
+            cls.warmup_task.cancel()
+        cls.residency.stop()
+        await cls.embedding_batcher.aclose()
+        await cls.pool.aclose()
+
+    @classmethod
+    async def _coalesced(cls, route: str, prompt: str, call):
+        """Ejecuta `call()` o, si hay una petición idéntica en curso, espera su resultado."""
+        key = SingleFlight.key("response", route, cls.pool.model, prompt)
+        started = time.perf_counter()
+        joined = cls.single_flight.in_flight(key)
+        result = await cls.single_flight.do(key, route, call)
+        if joined:
+            request_context.set_header("X-Coalesced", "1")
+            tracing.record("coalesced_wait", started, time.perf_counter())
+        return result
+
+    @classmethod
+    async def _coalesced_stream(cls, route: str, prompt: str, events, kind: str = "stream"):
+        """Como _coalesced, para streams: los suscriptores de un stream idéntico reciben sus mismos eventos."""
+        key = SingleFlight.key(kind, route, cls.pool.model, prompt)
+        if cls.single_flight.in_flight(key):
+            request_context.set_header("X-Coalesced", "1")
+        async for event in cls.single_flight.stream(key, route, events):
+            yield event
+
+    @classmethod
+    async def simple_query_api(cls, query: QueryRequest) -> QueryResponse:
+        return await cls._coalesced("simple-request", query.prompt, lambda: cls._simple_query_api(query))
+
+    @classmethod
+    async def _simple_query_api(cls, query: QueryRequest) -> QueryResponse:
+        async with cls.scheduler.slot("simple-request"), tracing.span("llm"):
+            data = await cls.pool.post(
+                "/api/generate",
+                {"model": "llama3.2:latest", "prompt": query.prompt, "stream": False},
+                route="simple-request",
+                deadline=cls._deadline("simple-request"),
+            )
+        cls._observe_usage("simple-request", data)
+        return QueryResponse(result=data.get("response", ""))
+
+    @staticmethod
+    def _deadline(route: str) -> float:
+        return settings.OLLAMA_DEADLINES.get(route, settings.OLLAMA_DEADLINE)
+
+    @classmethod
+    def _observe_usage(cls, route: str, metadata: dict, started: float = None, first_token_at: float = None):
+        """
+        Registra el uso de Ollama en las métricas (y el TTFT en los streams) y expone el
+        load_duration (X-Load-Duration-Ms) para ver arranques en frío.
+        """
+        metrics.observe_usage(route, cls.pool.model, metadata)
+        if first_token_at is not None:
+            metrics.TIME_TO_FIRST_TOKEN.labels(route).observe(first_token_at - started)
+            tracing.record("time_to_first_token", started, first_token_at)
+        load_ms = cls.residency.observe(cls.pool.model, metadata)
+        if load_ms is not None:
+            request_context.set_header("X-Load-Duration-Ms", f"{load_ms:.1f}")
 
-    def chat_api(query: QueryRequest) -> QueryResponse:
-        url = f"{settings.OLLAMA_API_URL}/api/chat"
-        headers = {"Content-Type": "application/json"}
+    @classmethod
+    def _chat_messages(cls, session: Session, prompt: str):
+        """
+        Persona + historial de la sesión recortado al presupuesto de tokens + pregunta actual.
+        Devuelve (mensajes, tokens estimados del prompt).
+        """
+        fixed = cls.sessions.tokens(CHAT_PERSONA) + cls.sessions.tokens(prompt)
+        history, used, _ = cls.sessions.window(session, max(settings.SESSION_TOKEN_BUDGET - fixed, 0))
         messages = [
-            {"role": "assistant", "content": "You are a senior Java programmer."},
-            {"role": "user", "content": query.prompt},
+            {"role": "assistant", "content": CHAT_PERSONA},
+            *history,
+            {"role": "user", "content": prompt},
         ]
-        response = requests.post(
-            url,
-            json={"model": "llama3.2:latest", "messages": messages, "stream": False},
-            headers=headers,
+        request_context.set_header("X-Session-Id", session.id)
+        request_context.set_header("X-Prompt-Tokens", str(fixed + used))
+        return messages, fixed + used
+
+    @classmethod
+    async def _record_turn(cls, session: Session, prompt: str, answer: str):
+        cls.sessions.append(session, "user", prompt)
+        cls.sessions.append(session, "assistant", answer)
+        await cls.sessions.asave(session)
+        # Lo que ya no entra en el presupuesto (dejando lugar al resumen y a una pregunta
+        # parecida a la actual) se resume o descarta fuera de la petición
+        reserve = cls.sessions.tokens(CHAT_PERSONA) + cls.sessions.tokens(prompt) + settings.SESSION_SUMMARY_TOKENS
+        _, _, dropped = cls.sessions.window(session, max(settings.SESSION_TOKEN_BUDGET - reserve, 0))
+        if not dropped or session.id in cls._folding:
+            return
+        if not settings.SESSION_SUMMARIZE:
+            await cls.sessions.afold(session, dropped, session.summary)
+            return
+        cls._folding.add(session.id)
+        task = asyncio.create_task(cls._summarize(session, dropped))
+        cls._background.add(task)
+        task.add_done_callback(cls._background.discard)
+
+    @classmethod
+    async def _summarize(cls, session: Session, dropped: int):
+        """Reemplaza los `dropped` turnos más viejos de la sesión por un resumen (junto al resumen previo)."""
+        turns = "\n".join(f"{role}: {content}" for role, content, _ in session.turns[:dropped])
+        try:
+            async with cls.scheduler.slot("session-summary"), cls.pool.lease() as backend:
+                summary = await cls._chain("summarize", backend).ainvoke(
+                    {"summary": session.summary or "(sin resumen)", "turns": turns}
+                )
+            # El resumen también queda acotado, para que no crezca con la conversación
+            limit = int(settings.SESSION_SUMMARY_TOKENS * cls.sessions.chars_per_token)
+            await cls.sessions.afold(session, dropped, summary.strip()[:limit])
+        except Exception as e:
+            # Sin resumen los turnos viejos se descartan igual: el prompt no puede crecer
+            logger.warning("No se pudo resumir la sesión %s: %s", session.id, e)
+            await cls.sessions.afold(session, dropped, session.summary)
+        finally:
+            cls._folding.discard(session.id)
+
+    @classmethod
+    async def chat_api(cls, query: QueryRequest) -> ChatResponse:
+        with tracing.span("history"):
+            session = await cls.sessions.aget_or_create(query.session_id)
+            messages, prompt_tokens = cls._chat_messages(session, query.prompt)
+        async with cls.scheduler.slot("request-with-history"), tracing.span("llm", prompt_tokens=prompt_tokens):
+            data = await cls.pool.post(
+                "/api/chat",
+                {"model": "llama3.2:latest", "messages": messages, "stream": False},
+                route="request-with-history",
+                deadline=cls._deadline("request-with-history"),
+            )
+        answer = data["message"]["content"]
+        cls._observe_usage("request-with-history", data)
+        with tracing.span("record_turn"):
+            await cls._record_turn(session, query.prompt, answer)
+        return ChatResponse(
+            result=answer,
+            session_id=session.id,
+            prompt_tokens=prompt_tokens,
+            prompt_eval_count=data.get("prompt_eval_count"),
         )
 
-        if response.status_code == 200:
-            return QueryResponse(result=response.json()["message"]["content"])
-        else:
-            response.raise_for_status()
+    @classmethod
+    def stream_simple_query(cls, query: QueryRequest):
+        """Versión streaming de simple_query_api: genera {"token": ...} y al final {"done": {...}}."""
+        return cls._coalesced_stream("simple-request", query.prompt, lambda: cls._stream_simple_query(query))
 
     @classmethod
-    def chat_langchain(cls, query: QueryRequest) -> QueryResponse:
+    async def _stream_simple_query(cls, query: QueryRequest):
+        started, first_token_at, done = time.perf_counter(), None, {}
+        async with cls.scheduler.slot("simple-request"), tracing.span("llm"):
+            async for data in cls.pool.stream(
+                "/api/generate",
+                {"model": "llama3.2:latest", "prompt": query.prompt},
+                route="simple-request",
+                deadline=cls._deadline("simple-request"),
+            ):
+                if data.get("response"):
+                    first_token_at = first_token_at or time.perf_counter()
+                    yield {"token": data["response"]}
+                if data.get("done"):
+                    done = data
+        cls._observe_usage("simple-request", done, started, first_token_at)
+        yield {"done": _final_event(done, started, first_token_at)}
+
+    @classmethod
+    def stream_simple_query_ndjson(cls, query: QueryRequest):
+        """
+        Versión de stream_simple_query que genera las líneas NDJSON de Ollama tal cual llegan (bytes
+        con su salto de línea), para reenviarlas sin decodificar ni volver a serializar cada token.
+        """
+        return cls._coalesced_stream(
+            "simple-request", query.prompt, lambda: cls._stream_simple_query_ndjson(query), kind="ndjson"
+        )
+
+    @classmethod
+    async def _stream_simple_query_ndjson(cls, query: QueryRequest):
+        started, first_token_at, last = time.perf_counter(), None, None
+        async with cls.scheduler.slot("simple-request"), tracing.span("llm"):
+            async for line in cls.pool.stream(
+                "/api/generate",
+                {"model": "llama3.2:latest", "prompt": query.prompt},
+                route="simple-request",
+                deadline=cls._deadline("simple-request"),
+                raw=True,
+            ):
+                first_token_at = first_token_at or time.perf_counter()
+                last = line
+                yield line + b"\n"
+        # Solo se decodifica la última línea (done: true), que trae los contadores de uso
+        done = ndjson.loads(last) if last else {}
+        cls._observe_usage("simple-request", done if done.get("done") else {}, started, first_token_at)
+
+    @classmethod
+    async def stream_chat(cls, query: QueryRequest):
+        """Versión streaming de chat_api sobre /api/chat; el turno se guarda al terminar el stream."""
+        started, first_token_at, done = time.perf_counter(), None, {}
+        with tracing.span("history"):
+            session = await cls.sessions.aget_or_create(query.session_id)
+            messages, prompt_tokens = cls._chat_messages(session, query.prompt)
+        tokens = []
+        async with cls.scheduler.slot("request-with-history"), tracing.span("llm", prompt_tokens=prompt_tokens):
+            async for data in cls.pool.stream(
+                "/api/chat",
+                {"model": "llama3.2:latest", "messages": messages},
+                route="request-with-history",
+                deadline=cls._deadline("request-with-history"),
+            ):
+                content = data.get("message", {}).get("content")
+                if content:
+                    first_token_at = first_token_at or time.perf_counter()
+                    tokens.append(content)
+                    yield {"token": content}
+                if data.get("done"):
+                    done = data
+        cls._observe_usage("request-with-history", done, started, first_token_at)
+        with tracing.span("record_turn"):
+            await cls._record_turn(session, query.prompt, "".join(tokens))
+        yield {
+            "done": {
+                **_final_event(done, started, first_token_at),
+                "session_id": session.id,
+                "prompt_tokens": prompt_tokens,
+            }
+        }
+
+    @classmethod
+    def _cache_key(cls, route: str, prompt: str):
+        """Clave de la caché de respuestas, o None si la llamada no es determinista."""
+        options = {"temperature": cls.pool.temperature}
+        if not ResponseCache.cacheable(options):
+            return None
+        return ResponseCache.key(route, cls.pool.model, options, prompt)
+
+    @classmethod
+    async def chat_langchain(cls, query: QueryRequest) -> QueryResponse:
+        return await cls._coalesced("chat-langchain", query.prompt, lambda: cls._chat_langchain(query))
+
+    @classmethod
+    async def _chat_langchain(cls, query: QueryRequest) -> QueryResponse:
         messages = [
-            (
-                "system",
-                "You are a helpful assistant that translates English to French. Translate the user sentence.",
-            ),
+            ("system", TRANSLATE_SYSTEM_PROMPT),
             ("human", query.prompt),
         ]
 
-        ai_msg = cls.llm.invoke(messages)
+        with tracing.span("response_cache"):
+            key = cls._cache_key("chat-langchain", json.dumps(messages, ensure_ascii=False))
+            cached = await cls.response_cache.aget(key) if key else None
+        request_context.set_header("X-Cache", "HIT" if cached is not None else "MISS")
+        if cached is not None:
+            return QueryResponse(result=cached)
+
+        async with cls.scheduler.slot("chat-langchain"), cls.pool.lease() as backend, tracing.span("llm"):
+            async with deadline(cls._deadline("chat-langchain"), "chat-langchain"):
+                ai_msg = await cls._chain("translate", backend).ainvoke({"input": query.prompt})
+        cls._observe_usage("chat-langchain", ai_msg.response_metadata)
 
+        if key:
+            await cls.response_cache.aset(key, "chat-langchain", ai_msg.content)
         return QueryResponse(result=ai_msg.content)
 
     @classmethod
-    def chat_with_template(cls, query: QueryRequest) -> QueryResponse:
-        template = """Responda la pregunta basándose únicamente en el siguiente contexto:
-            {context}
-
-            Question: {question}
+    async def _rag_prompt(cls, question: str, vector):
         """
-        prompt = ChatPromptTemplate.from_template(template)
-        output_parser = StrOutputParser()
-
-        chain = (
-            RunnableMap(
-                {
-                    "context": lambda x: cls.retriever.invoke(x["question"]),
-                    "question": lambda x: x["question"],
-                }
-            )
-            | prompt
-            | cls.llm
-            | output_parser
-        )
+        Recupera el contexto con el embedding ya calculado de la pregunta y renderiza el prompt.
+        Devuelve el prompt y su clave de caché (el prompt ya incluye el contexto).
+        """
+        retriever = await cls._get_retriever()
+        with metrics.RETRIEVAL_LATENCY.labels("request-with-langchain").time(), tracing.span("retrieval"):
+            context = await retriever.adocuments_for_vector(vector)
+        with tracing.span("prompt_format", documents=len(context)):
+            prompt_value = await cls.chains.get("rag_prompt").ainvoke({"context": context, "question": question})
+            key = cls._cache_key("request-with-langchain", prompt_value.to_string())
+        return prompt_value, key
+
+    @classmethod
+    async def chat_with_template(cls, query: QueryRequest) -> QueryResponse:
+        return await cls._coalesced("request-with-langchain", query.prompt, lambda: cls._chat_with_template(query))
+
+    @classmethod
+    async def _chat_with_template(cls, query: QueryRequest) -> QueryResponse:
+        route = "request-with-langchain"
+        # El embedding de la pregunta se calcula una vez y sirve a la caché semántica y al retriever
+        with tracing.span("embed_query"):
+            vector = await cls.embeddings.aembed_query(query.prompt)
+        with tracing.span("semantic_cache"):
+            similar = cls.semantic_cache.lookup(route, vector)
+        if similar is not None:
+            request_context.set_header("X-Cache", "SEMANTIC")
+            request_context.set_header("X-Cache-Similarity", f"{similar[1]:.4f}")
+            return QueryResponse(result=similar[0])
+
+        prompt_value, key = await cls._rag_prompt(query.prompt, vector)
+        with tracing.span("response_cache"):
+            cached = await cls.response_cache.aget(key) if key else None
+        request_context.set_header("X-Cache", "HIT" if cached is not None else "MISS")
+        if cached is not None:
+            return QueryResponse(result=cached)
+
+        async with cls.scheduler.slot(route), cls.pool.lease() as backend, tracing.span("llm"):
+            async with deadline(cls._deadline(route), route):
+                ai_msg = await cls._chain("rag_answer", backend).ainvoke(prompt_value)
+        cls._observe_usage(route, ai_msg.response_metadata)
+
+        with tracing.span("cache_store"):
+            answer = ai_msg.content
+            if key:
+                await cls.response_cache.aset(key, route, answer)
+            cls.semantic_cache.add(route, vector, answer)
+        return QueryResponse(result=answer)
+
+    @classmethod
+    def stream_with_template(cls, query: QueryRequest):
+        """Versión streaming de chat_with_template usando astream del modelo."""
+        return cls._coalesced_stream("request-with-langchain", query.prompt, lambda: cls._stream_with_template(query))
+
+    @classmethod
+    async def _stream_with_template(cls, query: QueryRequest):
+        route = "request-with-langchain"
+        started, first_token_at = time.perf_counter(), None
+        with tracing.span("embed_query"):
+            vector = await cls.embeddings.aembed_query(query.prompt)
+        with tracing.span("semantic_cache"):
+            similar = cls.semantic_cache.lookup(route, vector)
+        if similar is not None:
+            yield {"token": similar[0]}
+            yield {"done": {**_final_event({}, started, time.perf_counter()), "cached": "semantic"}}
+            return
 
-        ai_msg = chain.invoke({"question": query.prompt})
+        prompt_value, key = await cls._rag_prompt(query.prompt, vector)
+        with tracing.span("response_cache"):
+            cached = await cls.response_cache.aget(key) if key else None
+        if cached is not None:
+            # Respuesta completa desde la caché: un único token y el evento final
+            yield {"token": cached}
+            yield {"done": {**_final_event({}, started, time.perf_counter()), "cached": "exact"}}
+            return
 
-        return QueryResponse(result=ai_msg)
+        metadata, tokens = {}, []
+        async with cls.scheduler.slot(route), cls.pool.lease() as backend, tracing.span("llm"):
+            async for chunk in first_within(backend.llm.astream(prompt_value), cls._deadline(route), route):
+                if chunk.content:
+                    first_token_at = first_token_at or time.perf_counter()
+                    tokens.append(chunk.content)
+                    yield {"token": chunk.content}
+                # ChatOllama adjunta el uso de Ollama en el último fragmento
+                metadata.update(chunk.response_metadata or {})
+        cls._observe_usage(route, metadata, started, first_token_at)
+        answer = "".join(tokens)
+        if key:
+            await cls.response_cache.aset(key, route, answer)
+        cls.semantic_cache.add(route, vector, answer)
+        yield {"done": {**_final_event(metadata, started, first_token_at), "cached": False}}
@@ -0,0 +1,35 @@
+from contextvars import ContextVar
+
+# Estado de la petición HTTP en curso. El middleware de main.py crea un dict nuevo por
+# petición; como el dict se comparte por referencia, lo que el servicio escriba en él es
+# visible para el middleware al armar la respuesta.
+_state: ContextVar[dict] = ContextVar("request_state")
+
+
+def begin() -> dict:
+    state = {"headers": {}}
+    _state.set(state)
+    return state
+
+
+def current() -> dict:
+    """Estado de la petición actual; fuera de una petición (scripts, tests) devuelve uno descartable."""
+    try:
+        return _state.get()
+    except LookupError:
+        return begin()
+
+
+def mark_headers_sent():
+    """Lo llama el middleware al armar la respuesta; en un stream el servicio sigue corriendo después."""
+    current()["headers_sent"] = True
+
+
+def set_header(name: str, value: str):
+    """
+    Agrega un encabezado a la respuesta. Si ya se enviaron (un stream en curso) no llegaría al
+    cliente, así que se descarta: esos valores van en el evento final del stream.
+    """
+    state = current()
+    if not state.get("headers_sent"):
+        state["headers"][name] = value
@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import logging
+from typing import List
+
+import httpx
+
+from app.services.backend_pool import BackendPool
+
+logger = logging.getLogger(__name__)
+
+# Una carga de más de esto (load_duration de Ollama) se cuenta como arranque en frío
+COLD_START_MS = 500
+
+
+class ResidencyManager:
+    """
+    Mantiene los modelos cargados en memoria en los backends de Ollama.
+
+    - preload(): carga cada modelo en cada backend al iniciar la app.
+    - keep_alive(): cuánto tiempo (segundos) pide cada llamada que Ollama conserve el modelo;
+      en horario laboral `hot_keep_alive` y fuera de él `idle_keep_alive`, para liberar la
+      memoria cuando no hay tráfico.
+    - En horario laboral un keeper en segundo plano vuelve a pedir la carga cada `interval`
+      segundos: si el modelo sigue cargado solo renueva su keep_alive, si fue expulsado lo
+      recarga antes de que llegue la próxima petición.
+    - observe(): registra el load_duration de cada respuesta para ver los arranques en frío.
+    """
+
+    def __init__(
+        self,
+        pool: BackendPool,
+        models: List[str],
+        hot_keep_alive: int,
+        idle_keep_alive: int,
+        start_hour: int,
+        end_hour: int,
+        weekdays: List[int],
+        interval: float = 60,
+    ):
+        self.pool = pool
+        self.models = list(dict.fromkeys(models))
+        self.hot_keep_alive = hot_keep_alive
+        self.idle_keep_alive = idle_keep_alive
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.weekdays = set(weekdays)
+        self.interval = interval
+        self._task: asyncio.Task = None
+        self.cold_starts = 0
+        self.last_load_ms = {}
+        self.preload_ms = {}
+        self.preload_errors = {}
+
+    def business_hours(self, now: datetime.datetime = None) -> bool:
+        now = now or datetime.datetime.now()
+        return now.weekday() in self.weekdays and self.start_hour <= now.hour < self.end_hour
+
+    def keep_alive(self) -> int:
+        return self.hot_keep_alive if self.business_hours() else self.idle_keep_alive
+
+    def apply(self):
+        """Propaga la política vigente a los modelos de LangChain de cada backend."""
+        keep_alive = self.keep_alive()
+        self.pool.keep_alive = keep_alive
+        for backend in self.pool.backends:
+            backend.llm.keep_alive = keep_alive
+            backend.embeddings.keep_alive = keep_alive
+
+    def observe(self, model: str, metadata: dict):
+        """Registra el load_duration (ns) de una respuesta de Ollama; devuelve los ms o None."""
+        load_duration = (metadata or {}).get("load_duration")
+        if load_duration is None:
+            return None
+        load_ms = load_duration / 1e6
+        self.last_load_ms[model] = load_ms
+        if load_ms >= COLD_START_MS:
+            self.cold_starts += 1
+            logger.info("Arranque en frío de %s: %.0f ms cargando el modelo", model, load_ms)
+        return load_ms
+
+    async def _load(self, backend, model: str):
+        payload = {"model": model, "keep_alive": self.keep_alive(), "stream": False}
+        try:
+            # Un prompt vacío solo carga el modelo (o renueva su keep_alive si ya está cargado)
+            data = await backend.client.post("/api/generate", payload)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 400:
+                raise
+            # Los modelos solo de embeddings no aceptan /api/generate
+            data = await backend.client.post("/api/embed", {**payload, "input": ""})
+        return data
+
+    async def preload(self):
+        """Carga todos los modelos en todos los backends, en paralelo; los errores se registran y no cortan el resto."""
+        self.apply()
+
+        async def load(backend, model):
+            name = f"{model}@{backend.url}"
+            try:
+                data = await self._load(backend, model)
+                self.preload_ms[name] = (data.get("load_duration") or 0) / 1e6
+                self.preload_errors.pop(name, None)
+            except Exception as e:
+                logger.warning("No se pudo precargar %s: %s", name, e)
+                self.preload_errors[name] = str(e)
+
+        await asyncio.gather(*(load(b, m) for b in self.pool.backends if b.healthy for m in self.models))
+
+    async def _keeper(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Cualquier error se registra y se reintenta en la próxima vuelta: si la tarea terminara,
+            # los modelos dejarían de mantenerse cargados sin ningún aviso. Solo la cancelación la corta
+            try:
+                self.apply()
+                if self.business_hours():
+                    await self.preload()
+            except Exception:
+                logger.exception("Falló la renovación de la residencia de modelos")
+
+    def start(self):
+        self._task = asyncio.create_task(self._keeper())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "models": self.models,
+            "business_hours": self.business_hours(),
+            "keep_alive": self.keep_alive(),
+            "cold_starts": self.cold_starts,
+            "last_load_ms": self.last_load_ms,
+            "preload_ms": self.preload_ms,
+            "preload_errors": self.preload_errors,
+        }
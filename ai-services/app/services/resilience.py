@@ -0,0 +1,191 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from app.services import metrics
+
+
+class DeadlineExceededError(Exception):
+    """Una llamada a Ollama superó su plazo (se responde 504)."""
+
+    def __init__(self, route: str, seconds: float):
+        super().__init__(f"La llamada a Ollama de {route} superó el plazo de {seconds:g} s")
+        self.route = route
+        self.seconds = seconds
+
+
+# Errores en los que el pedido no llegó a procesarse: reintentarlos no duplica trabajo en Ollama
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionError)
+
+
+# Plazos (asyncio.Timeout) activos en la tarea actual, para saber si una cancelación vino de uno
+_active_deadlines: ContextVar[tuple] = ContextVar("active_deadlines", default=())
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Espera antes del reintento `attempt` (1, 2, ...): exponencial con jitter completo, en segundos."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+@asynccontextmanager
+async def deadline(seconds: float, route: str):
+    """Cancela el bloque si tarda más de `seconds` (None o 0 = sin plazo) y lanza DeadlineExceededError."""
+    if not seconds:
+        yield
+        return
+    try:
+        async with asyncio.timeout(seconds) as timeout:
+            token = _active_deadlines.set(_active_deadlines.get() + (timeout,))
+            try:
+                yield
+            finally:
+                _active_deadlines.reset(token)
+    except TimeoutError:
+        metrics.DEADLINE_EXCEEDED.labels(route).inc()
+        raise DeadlineExceededError(route, seconds) from None
+
+
+def deadline_expired() -> bool:
+    """
+    True si venció alguno de los plazos que envuelven al código actual: dentro del bloque el
+    vencimiento llega como CancelledError y recién al salir de deadline() se convierte en
+    DeadlineExceededError. Distingue esa cancelación de otras (cliente desconectado, duplicado
+    que perdió).
+    """
+    return any(timeout.expired() for timeout in _active_deadlines.get())
+
+
+async def first_within(items, seconds: float, route: str):
+    """
+    Genera los elementos de un stream exigiendo que el primero llegue dentro del plazo. Después
+    ya no hay plazo: una generación larga no se corta y un backend trabado lo detecta el timeout
+    de lectura.
+    """
+    try:
+        async with deadline(seconds, route):
+            first = await anext(items, None)
+        if first is None:
+            return
+        yield first
+        async for item in items:
+            yield item
+    finally:
+        await items.aclose()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un backend: cerrado (normal), abierto (no recibe peticiones) o semiabierto.
+
+    Se abre tras `max_failures` errores seguidos. Pasado el enfriamiento queda semiabierto y deja
+    pasar una sola petición de prueba: si sale bien se cierra, si falla vuelve a abrirse con el
+    doble de enfriamiento (hasta `max_cooldown`). Mientras está abierto las peticiones no esperan
+    a un timeout: el pool elige otro backend o responde 503 enseguida.
+    """
+
+    def __init__(self, max_failures: int, cooldown: float, max_cooldown: float):
+        self.max_failures = max_failures
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.opens = 0
+
+    def available(self) -> bool:
+        if self.state == "closed":
+            return True
+        return time.monotonic() - self.opened_at >= self.cooldown and not self.trial
+
+    def acquire(self) -> bool:
+        """Marca el comienzo de una petición; devuelve True si es la prueba del estado semiabierto."""
+        if self.state == "closed":
+            return False
+        self.state, self.trial = "half_open", True
+        return True
+
+    def release(self):
+        """La prueba terminó sin un resultado que cuente (ej. cancelada o error del pedido)."""
+        self.trial = False
+
+    def record_success(self):
+        self.state, self.failures, self.trial = "closed", 0, False
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self) -> bool:
+        """Cuenta un error del backend; devuelve True si con él se abre el circuito."""
+        self.failures += 1
+        if self.state == "half_open":
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.trip()
+            return True
+        if self.state == "closed" and self.failures >= self.max_failures:
+            self.trip()
+            return True
+        return False
+
+    def trip(self):
+        if self.state != "open":
+            self.opens += 1
+        self.state, self.opened_at, self.trial = "open", time.monotonic(), False
+
+    def retry_after(self) -> float:
+        if self.state == "closed":
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "opens": self.opens, "retry_after": round(self.retry_after(), 1)}
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos y duplicados: cada petición suma `ratio` fichas (hasta `burst`) y
+    cada reintento o duplicado gasta una. Así, con Ollama caído, los reintentos no multiplican la
+    carga: a lo sumo agregan `ratio` llamadas extra por petición.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Últimas `window` latencias por ruta, para calcular cuándo conviene duplicar una petición."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+
+    def observe(self, key: str, seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, p: float):
+        """Percentil `p` de la ruta en segundos, o None si todavía hay pocas muestras."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
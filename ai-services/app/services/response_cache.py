@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Caché de respuestas exactas para prompts deterministas (temperature=0).
+
+    La clave es un hash de (ruta, modelo, opciones, prompt renderizado), por lo que dos
+    peticiones solo comparten respuesta si Ollama recibiría exactamente lo mismo.
+    Tiene dos niveles:
+        - memoria: LRU acotado a `max_items` con expiración por `ttl` segundos
+        - disco (opcional): tabla SQLite en `path`, sobrevive a los reinicios
+
+    Desde código asíncrono se usan aget/aset: un acierto en memoria se resuelve en el momento y
+    solo la lectura o escritura en SQLite (con su commit) pasa a un hilo.
+    """
+
+    def __init__(self, max_items: int = 1000, ttl: float = 3600, path: str = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.path = path
+        self._memory = OrderedDict()  # clave -> (ruta, respuesta, expira_en)
+        self._lock = threading.Lock()
+        # Lock aparte para SQLite: el event loop no espera un commit para consultar la memoria
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(route: str, model: str, options: dict, prompt: str) -> str:
+        raw = json.dumps([route, model, options, prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def cacheable(options: dict) -> bool:
+        """Solo se cachea lo que el modelo respondería siempre igual."""
+        return options.get("temperature") == 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._memory)}
+
+    def _connection(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, route TEXT, response TEXT, expires_at REAL)"
+            )
+        return self._db
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, key: str, now: float):
+        entry = self._memory.get(key)
+        if entry is not None and entry[2] <= now:
+            del self._memory[key]
+            entry = None
+        return entry
+
+    def _load(self, key: str, now: float):
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT route, response, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def _write(self, key: str, entry: tuple):
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, route, response, expires_at) VALUES (?, ?, ?, ?)",
+                (key, *entry),
+            )
+            db.commit()
+
+    def _result(self, key: str, entry: tuple, loaded: bool = False):
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if loaded:
+                self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, key: str):
+        """Devuelve la respuesta guardada o None si no existe o ya expiró."""
+        now = time.time()
+        with self._lock:
+            entry = self._from_memory(key, now)
+        if entry is None and self.path:
+            entry = self._load(key, now)
+            return self._result(key, entry, loaded=True)
+        return self._result(key, entry)
+
+    async def aget(self, key: str):
+        """Como get, con la consulta a SQLite (si no está en memoria) en un hilo."""
+        now = time.time()
+        with self._lock:
+            entry = self._from_memory(key, now)
+        if entry is None and self.path:
+            entry = await asyncio.to_thread(self._load, key, now)
+            return self._result(key, entry, loaded=True)
+        return self._result(key, entry)
+
+    def _entry(self, key: str, route: str, response: str) -> tuple:
+        entry = (route, response, time.time() + self.ttl)
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, route: str, response: str):
+        entry = self._entry(key, route, response)
+        if self.path:
+            self._write(key, entry)
+
+    async def aset(self, key: str, route: str, response: str):
+        """Como set, con la escritura en SQLite y su commit en un hilo."""
+        entry = self._entry(key, route, response)
+        if self.path:
+            await asyncio.to_thread(self._write, key, entry)
+
+    def purge(self, route: str = None) -> int:
+        """Borra todas las entradas, o solo las de `route`; devuelve cuántas había en memoria y disco."""
+        with self._lock:
+            keys = [k for k, entry in self._memory.items() if route is None or entry[0] == route]
+            for k in keys:
+                del self._memory[k]
+            purged = len(keys)
+        if self.path:
+            with self._db_lock:
+                db = self._connection()
+                if route is None:
+                    cursor = db.execute("DELETE FROM responses")
+                else:
+                    cursor = db.execute("DELETE FROM responses WHERE route = ?", (route,))
+                db.commit()
+            purged = max(purged, cursor.rowcount)
+        return purged
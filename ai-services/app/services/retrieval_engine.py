@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Filas de la matriz que se multiplican por bloque; acota la memoria temporal de la búsqueda exacta
+BLOCK_ROWS = 65536
+# Desde cuántos vectores asearch corre la búsqueda en un hilo (por debajo, el salto de hilo cuesta más)
+THREAD_MIN_ROWS = 20_000
+
+
+def normalize(vectors) -> np.ndarray:
+    """Normaliza filas (o un vector) a norma 1 en float32, para que el producto punto sea el coseno."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int):
+    """Top-k por fila con argpartition (O(n)) y orden solo de los k elegidos."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0), dtype=np.int64)
+        return empty, np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class IVFIndex:
+    """
+    Índice aproximado IVF (inverted file) para similitud coseno.
+
+    Agrupa los vectores con k-means esférico en `nlist` centroides y guarda, por centroide,
+    la lista de posiciones asignadas (en formato CSR: `order` + `offsets`). Una consulta solo
+    compara contra los vectores de los `nprobe` centroides más cercanos.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = None, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        n = vectors.shape[0]
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        # k-means sobre una muestra; con ~40 puntos por centroide alcanza para ubicarlos
+        sample = vectors[np.sort(rng.choice(n, size=min(n, nlist * 40), replace=False))]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            # Un centroide sin puntos se reubica en un punto al azar de la muestra
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment = np.empty(n, dtype=np.int32)
+        for start in range(0, n, BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS])
+            assignment[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+        return cls(centroids, order, offsets)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.centroids.shape[0])
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+
+class RetrievalEngine:
+    """
+    Motor de búsqueda top-k sobre una matriz contigua de vectores float32 normalizados.
+
+    La búsqueda exacta multiplica todas las consultas por bloques de la matriz y se queda con
+    los k mejores de cada bloque con argpartition. A partir de `ann_threshold` vectores se puede
+    entrenar un IVFIndex (build_ann) y las búsquedas pasan a ser aproximadas.
+    """
+
+    def __init__(self, vectors: np.ndarray, ann_threshold: int = 100_000, nprobe: int = 16):
+        self.vectors = vectors
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.ann = None
+
+    @property
+    def count(self) -> int:
+        return self.vectors.shape[0]
+
+    def build_ann(self, nlist: int = None):
+        """Entrena el índice IVF si la matriz supera el umbral; es CPU intensivo, conviene llamarlo en un hilo."""
+        if self.count < self.ann_threshold:
+            return
+        started = time.perf_counter()
+        self.ann = IVFIndex.train(self.vectors, nlist)
+        logger.info(
+            "Índice IVF con %d listas para %d vectores en %.1fs",
+            self.ann.centroids.shape[0], self.count, time.perf_counter() - started,
+        )
+
+    def search_exact(self, queries: np.ndarray, k: int):
+        best_ids = best_scores = None
+        for start in range(0, self.count, BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            ids, scores = _top_k(queries @ block.T, k)
+            ids += start
+            if best_ids is not None:
+                ids = np.concatenate([best_ids, ids], axis=1)
+                scores = np.concatenate([best_scores, scores], axis=1)
+                keep, scores = _top_k(scores, k)
+                ids = np.take_along_axis(ids, keep, axis=1)
+            best_ids, best_scores = ids, scores
+        return best_ids, best_scores
+
+    def search_ann(self, queries: np.ndarray, k: int, nprobe: int = None):
+        ids, scores = [], []
+        for query in queries:
+            candidates = self.ann.candidates(query, nprobe or self.nprobe)
+            if len(candidates) == 0:
+                # Todas las listas revisadas están vacías (índice chico o muy desparejo): búsqueda exacta
+                exact_ids, exact_scores = self.search_exact(query[None, :], k)
+                ids.append(exact_ids[0])
+                scores.append(exact_scores[0])
+                continue
+            top, top_scores = _top_k((self.vectors[candidates] @ query)[None, :], k)
+            ids.append(candidates[top[0]])
+            scores.append(top_scores[0])
+        return ids, scores
+
+    def search(self, queries, k: int = 4) -> list:
+        """
+        Devuelve, por consulta, [(posición, similitud coseno)] de los k vectores más parecidos.
+        Acepta un vector o una matriz de consultas (una por fila).
+        """
+        if self.count == 0:
+            return [[]] * len(np.atleast_2d(queries))
+        queries = normalize(np.atleast_2d(queries))
+        ids, scores = self.search_ann(queries, k) if self.ann is not None else self.search_exact(queries, k)
+        return [
+            [(int(i), float(s)) for i, s in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
+
+    async def asearch(self, queries, k: int = 4) -> list:
+        """Como search; con índices grandes corre en un hilo para no bloquear el event loop."""
+        if self.count >= THREAD_MIN_ROWS:
+            return await asyncio.to_thread(self.search, queries, k)
+        return self.search(queries, k)
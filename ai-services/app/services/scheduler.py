@@ -0,0 +1,116 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+from app.services import metrics, request_context, tracing
+
+
+class QueueFullError(Exception):
+    """La cola de espera hacia Ollama está llena; la petición se rechaza con 429."""
+
+    def __init__(self, route: str, retry_after: int):
+        super().__init__(f"Cola llena para {route}; reintentar en {retry_after}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Control de admisión delante de Ollama.
+
+    Permite como máximo `max_inflight` llamadas de generación simultáneas. Las demás esperan
+    en una cola ordenada por prioridad de ruta (número menor = se atiende antes) y, dentro de
+    una prioridad, por orden de llegada. Si ya hay `max_queue` esperando, la petición se
+    rechaza enseguida con QueueFullError en lugar de acumularse dentro de Ollama.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, priorities: dict = None, default_priority: int = 5):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.priorities = priorities or {}
+        self.default_priority = default_priority
+        self.inflight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        # Promedio móvil de la duración de una generación, para estimar Retry-After
+        self._service_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere lugar en la cola."""
+        return max(1, math.ceil(self.queued * self._service_time / self.max_inflight))
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_generation_s": round(self._service_time, 3),
+        }
+
+    async def _acquire(self, route: str):
+        if self.inflight < self.max_inflight and not self.queued:
+            self.inflight += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            metrics.QUEUE_REJECTED.labels(route).inc()
+            raise QueueFullError(route, self.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        entry = (self.priorities.get(route, self.default_priority), next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # El lugar ya se había cedido a esta petición: se devuelve
+                self._release()
+            elif entry in self._waiters:
+                # Sale de la cola enseguida para no inflar queued ni el Retry-After estimado
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        # El lugar pasa directo al siguiente en espera, sin bajar inflight
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self, route: str):
+        """
+        Ocupa un lugar de generación durante el bloque. El tiempo en cola y el de generación
+        se registran por separado en la petición (X-Queue-Wait-Ms / X-Generation-Ms; en los
+        streams X-Generation-Ms no se puede enviar y va como generation_ms del evento final).
+        """
+        queued_at = time.perf_counter()
+        await self._acquire(route)
+        started = time.perf_counter()
+        self.admitted += 1
+        state = request_context.current()
+        state["queue_wait_ms"] = state.get("queue_wait_ms", 0) + (started - queued_at) * 1000
+        request_context.set_header("X-Queue-Wait-Ms", f"{state['queue_wait_ms']:.1f}")
+        metrics.QUEUE_WAIT.labels(route).observe(started - queued_at)
+        tracing.record("queue_wait", queued_at, started, route=route)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+            metrics.GENERATION.labels(route).observe(elapsed)
+            state["generation_ms"] = state.get("generation_ms", 0) + elapsed * 1000
+            request_context.set_header("X-Generation-Ms", f"{state['generation_ms']:.1f}")
+            self._release()
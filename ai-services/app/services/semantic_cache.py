@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class _RouteCache:
+    """Vectores de preguntas ya respondidas de una ruta, en una matriz float32 contigua."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.answers = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+
+
+class SemanticCache:
+    """
+    Caché semántica: responde preguntas casi idénticas con una respuesta anterior.
+
+    Guarda por ruta el embedding normalizado de cada pregunta respondida y, ante una pregunta
+    nueva, calcula en una sola multiplicación matriz-vector la similitud coseno con todas.
+    Si la mejor supera el umbral de la ruta se devuelve esa respuesta sin llamar al modelo.
+    Cuando una ruta llega a `capacity` se desaloja la entrada usada hace más tiempo.
+    """
+
+    def __init__(self, threshold: float = 0.92, thresholds: dict = None, capacity: int = 1000):
+        self.threshold = threshold
+        self.thresholds = thresholds or {}
+        self.capacity = capacity
+        self._routes = {}
+        self._clock = 0
+        self.lookups = 0
+        self.avoided_calls = {}
+
+    def threshold_for(self, route: str) -> float:
+        return self.thresholds.get(route, self.threshold)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1)
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def lookup(self, route: str, vector):
+        """Devuelve (respuesta, similitud) de la pregunta más parecida sobre el umbral, o None."""
+        self.lookups += 1
+        store = self._routes.get(route)
+        if store is None or store.count == 0:
+            return None
+        query = self._normalize(vector)
+        scores = store.vectors[: store.count] @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold_for(route):
+            return None
+        store.last_used[best] = self._tick()
+        self.avoided_calls[route] = self.avoided_calls.get(route, 0) + 1
+        return store.answers[best], float(scores[best])
+
+    def add(self, route: str, vector, answer: str):
+        query = self._normalize(vector)
+        store = self._routes.get(route)
+        if store is None:
+            store = self._routes[route] = _RouteCache(self.capacity, query.shape[0])
+        if store.count < self.capacity:
+            slot = store.count
+            store.count += 1
+        else:
+            slot = int(np.argmin(store.last_used))
+        store.vectors[slot] = query
+        store.answers[slot] = answer
+        store.last_used[slot] = self._tick()
+
+    def purge(self, route: str = None) -> int:
+        routes = list(self._routes) if route is None else [route]
+        purged = 0
+        for r in routes:
+            store = self._routes.pop(r, None)
+            purged += store.count if store else 0
+        return purged
+
+    def stats(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "avoided_calls": self.avoided_calls,
+            "size": {route: store.count for route, store in self._routes.items()},
+        }
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Tuple
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Estimación barata de tokens (~4 caracteres por token en Llama); alcanza para acotar el prompt."""
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+class Session:
+    """Historial de una conversación: turnos (rol, texto, tokens) y el resumen de los turnos viejos."""
+
+    __slots__ = ("id", "turns", "summary", "updated")
+
+    def __init__(self, session_id: str, turns: List[Tuple[str, str, int]] = None, summary: str = "", updated: float = None):
+        self.id = session_id
+        self.turns = turns or []
+        self.summary = summary
+        self.updated = updated or time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "summary": self.summary,
+            "turns": [{"role": role, "content": content, "tokens": tokens} for role, content, tokens in self.turns],
+            "updated": self.updated,
+        }
+
+
+class SessionStore:
+    """
+    Historial de conversaciones por id de sesión.
+
+    En memoria es un LRU de `max_sessions` sesiones que expiran tras `ttl` segundos sin uso.
+    Con `path` cada sesión se guarda además en SQLite, así sobrevive a los reinicios y a la
+    expulsión del LRU.
+
+    window() arma el historial que entra en un presupuesto de tokens: el resumen (si hay) y
+    los turnos más recientes que quepan. Los turnos que quedan afuera se pueden resumir con
+    fold() para no perder el contexto viejo.
+
+    Desde código asíncrono se usan aget, aget_or_create, asave, afold y adelete: la memoria se
+    consulta en el momento y solo la lectura o escritura en SQLite (con su commit) pasa a un hilo.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 86400, path: str = None, chars_per_token: float = 4.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.path = path
+        self.chars_per_token = chars_per_token
+        self._memory = OrderedDict()  # id -> Session
+        self._lock = threading.Lock()
+        # Lock aparte para SQLite: el event loop no espera un commit para consultar la memoria
+        self._db_lock = threading.Lock()
+        self._db = None
+
+    def tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._memory)}
+
+    def _connection(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, summary TEXT, turns TEXT, updated REAL)"
+            )
+        return self._db
+
+    def _remember(self, session: Session):
+        self._memory[session.id] = session
+        self._memory.move_to_end(session.id)
+        while len(self._memory) > self.max_sessions:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, session_id: str, expired_before: float):
+        with self._lock:
+            session = self._memory.get(session_id)
+            if session is not None and session.updated <= expired_before:
+                del self._memory[session_id]
+                session = None
+            if session is not None:
+                self._memory.move_to_end(session_id)
+            return session
+
+    def _load(self, session_id: str, expired_before: float):
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT summary, turns, updated FROM sessions WHERE id = ? AND updated > ?",
+                (session_id, expired_before),
+            ).fetchone()
+        if row is None:
+            return None
+        turns = [tuple(turn) for turn in json.loads(row[1])]
+        return Session(session_id, turns, row[0], row[2])
+
+    def _loaded(self, session: Session):
+        with self._lock:
+            # Otra petición pudo cargar o crear la misma sesión mientras se leía el disco
+            current = self._memory.get(session.id)
+            if current is not None and current.updated >= session.updated:
+                return current
+            self._remember(session)
+            return session
+
+    def get(self, session_id: str):
+        """Devuelve la sesión o None si no existe o expiró."""
+        expired_before = time.time() - self.ttl
+        session = self._from_memory(session_id, expired_before)
+        if session is None and self.path:
+            session = self._load(session_id, expired_before)
+            if session is not None:
+                session = self._loaded(session)
+        return session
+
+    async def aget(self, session_id: str):
+        """Como get, con la consulta a SQLite (si no está en memoria) en un hilo."""
+        expired_before = time.time() - self.ttl
+        session = self._from_memory(session_id, expired_before)
+        if session is None and self.path:
+            session = await asyncio.to_thread(self._load, session_id, expired_before)
+            if session is not None:
+                session = self._loaded(session)
+        return session
+
+    def _create(self, session_id: str = None) -> Session:
+        session = Session(session_id or uuid.uuid4().hex)
+        with self._lock:
+            self._remember(session)
+        return session
+
+    def get_or_create(self, session_id: str = None) -> Session:
+        session = self.get(session_id) if session_id else None
+        return session if session is not None else self._create(session_id)
+
+    async def aget_or_create(self, session_id: str = None) -> Session:
+        session = await self.aget(session_id) if session_id else None
+        return session if session is not None else self._create(session_id)
+
+    def _row(self, session: Session) -> tuple:
+        """Marca la sesión como usada y arma la fila a guardar (en el hilo que la modifica)."""
+        session.updated = time.time()
+        with self._lock:
+            self._remember(session)
+        return session.id, session.summary, json.dumps(session.turns, ensure_ascii=False), session.updated
+
+    def _write(self, row: tuple):
+        with self._db_lock:
+            db = self._connection()
+            # Si dos escrituras de la misma sesión terminan en otro orden, gana la más nueva
+            db.execute(
+                "INSERT INTO sessions (id, summary, turns, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, turns = excluded.turns, "
+                "updated = excluded.updated WHERE excluded.updated >= sessions.updated",
+                row,
+            )
+            db.commit()
+
+    def save(self, session: Session):
+        row = self._row(session)
+        if self.path:
+            self._write(row)
+
+    async def asave(self, session: Session):
+        """Como save, con la escritura en SQLite y su commit en un hilo."""
+        row = self._row(session)
+        if self.path:
+            await asyncio.to_thread(self._write, row)
+
+    def append(self, session: Session, role: str, content: str):
+        session.turns.append((role, content, self.tokens(content)))
+
+    def _remove(self, session_id: str) -> bool:
+        with self._db_lock:
+            db = self._connection()
+            found = db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+            db.commit()
+        return found
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._memory.pop(session_id, None) is not None
+        if self.path:
+            found = self._remove(session_id) or found
+        return found
+
+    async def adelete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._memory.pop(session_id, None) is not None
+        if self.path:
+            found = await asyncio.to_thread(self._remove, session_id) or found
+        return found
+
+    def window(self, session: Session, budget: int) -> Tuple[list, int, int]:
+        """
+        Historial que entra en `budget` tokens: los turnos más recientes, precedidos del resumen.
+        Devuelve (mensajes, tokens usados, cantidad de turnos viejos que quedaron afuera).
+        """
+        summary_tokens = self.tokens(session.summary)
+        used = summary_tokens if summary_tokens <= budget else 0
+        start = len(session.turns)
+        while start > 0 and used + session.turns[start - 1][2] <= budget:
+            start -= 1
+            used += session.turns[start][2]
+        messages = []
+        if session.summary and summary_tokens <= budget:
+            messages.append({"role": "system", "content": f"Resumen de la conversación anterior: {session.summary}"})
+        messages += [{"role": role, "content": content} for role, content, _ in session.turns[start:]]
+        return messages, used, start
+
+    def fold(self, session: Session, dropped: int, summary: str):
+        """Reemplaza los primeros `dropped` turnos por `summary` (que ya los incluye junto al resumen previo)."""
+        session.turns = session.turns[dropped:]
+        session.summary = summary
+        self.save(session)
+
+    async def afold(self, session: Session, dropped: int, summary: str):
+        session.turns = session.turns[dropped:]
+        session.summary = summary
+        await self.asave(session)
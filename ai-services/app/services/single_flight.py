@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+
+from app.services import metrics, request_context, tracing
+
+
+class SharedFlightError(Exception):
+    """
+    Error de una llamada compartida, uno nuevo por suscriptor (el original queda en __cause__).
+
+    wrap() crea una subclase que además hereda del tipo original, así lo que distingue errores
+    por tipo sigue funcionando (los manejadores de main.py: 429 por cola llena, 503 sin backend,
+    504 por plazo; y el `except UPSTREAM_ERRORS` de las rutas, que responde 500), sin que varias
+    peticiones relancen y modifiquen el mismo objeto de excepción.
+    """
+
+    _subclasses = {}
+
+    @classmethod
+    def wrap(cls, error: Exception) -> "SharedFlightError":
+        kind = type(error)
+        subclass = cls._subclasses.get(kind)
+        if subclass is None:
+            subclass = cls._subclasses[kind] = type(kind.__name__, (kind, cls), {"__module__": kind.__module__})
+        # Sin pasar por __init__ (cada tipo tiene su firma): mismos args y atributos que el original
+        wrapped = subclass.__new__(subclass, *error.args)
+        wrapped.__dict__.update(getattr(error, "__dict__", {}))
+        return wrapped
+
+
+class _Flight:
+    """Una llamada en curso y quienes esperan su resultado (en streaming, los eventos emitidos hasta ahora)."""
+
+    __slots__ = ("task", "state", "waiters", "events", "changed", "finished", "error")
+
+    def __init__(self):
+        self.task: asyncio.Task = None
+        # Estado de petición propio de la llamada compartida (encabezados, tiempos y traza)
+        self.state: dict = None
+        self.waiters = 0
+        self.events = []
+        self.changed = asyncio.Event()
+        self.finished = False
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Agrupa peticiones idénticas que llegan mientras otra igual está en curso.
+
+    La primera petición con una clave ejecuta la llamada (recuperación + generación) en una
+    tarea aparte; las que llegan con la misma clave antes de que termine esperan esa tarea
+    en lugar de hacer la suya, y todas reciben el mismo resultado o el mismo error. En
+    streaming, cada suscriptor recibe todos los eventos desde el primero (los ya emitidos y
+    los siguientes a medida que llegan).
+
+    La tarea corre con un estado de petición propio y no con el de quien la inició: al terminar,
+    sus encabezados (X-Cache, X-Queue-Wait-Ms, ...) y sus spans se copian a cada suscriptor por
+    igual.
+
+    La tarea compartida no se cancela si se desconecta quien la inició: solo cuando no queda
+    nadie esperándola. Al terminar se olvida la clave; las peticiones posteriores ya
+    encuentran la respuesta en las cachés.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights = {}
+        self.saved = {}
+
+    @staticmethod
+    def key(kind: str, route: str, model: str, prompt: str) -> str:
+        """
+        Clave por (tipo de respuesta, ruta, modelo, prompt con los espacios colapsados). Solo se
+        normalizan los espacios: mayúsculas distintas pueden dar otra respuesta del modelo.
+        """
+        normalized = " ".join(prompt.split())
+        raw = json.dumps([kind, route, model, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def in_flight(self, key: str) -> bool:
+        flight = self._flights.get(key)
+        return flight is not None and not flight.task.cancelled()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "saved": dict(self.saved)}
+
+    def _join(self, key: str, route: str, start) -> _Flight:
+        flight = self._flights.get(key)
+        # Una llamada cancelada (se fueron todos) que todavía no se olvidó no sirve para unirse
+        if flight is None or flight.task.cancelled():
+            flight = self._flights[key] = _Flight()
+            context = contextvars.copy_context()
+            flight.state = context.run(self._begin, route)
+            flight.task = asyncio.get_running_loop().create_task(start(flight), context=context)
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.saved[route] = self.saved.get(route, 0) + 1
+            metrics.SINGLE_FLIGHT_SAVED.labels(route).inc()
+        flight.waiters += 1
+        return flight
+
+    @staticmethod
+    def _begin(route: str) -> dict:
+        """Estado neutro para la tarea compartida: sin los encabezados ni la traza de quien la inicia."""
+        state = request_context.begin()
+        tracing.begin(route, "single-flight", force=True)
+        return state
+
+    @staticmethod
+    def _share(flight: _Flight):
+        """Copia a la petición actual los encabezados y spans de la llamada compartida."""
+        for name, value in flight.state["headers"].items():
+            request_context.set_header(name, value)
+        tracing.adopt(flight.state.get("trace"))
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @staticmethod
+    def _leave(flight: _Flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def do(self, key: str, route: str, call):
+        """Devuelve el resultado de `call()` (una corrutina), compartido con las peticiones idénticas en curso."""
+        if not self.enabled:
+            return await call()
+
+        async def start(flight):
+            return await call()
+
+        flight = self._join(key, route, start)
+        try:
+            # shield: si esta petición se cancela, la llamada sigue para las demás
+            result = await asyncio.shield(flight.task)
+        except Exception as e:
+            self._share(flight)
+            raise SharedFlightError.wrap(e) from e
+        finally:
+            self._leave(flight)
+        self._share(flight)
+        return result
+
+    async def stream(self, key: str, route: str, events):
+        """Genera los eventos de `events()` (un generador asíncrono), compartidos con los streams idénticos en curso."""
+        if not self.enabled:
+            async for event in events():
+                yield event
+            return
+
+        async def produce(flight):
+            # El error se guarda para los suscriptores y no se relanza (nadie espera el resultado de
+            # la tarea); la cancelación sí, para que la tarea quede cancelada
+            try:
+                async for event in events():
+                    flight.events.append(event)
+                    self._notify(flight)
+            except Exception as e:
+                flight.error = e
+            finally:
+                flight.finished = True
+                self._notify(flight)
+
+        flight = self._join(key, route, produce)
+        try:
+            sent = 0
+            while True:
+                changed = flight.changed
+                while sent < len(flight.events):
+                    yield flight.events[sent]
+                    sent += 1
+                if flight.finished:
+                    if sent == len(flight.events):
+                        self._share(flight)
+                        # Propaga el error del stream compartido (si lo hubo), uno nuevo por suscriptor
+                        if flight.error is not None:
+                            raise SharedFlightError.wrap(flight.error) from flight.error
+                        return
+                    continue
+                await changed.wait()
+        finally:
+            self._leave(flight)
+
+    @staticmethod
+    def _notify(flight: _Flight):
+        # Un Event nuevo por evento: los suscriptores que esperaban el anterior se despiertan todos
+        changed, flight.changed = flight.changed, asyncio.Event()
+        changed.set()
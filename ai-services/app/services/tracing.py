@@ -0,0 +1,162 @@
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+import uuid
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from app.services import request_context
+
+logger = logging.getLogger(__name__)
+
+# Logger aparte que solo escribe las trazas (una línea JSON por petición) en un archivo rotativo
+_export = logging.getLogger("app.traces")
+_export.propagate = False
+_NOOP = nullcontext()
+# Fracción de peticiones que se trazan; la fija configure() al iniciar la app
+SAMPLE_RATE = 0.0
+# Anidamiento del span en curso. Es por contexto y no de la traza: las tareas concurrentes de una
+# misma petición (hedging, pasos en paralelo, lotes) heredan el valor al crearse y luego llevan el suyo
+_depth: ContextVar[int] = ContextVar("trace_depth", default=0)
+
+
+class Trace:
+    """Spans de una petición muestreada: cada uno con nombre, inicio relativo, duración y atributos."""
+
+    __slots__ = ("request_id", "route", "method", "started", "wall_started", "spans", "finished")
+
+    def __init__(self, request_id: str, route: str, method: str):
+        self.request_id = request_id
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []
+        self.finished = False
+
+    def add(self, name: str, start: float, end: float, depth: int = None, **attrs):
+        if self.finished:
+            return
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "ms": round((end - start) * 1000, 3),
+            "depth": _depth.get() if depth is None else depth,
+            **attrs,
+        })
+
+    def to_dict(self, status: int) -> dict:
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "method": self.method,
+            "status": status,
+            "ts": self.wall_started,
+            "ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": self.spans,
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start", "depth")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.depth = _depth.get()
+        _depth.set(self.depth + 1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # set y no reset(token): en un stream el span puede cerrarse desde otro contexto que el que lo abrió
+        _depth.set(self.depth)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add(self.name, self.start, time.perf_counter(), self.depth, **self.attrs)
+        return False
+
+    # También sirve en `async with`, junto a otros contextos asíncronos
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def configure(path: str, max_bytes: int, backups: int, sample_rate: float):
+    """Abre el archivo de trazas; sin `path` o con muestreo 0 no se traza nada."""
+    global SAMPLE_RATE
+    SAMPLE_RATE = sample_rate if path else 0.0
+    for handler in list(_export.handlers):
+        _export.removeHandler(handler)
+        handler.close()
+    if SAMPLE_RATE > 0:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _export.addHandler(handler)
+        _export.setLevel(logging.INFO)
+
+
+def begin(route: str, method: str, request_id: str = None, force: bool = False) -> str:
+    """
+    Decide si la petición en curso se traza (con probabilidad SAMPLE_RATE, o siempre con
+    `force`) y devuelve su id, que se usa igual aunque no se muestree.
+    """
+    request_id = request_id or uuid.uuid4().hex
+    _depth.set(0)
+    state = request_context.current()
+    state["request_id"] = request_id
+    if SAMPLE_RATE > 0 and (force or random.random() < SAMPLE_RATE):
+        state["trace"] = Trace(request_id, route, method)
+    return request_id
+
+
+def span(name: str, **attrs):
+    """
+    Mide un bloque como span de la traza actual. Si la petición no se muestreó devuelve un
+    contexto vacío, así que el costo es una búsqueda en el estado de la petición.
+    """
+    trace = request_context.current().get("trace")
+    return _Span(trace, name, attrs) if trace is not None else _NOOP
+
+
+def record(name: str, start: float, end: float, **attrs):
+    """Agrega un span ya medido (con tiempos de time.perf_counter())."""
+    trace = request_context.current().get("trace")
+    if trace is not None:
+        trace.add(name, start, end, **attrs)
+
+
+def adopt(other: Trace):
+    """
+    Copia a la traza actual los spans de `other`, otra traza medida aparte (ej. la de una llamada
+    compartida por single-flight), con sus tiempos relativos al inicio de esta petición.
+    """
+    trace = request_context.current().get("trace")
+    if trace is None or other is None or trace.finished:
+        return
+    offset = (other.started - trace.started) * 1000
+    depth = _depth.get()
+    for span in other.spans:
+        trace.spans.append({**span, "start_ms": round(span["start_ms"] + offset, 3), "depth": span["depth"] + depth})
+
+
+def finish(state: dict, status: int, route: str = None):
+    """Exporta la traza de la petición (si se muestreó); `route` reemplaza la URL por la plantilla."""
+    trace = state.get("trace")
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    trace.route = route or trace.route
+    try:
+        _export.info(json.dumps(trace.to_dict(status), ensure_ascii=False))
+    except Exception as e:
+        logger.warning("No se pudo exportar la traza %s: %s", trace.request_id, e)
@@ -0,0 +1,250 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import List
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app.services.retrieval_engine import RetrievalEngine, normalize
+
+INDEX_VERSION = 1
+
+
+class IndexModelMismatchError(Exception):
+    """El índice en disco fue embebido con otro modelo de embeddings: no se le pueden agregar vectores."""
+
+
+@contextmanager
+def file_lock(path: str):
+    """Lock exclusivo entre procesos (flock sobre <path>.lock), para los workers de uvicorn."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class VectorIndex:
+    """
+    Índice de vectores persistido en disco y abierto con memory-map.
+
+    Un índice `<path>` se guarda en cuatro archivos:
+        - <path>.f32  matriz float32 (count x dim) con los vectores ya normalizados
+        - <path>.txt  textos en UTF-8 concatenados
+        - <path>.off  offsets int64 (count + 1) de cada texto dentro de <path>.txt
+        - <path>.json metadatos: modelo de embeddings, huella del corpus, dim y count
+
+    Abrir el índice no lee los datos: np.memmap mapea los archivos y el sistema operativo
+    carga las páginas a demanda, compartiéndolas entre todos los workers de uvicorn.
+    """
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self.model = meta["model"]
+        self.fingerprint = meta["fingerprint"]
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        if self.count:
+            self.vectors = np.memmap(f"{path}.f32", dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            self._offsets = np.memmap(f"{path}.off", dtype=np.int64, mode="r", shape=(self.count + 1,))
+            self._texts = np.memmap(f"{path}.txt", dtype=np.uint8, mode="r")
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+    @staticmethod
+    def fingerprint_of(model: str, texts: List[str]) -> str:
+        """Huella del par (modelo, corpus): si cambia cualquiera de los dos hay que reconstruir."""
+        digest = hashlib.sha256(model.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\0")
+            digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    @classmethod
+    def open(cls, path: str):
+        """Abre un índice existente; devuelve None si no existe o es de otra versión."""
+        try:
+            with open(f"{path}.json", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if meta.get("version") != INDEX_VERSION:
+            return None
+        return cls(path, meta)
+
+    @classmethod
+    def build(cls, path: str, model: str, texts: List[str], vectors) -> "VectorIndex":
+        """Escribe un índice nuevo en disco y lo devuelve abierto."""
+        matrix = normalize(vectors)
+
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+        meta = {
+            "version": INDEX_VERSION,
+            "model": model,
+            "fingerprint": cls.fingerprint_of(model, texts),
+            "dim": int(matrix.shape[1]),
+            "count": len(texts),
+        }
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Se escribe a archivos temporales y se renombra; el .json va último porque marca
+        # el índice como completo. Varios workers que reconstruyan a la vez producen el mismo
+        # contenido, así que no importa cuál renombre al final.
+        tmp = f".{os.getpid()}.tmp"
+        matrix.tofile(f"{path}.f32{tmp}")
+        offsets.tofile(f"{path}.off{tmp}")
+        with open(f"{path}.txt{tmp}", "wb") as f:
+            f.write(b"".join(encoded))
+        with open(f"{path}.json{tmp}", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        for suffix in (".f32", ".off", ".txt", ".json"):
+            os.replace(f"{path}{suffix}{tmp}", f"{path}{suffix}")
+
+        return cls(path, meta)
+
+    @staticmethod
+    def stamp(path: str):
+        """
+        Versión en disco del índice (inodo y mtime del .json, que se reemplaza en cada escritura),
+        o None si no existe. Si cambió, otro proceso lo modificó y hay que reabrirlo.
+        """
+        try:
+            info = os.stat(f"{path}.json")
+        except FileNotFoundError:
+            return None
+        return info.st_ino, info.st_mtime_ns
+
+    @classmethod
+    def append_shared(cls, path: str, model: str, texts: List[str], vectors) -> "VectorIndex":
+        """
+        Agrega al índice `path` (creándolo si no existe) con el lock entre procesos tomado, y lo
+        devuelve reabierto. Se relee del disco dentro del lock para incluir lo que agregaron otros
+        workers. Bloquea: llamarlo en un hilo.
+        """
+        with file_lock(path):
+            index = cls.open(path)
+            if index is None:
+                index = cls.create_empty(path, model, len(vectors[0]))
+            elif index.model != model:
+                raise IndexModelMismatchError(
+                    f"{path} fue embebido con {index.model} y el modelo actual es {model}; "
+                    "borrar sus archivos para volver a ingerir con el modelo nuevo"
+                )
+            return index.append(texts, vectors)
+
+    @classmethod
+    def create_empty(cls, path: str, model: str, dim: int) -> "VectorIndex":
+        """Crea un índice vacío al que luego se le agregan vectores con append()."""
+        return cls.build(path, model, [], np.zeros((0, dim), dtype=np.float32))
+
+    def append(self, texts: List[str], vectors) -> "VectorIndex":
+        """
+        Agrega textos y vectores al final de los archivos y devuelve el índice reabierto.
+
+        El índice actual sigue siendo válido (sus memmaps ven solo las primeras `count` filas),
+        así que las búsquedas en curso no se bloquean. El .json se reescribe al final: si el
+        proceso se corta a mitad, los bytes sobrantes se descartan en el próximo append.
+        """
+        matrix = normalize(vectors)
+        encoded = [text.encode("utf-8") for text in texts]
+        text_end = int(self._offsets[self.count]) if self.count else 0
+
+        # Recortar restos de un append interrumpido antes de escribir
+        os.truncate(f"{self.path}.f32", self.count * self.dim * 4)
+        os.truncate(f"{self.path}.off", (self.count + 1) * 8)
+        os.truncate(f"{self.path}.txt", text_end)
+
+        offsets = text_end + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        with open(f"{self.path}.f32", "ab") as f:
+            f.write(matrix.tobytes())
+        with open(f"{self.path}.off", "ab") as f:
+            f.write(offsets.tobytes())
+        with open(f"{self.path}.txt", "ab") as f:
+            f.write(b"".join(encoded))
+
+        meta = {
+            "version": INDEX_VERSION,
+            "model": self.model,
+            "fingerprint": self.fingerprint,
+            "dim": self.dim,
+            "count": self.count + len(texts),
+        }
+        tmp = f"{self.path}.json.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, f"{self.path}.json")
+        return VectorIndex(self.path, meta)
+
+    def text(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._texts[start:end]).decode("utf-8")
+
+
+class IndexRetriever(BaseRetriever):
+    """
+    Retriever de LangChain sobre uno o más VectorIndex; reemplaza a DocArrayInMemorySearch.as_retriever().
+
+    Cada segmento es un par (VectorIndex, RetrievalEngine): el motor hace la búsqueda y el
+    índice aporta los textos. Los resultados de todos los segmentos se combinan por similitud.
+    """
+
+    segments: list
+    embeddings: Embeddings
+    k: int = 4
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def replace_segment(self, position: int, index: VectorIndex, engine: RetrievalEngine):
+        """Reemplaza (o agrega, si position == len) un segmento sin modificar la lista en uso."""
+        segments = list(self.segments)
+        if position == len(segments):
+            segments.append((index, engine))
+        else:
+            segments[position] = (index, engine)
+        self.segments = segments
+
+    def documents_for_vector(self, vector) -> List[Document]:
+        """Búsqueda con un embedding ya calculado (evita embeber la pregunta dos veces)."""
+        return self._documents([(index, engine.search(vector, self.k)[0]) for index, engine in self.segments])
+
+    async def adocuments_for_vector(self, vector) -> List[Document]:
+        """Como documents_for_vector; los segmentos grandes se buscan en un hilo."""
+        return self._documents(
+            [(index, (await engine.asearch(vector, self.k))[0]) for index, engine in self.segments]
+        )
+
+    def _documents(self, results: list) -> List[Document]:
+        """Combina los resultados [(índice, [(posición, similitud)])] de los segmentos por similitud."""
+        hits = [(score, index, i) for index, found in results for i, score in found]
+        hits.sort(key=lambda hit: -hit[0])
+        return [
+            Document(
+                page_content=index.text(i),
+                metadata={"score": score, "source": os.path.basename(index.path), "row": i},
+            )
+            for score, index, i in hits[: self.k]
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.documents_for_vector(self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.adocuments_for_vector(await self.embeddings.aembed_query(query))
@@ -0,0 +1,32 @@
+"""
+Réplica de la ruta /api/simple-request anterior al cliente asíncrono: función `def` que
+ocupa un hilo del threadpool y un `requests.post` sin sesión (una conexión TCP nueva por
+petición). Solo se usa como "antes" en bench_conexiones.py.
+"""
+
+import os
+import requests
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
+
+app = FastAPI()
+
+
+class QueryRequest(BaseModel):
+    prompt: str
+
+
+@app.post("/api/simple-request")
+def simple_query_ollama(request: QueryRequest):
+    try:
+        response = requests.post(
+            f"{OLLAMA_API_URL}/api/generate",
+            json={"model": "llama3.2:latest", "prompt": request.prompt, "stream": False},
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return {"result": response.json().get("response", "")}
+    except requests.RequestException as e:
+        raise HTTPException(status_code=500, detail=str(e))
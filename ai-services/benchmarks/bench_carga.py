@@ -0,0 +1,305 @@
+"""
+Prueba de carga de la app completa (main.py) contra un Ollama falso determinista.
+
+Levanta stub_ollama.py con el TTFT, la velocidad de tokens y la tasa de errores pedidos, y
+la app apuntando a él con las cachés de respuestas desactivadas (para medir el camino
+completo). Luego reproduce un workload en formato requests.jsonl (request_id, title, body y
+opcionalmente route) de una de dos formas:
+    --concurrencia N   N clientes en bucle cerrado (cada uno envía la siguiente al terminar)
+    --tasa R           R peticiones por segundo a intervalos fijos (o Poisson con --poisson),
+                       sin esperar respuestas: mide la cola cuando la app no da abasto
+
+Informa por ruta p50/p95/p99, throughput y errores (y el tiempo al primer byte en las rutas
+/stream), y guarda el resultado en benchmarks/results/<escenario>/<commit>.json para
+comparar contra corridas anteriores del mismo escenario.
+
+Uso (desde ai-services/):
+    python benchmarks/bench_carga.py --concurrencia 32 --duracion 20 --ttft-ms 150 --tokens-por-seg 40
+    python benchmarks/bench_carga.py --tasa 20 --poisson --comparar abc1234
+"""
+
+import argparse
+import asyncio
+import datetime
+import glob
+import itertools
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from bench_conexiones import AI_SERVICES_DIR, start_server, wait_until_up
+
+STUB_PORT = 11520
+APP_PORT = 8120
+RESULTS_DIR = os.path.join(AI_SERVICES_DIR, "benchmarks", "results")
+DEFAULT_WORKLOAD = os.path.join(AI_SERVICES_DIR, "benchmarks", "workload.jsonl")
+DEFAULT_ROUTES = ["simple-request", "request-with-history", "request-with-langchain"]
+
+
+def load_workload(path: str, routes: list) -> list:
+    """Lee el workload; las líneas sin `route` se reparten entre `routes` en orden."""
+    items = []
+    cycle = itertools.cycle(routes)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = record.get("body") or record.get("title") or ""
+            items.append((record.get("route") or next(cycle), prompt))
+    if not items:
+        raise SystemExit(f"El workload {path} está vacío")
+    return items
+
+
+def percentile(values: list, p: float) -> float:
+    """Percentil por rango más cercano sobre valores ya ordenados."""
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.first_bytes = {}
+        self.errors = {}
+
+    def ok(self, route: str, latency: float, first_byte: float = None):
+        self.latencies.setdefault(route, []).append(latency)
+        if first_byte is not None:
+            self.first_bytes.setdefault(route, []).append(first_byte)
+
+    def error(self, route: str):
+        self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        everything = []
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(route, []))
+            everything += values
+            routes[route] = self._stats(values, self.errors.get(route, 0), elapsed)
+            if route in self.first_bytes:
+                first = sorted(self.first_bytes[route])
+                routes[route]["ttfb_p50_ms"] = percentile(first, 50) * 1000
+                routes[route]["ttfb_p95_ms"] = percentile(first, 95) * 1000
+        routes["total"] = self._stats(sorted(everything), sum(self.errors.values()), elapsed)
+        return routes
+
+    @staticmethod
+    def _stats(values: list, errors: int, elapsed: float) -> dict:
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+
+
+async def send(client: httpx.AsyncClient, recorder: Recorder, route: str, prompt: str):
+    started = time.perf_counter()
+    try:
+        if route.endswith("/stream"):
+            first_byte = None
+            async with client.stream("POST", f"/api/{route}", json={"prompt": prompt}) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    first_byte = first_byte or time.perf_counter() - started
+                    if b"event: error" in chunk:
+                        raise httpx.HTTPError("evento de error en el stream")
+            recorder.ok(route, time.perf_counter() - started, first_byte)
+        else:
+            response = await client.post(f"/api/{route}", json={"prompt": prompt})
+            response.raise_for_status()
+            recorder.ok(route, time.perf_counter() - started)
+    except httpx.HTTPError:
+        recorder.error(route)
+
+
+async def run_closed(client, recorder, workload, concurrency: int, duration: float):
+    items = itertools.cycle(workload)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await send(client, recorder, *next(items))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_open(client, recorder, workload, rate: float, duration: float, poisson: bool, seed: int):
+    rng = random.Random(seed)
+    items = itertools.cycle(workload)
+    tasks = []
+    started = time.perf_counter()
+    next_at = started
+    while next_at < started + duration:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(send(client, recorder, *next(items))))
+        next_at += rng.expovariate(rate) if poisson else 1 / rate
+    await asyncio.gather(*tasks)
+
+
+async def run_load(args, workload: list) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=300.0) as client:
+        started = time.perf_counter()
+        if args.tasa:
+            await run_open(client, recorder, workload, args.tasa, args.duracion, args.poisson, args.semilla)
+        else:
+            await run_closed(client, recorder, workload, args.concurrencia, args.duracion)
+        elapsed = time.perf_counter() - started
+    return recorder.summary(elapsed)
+
+
+def git_commit() -> tuple:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=AI_SERVICES_DIR, capture_output=True, text=True).stdout.strip()
+
+    return git("rev-parse", "--short", "HEAD") or "sin-git", bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def scenario(args) -> str:
+    mode = f"tasa{args.tasa:g}{'-poisson' if args.poisson else ''}" if args.tasa else f"c{args.concurrencia}"
+    return f"{mode}-ttft{args.ttft_ms:g}-tps{args.tokens_por_seg:g}-err{args.error_rate:g}"
+
+
+def save(args, routes: dict) -> str:
+    commit, dirty = git_commit()
+    directory = os.path.join(RESULTS_DIR, scenario(args))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{commit}{'-dirty' if dirty else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "dirty": dirty,
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "config": vars(args),
+                "routes": routes,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    return path
+
+
+def previous(args, current_path: str):
+    """Resultado a comparar: el del commit pedido o, si no, la corrida anterior del mismo escenario."""
+    directory = os.path.join(RESULTS_DIR, scenario(args))
+    if args.comparar:
+        candidates = glob.glob(os.path.join(directory, f"{args.comparar}*.json"))
+    else:
+        candidates = sorted(
+            (p for p in glob.glob(os.path.join(directory, "*.json")) if p != current_path), key=os.path.getmtime
+        )[-1:]
+    if not candidates:
+        return None
+    with open(candidates[0], encoding="utf-8") as f:
+        return json.load(f)
+
+
+def report(routes: dict, baseline: dict = None):
+    header = f"{'ruta':<34}{'n':>7}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}"
+    if baseline:
+        header += f"{'Δp95':>9}{'Δreq/s':>9}"
+    print(header)
+    for route, r in routes.items():
+        line = (
+            f"{route:<34}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9.1f}"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+            f"{r.get('ttfb_p50_ms', float('nan')):>10.1f}"
+        )
+        before = (baseline or {}).get("routes", {}).get(route)
+        if before:
+            line += f"{_delta(r['p95_ms'], before['p95_ms']):>9}{_delta(r['rps'], before['rps']):>9}"
+        print(line)
+    if baseline:
+        print(f"(Δ contra {baseline['commit']}{'-dirty' if baseline['dirty'] else ''} del {baseline['date']})")
+
+
+def _delta(now: float, before: float) -> str:
+    return f"{(now - before) / before * 100:+.1f}%" if before else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="archivo en formato requests.jsonl")
+    parser.add_argument("--rutas", nargs="+", default=DEFAULT_ROUTES, help="rutas para las líneas sin `route`")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrencia", type=int, default=16, help="clientes en bucle cerrado")
+    mode.add_argument("--tasa", type=float, help="peticiones por segundo (bucle abierto)")
+    parser.add_argument("--poisson", action="store_true", help="llegadas Poisson en lugar de intervalos fijos")
+    parser.add_argument("--duracion", type=float, default=15.0, help="segundos de carga")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="tiempo al primer token del Ollama falso")
+    parser.add_argument("--tokens-por-seg", type=float, default=50.0, help="velocidad del Ollama falso (0 = instantáneo)")
+    parser.add_argument("--tokens", type=int, default=20, help="tokens por respuesta")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de generaciones que fallan")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--comparar", help="commit contra el que comparar (por defecto, la corrida anterior)")
+    parser.add_argument("--no-guardar", action="store_true", help="no guardar el resultado")
+    args = parser.parse_args()
+
+    workload = load_workload(args.workload, args.rutas)
+    stub_url = f"http://127.0.0.1:{STUB_PORT}"
+    stub = start_server("stub_ollama:app", STUB_PORT, "benchmarks", {
+        "STUB_TTFT_MS": str(args.ttft_ms),
+        "STUB_TOKENS_PER_SEC": str(args.tokens_por_seg),
+        "STUB_TOKENS": str(args.tokens),
+        "STUB_ERROR_RATE": str(args.error_rate),
+        "STUB_SEED": str(args.semilla),
+    })
+    data_dir = tempfile.mkdtemp(prefix="bench_carga_")
+    app_env = {
+        "OLLAMA_API_URL": stub_url,
+        # Índices y sesiones en un directorio temporal; sin cachés de respuestas para medir
+        # siempre el camino completo hasta Ollama
+        "VECTOR_INDEX_PATH": os.path.join(data_dir, "vector_index"),
+        "INGEST_INDEX_PATH": os.path.join(data_dir, "ingested"),
+        "EMBEDDING_CACHE_PATH": "",
+        "RESPONSE_CACHE_PATH": "",
+        "RESPONSE_CACHE_TTL": "0",
+        "SEMANTIC_CACHE_THRESHOLD": "2",
+        "SESSION_PATH": "",
+    }
+    try:
+        wait_until_up(f"{stub_url}/api/tags")
+        server = start_server("main:app", APP_PORT, ".", app_env)
+        try:
+            wait_until_up(f"http://127.0.0.1:{APP_PORT}/docs")
+            _wait_ready(f"http://127.0.0.1:{APP_PORT}/api/ready")
+            routes = asyncio.run(run_load(args, workload))
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    path = None if args.no_guardar else save(args, routes)
+    report(routes, previous(args, path))
+    if path:
+        print(f"Resultado guardado en {os.path.relpath(path, AI_SERVICES_DIR)}")
+
+
+def _wait_ready(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if httpx.get(url, timeout=5.0).status_code == 200:
+            return
+        time.sleep(0.5)
+    raise RuntimeError(f"La app no quedó lista: {httpx.get(url).text}")
+
+
+if __name__ == "__main__":
+    main()
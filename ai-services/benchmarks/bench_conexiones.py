@@ -0,0 +1,142 @@
+"""
+Compara el throughput de /api/simple-request antes y después del cliente asíncrono con pool.
+
+Levanta un Ollama falso (stub_ollama.py) con latencia fija y, contra él, dos servidores:
+    - antes:   baseline_app.py (ruta `def` + requests.post sin sesión)
+    - después: main.py (ruta `async def` + httpx.AsyncClient compartido)
+
+Cada uno se mide con 64 y 256 clientes concurrentes durante unos segundos. La columna
+"conexiones" son las conexiones TCP que el servidor abrió hacia el stub durante la medición.
+La app nueva se levanta sin single-flight ni cachés (todas las peticiones usan el mismo prompt)
+y con el control de admisión holgado, para medir solo el cliente HTTP.
+
+Resultados de referencia en benchmarks/README.md.
+
+Uso (desde ai-services/):
+    python benchmarks/bench_conexiones.py --duracion 10 --latencia-ms 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+AI_SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_PORT = 11500
+APP_PORT = 8100
+# main:app sin lo que agregaron los cambios posteriores y que esquivaría a Ollama o limitaría la
+# concurrencia con un prompt repetido: single-flight, cachés, control de admisión y sondeos
+APP_ENV = {
+    "SINGLE_FLIGHT": "false",
+    "RESPONSE_CACHE_TTL": "0",
+    "RESPONSE_CACHE_PATH": "",
+    "SEMANTIC_CACHE_THRESHOLD": "2",
+    "SCHEDULER_MAX_INFLIGHT": "1024",
+    "SCHEDULER_MAX_QUEUE": "1024",
+    "OLLAMA_HEALTH_INTERVAL": "0",
+    "RESIDENCY_INTERVAL": "0",
+    "TRACE_SAMPLE_RATE": "0",
+}
+
+
+def start_server(app: str, port: int, app_dir: str, env: dict) -> subprocess.Popen:
+    """Lanza uvicorn en un subproceso para no competir por el GIL con el generador de carga."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir,
+         "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+        cwd=AI_SERVICES_DIR,
+    )
+
+
+def stub_connections(stub_url: str) -> int:
+    return httpx.get(f"{stub_url}/stub/connections").json()["connections"]
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor {url} no respondió a tiempo")
+
+
+async def run_load(url: str, concurrency: int, duration: float) -> dict:
+    """Cada cliente envía peticiones en bucle cerrado hasta que se agota `duration`."""
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json={"prompt": "hola"})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos por medición")
+    parser.add_argument("--latencia-ms", type=float, default=200.0, help="latencia simulada de Ollama")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[64, 256])
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{STUB_PORT}"
+    stub = start_server("stub_ollama:app", STUB_PORT, "benchmarks", {"STUB_LATENCY_MS": str(args.latencia_ms)})
+    variants = [
+        ("antes", "baseline_app:app", "benchmarks"),
+        ("después", "main:app", "."),
+    ]
+    try:
+        wait_until_up(f"{stub_url}/docs")
+        print(f"{'variante':<10}{'clientes':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>10}{'conexiones':>12}")
+        for name, app, app_dir in variants:
+            server = start_server(app, APP_PORT, app_dir, {"OLLAMA_API_URL": stub_url, **APP_ENV})
+            try:
+                wait_until_up(f"http://127.0.0.1:{APP_PORT}/docs")
+                for concurrency in args.concurrencia:
+                    before = stub_connections(stub_url)
+                    r = asyncio.run(run_load(f"http://127.0.0.1:{APP_PORT}/api/simple-request", concurrency, args.duracion))
+                    opened = stub_connections(stub_url) - before
+                    print(
+                        f"{name:<10}{concurrency:>10}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                        f"{r['errors']:>10}{opened:>12}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
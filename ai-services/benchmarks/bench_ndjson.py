@@ -0,0 +1,172 @@
+"""
+Compara la decodificación del stream NDJSON de Ollama línea por línea contra app/services/ndjson.py.
+
+Genera en memoria una respuesta de /api/chat con --tokens objetos (como los de Ollama) y la parte
+en pedazos de tamaño aleatorio, como llegan del socket. Sobre esos pedazos mide:
+    - por línea:        requests iter_lines(decode_unicode=True) + json.loads (ejemploRequestOllama.py
+                        antes del cambio) y httpx aiter_lines + json.loads (OllamaClient.stream antes)
+    - NDJSONDecoder:    líneas en bytes + ndjson.loads (orjson si está instalado) y con json.loads
+    - líneas crudas:    solo separar líneas, lo que hace la ruta /api/simple-request/ndjson
+y además la escritura de los tokens en un archivo: un flush por token contra TokenCoalescer.
+
+Uso (desde ai-services/):
+    python benchmarks/bench_ndjson.py --tokens 20000 --repeticiones 5
+"""
+
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services import ndjson  # noqa: E402
+
+
+def make_stream(tokens: int) -> bytes:
+    lines = [
+        json.dumps({
+            "model": "llama3.2",
+            "created_at": "2024-01-01T00:00:00.000000Z",
+            "message": {"role": "assistant", "content": f" token{i}"},
+            "done": False,
+        })
+        for i in range(tokens)
+    ]
+    lines.append(json.dumps({"model": "llama3.2", "message": {"role": "assistant", "content": ""}, "done": True, "eval_count": tokens}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def split_chunks(body: bytes, seed: int = 0) -> list:
+    """Pedazos de 1 a 4096 bytes: una línea puede quedar partida en varios."""
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(body):
+        size = rng.randint(1, 4096)
+        chunks.append(body[i:i + size])
+        i += size
+    return chunks
+
+
+def requests_per_line(chunks: list) -> int:
+    response = requests.Response()
+    response.iter_content = lambda chunk_size=1, decode_unicode=False: _decoded(chunks) if decode_unicode else iter(chunks)
+    count = 0
+    for line in response.iter_lines(decode_unicode=True):
+        if line:
+            count += len(json.loads(line)["message"]["content"])
+    return count
+
+
+def _decoded(chunks: list):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+
+
+async def httpx_per_line(chunks: list) -> int:
+    response = httpx.Response(200, stream=_AsyncChunks(chunks))
+    count = 0
+    async for line in response.aiter_lines():
+        if line:
+            count += len(json.loads(line)["message"]["content"])
+    return count
+
+
+class _AsyncChunks(httpx.AsyncByteStream):
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def decoder_objects(chunks: list, loads) -> int:
+    count = 0
+    for line in ndjson.iter_lines(chunks):
+        count += len(loads(line)["message"]["content"])
+    return count
+
+
+async def decoder_async(chunks: list) -> int:
+    count = 0
+    async for data in ndjson.aiter_objects(_AsyncChunks(chunks)):
+        count += len(data["message"]["content"])
+    return count
+
+
+def raw_lines(chunks: list) -> int:
+    return sum(len(line) for line in ndjson.iter_lines(chunks))
+
+
+def write_per_token(texts: list, out) -> None:
+    for text in texts:
+        out.write(text)
+        out.flush()
+
+
+def write_coalesced(texts: list, out) -> None:
+    coalescer = ndjson.TokenCoalescer(max_delay=0.05)
+    for text in texts:
+        text = coalescer.add(text)
+        if text:
+            out.write(text)
+            out.flush()
+    text = coalescer.flush()
+    if text:
+        out.write(text)
+        out.flush()
+
+
+def measure(fn, repetitions: int) -> float:
+    """Mejor tiempo de `repetitions` corridas, en segundos."""
+    best = float("inf")
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    body = make_stream(args.tokens)
+    chunks = split_chunks(body)
+    texts = [f" token{i}" for i in range(args.tokens)]
+    print(f"{args.tokens} objetos, {len(body) / 1e6:.1f} MB en {len(chunks)} pedazos; orjson: {'sí' if ndjson.orjson else 'no'}\n")
+
+    cases = [
+        ("requests iter_lines + json.loads", lambda: requests_per_line(chunks)),
+        ("httpx aiter_lines + json.loads", lambda: asyncio.run(httpx_per_line(chunks))),
+        ("NDJSONDecoder + ndjson.loads", lambda: decoder_objects(chunks, ndjson.loads)),
+        ("NDJSONDecoder + json.loads", lambda: decoder_objects(chunks, json.loads)),
+        ("aiter_objects (OllamaClient.stream)", lambda: asyncio.run(decoder_async(chunks))),
+        ("líneas crudas (sin decodificar)", lambda: raw_lines(chunks)),
+    ]
+    baseline = None
+    for name, fn in cases:
+        elapsed = measure(fn, args.repeticiones)
+        baseline = baseline or elapsed
+        print(f"{name:<40} {elapsed * 1000:8.1f} ms  {args.tokens / elapsed / 1e6:6.2f} M obj/s  x{baseline / elapsed:.1f}")
+
+    print()
+    with open(os.devnull, "w") as out:
+        per_token = measure(lambda: write_per_token(texts, out), args.repeticiones)
+        coalesced = measure(lambda: write_coalesced(texts, out), args.repeticiones)
+    print(f"{'escritura: flush por token':<40} {per_token * 1000:8.1f} ms")
+    print(f"{'escritura: TokenCoalescer':<40} {coalesced * 1000:8.1f} ms  x{per_token / coalesced:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Recall@k contra latencia del RetrievalEngine: búsqueda exacta vs índice IVF.
+
+Genera vectores sintéticos agrupados (mezcla de gaussianas normalizada, parecida a la
+distribución de embeddings reales) y consultas cercanas a puntos del corpus. La búsqueda
+exacta es la referencia para calcular el recall del IVF con distintos nprobe.
+
+Uso (desde ai-services/):
+    python benchmarks/bench_retrieval.py --tamanios 10000 100000 1000000 --dim 384
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.retrieval_engine import RetrievalEngine, normalize  # noqa: E402
+
+
+def synthetic(n: int, dim: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 1000), dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    step = 100_000
+    for start in range(0, n, step):
+        size = min(step, n - start)
+        labels = rng.integers(0, centers.shape[0], size)
+        vectors[start:start + size] = centers[labels] + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+    vectors = normalize(vectors)
+    picks = rng.choice(n, size=queries, replace=False)
+    # Ruido de norma ~1.2 sobre cada punto elegido: la consulta cae cerca, no encima
+    noise = rng.standard_normal((queries, dim), dtype=np.float32) * (1.2 / np.sqrt(dim))
+    query_matrix = normalize(vectors[picks] + noise)
+    return vectors, query_matrix
+
+
+def recall(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    print(f"{'vectores':>10} {'modo':<14}{'recall@' + str(args.k):>10}{'ms/consulta':>13}{'ms lote':>10}")
+    for n in args.tamanios:
+        vectors, queries = synthetic(n, args.dim, args.consultas)
+        engine = RetrievalEngine(vectors, ann_threshold=0)
+
+        # Exacta, una consulta por vez y todas juntas en una sola multiplicación por bloque
+        started = time.perf_counter()
+        for q in queries:
+            engine.search_exact(q[None, :], args.k)
+        single_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        started = time.perf_counter()
+        truth, _ = engine.search_exact(queries, args.k)
+        batch_ms = (time.perf_counter() - started) * 1000
+        print(f"{n:>10} {'exacta':<14}{1.0:>10.3f}{single_ms:>13.3f}{batch_ms:>10.1f}")
+
+        started = time.perf_counter()
+        engine.build_ann()
+        build_s = time.perf_counter() - started
+        for nprobe in args.nprobe:
+            started = time.perf_counter()
+            found, _ = engine.search_ann(queries, args.k, nprobe)
+            ms = (time.perf_counter() - started) * 1000 / len(queries)
+            print(f"{n:>10} {'ivf nprobe=' + str(nprobe):<14}{recall(found, truth):>10.3f}{ms:>13.3f}{'':>10}")
+        print(f"{n:>10} (IVF con {engine.ann.centroids.shape[0]} listas entrenado en {build_s:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
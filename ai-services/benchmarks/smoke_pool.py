@@ -0,0 +1,170 @@
+"""
+Prueba de humo del BackendPool contra varios Ollama falsos (stub_ollama.py) locales.
+
+Levanta --backends instancias del stub en puertos consecutivos y verifica:
+    1. Balanceo por menos peticiones en curso: N generaciones simultáneas se reparten en partes
+       iguales y, mientras corren, cada backend tiene las suyas en curso.
+    2. Los embeddings síncronos (PooledEmbeddings.embed_documents) también reservan el backend:
+       mientras uno está en curso, la siguiente elección va a otro.
+    3. Failover: con un backend caído todas las peticiones se responden (reintento en otro
+       backend), su circuit breaker se abre y las peticiones siguientes ya no lo intentan.
+    4. Recuperación: al volver a levantarlo, un sondeo cierra el circuito y vuelve a recibir.
+    5. Plazos y sondeos: una llamada que vence su plazo (post o stream) cuenta como error del
+       backend y una cancelada por otro motivo no; los sondeos fallidos abren el circuito recién
+       tras max_failures, como las peticiones.
+
+Termina con código 1 si alguna verificación falla.
+
+Uso (desde ai-services/):
+    python benchmarks/smoke_pool.py --backends 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_conexiones import start_server, wait_until_up  # noqa: E402
+from app.services.backend_pool import BackendPool, PooledEmbeddings  # noqa: E402
+from app.services.resilience import DeadlineExceededError  # noqa: E402
+
+FIRST_PORT = 11520
+STUB_ENV = {"STUB_TTFT_MS": "300", "STUB_EMBED_MS": "300"}
+
+failures = []
+
+
+def check(name: str, ok: bool, detail=""):
+    print(f"[{'ok' if ok else 'FALLA'}] {name} {detail}")
+    if not ok:
+        failures.append(name)
+
+
+def start_stub(port: int):
+    stub = start_server("stub_ollama:app", port, "benchmarks", STUB_ENV)
+    wait_until_up(f"http://127.0.0.1:{port}/docs")
+    return stub
+
+
+async def generate(pool: BackendPool, i: int) -> dict:
+    return await pool.post("/api/generate", {"model": pool.model, "prompt": f"hola {i}", "stream": False}, route="smoke")
+
+
+async def run(urls: list, stubs: dict):
+    pool = BackendPool(urls, model="llama3.2:latest", temperature=0, embedding_model="nomic-embed-text", max_failures=2)
+    pool.start()
+    try:
+        # 1. Balanceo por menos peticiones en curso
+        n = 3 * len(urls)
+        tasks = [asyncio.create_task(generate(pool, i)) for i in range(n)]
+        await asyncio.sleep(0.1)
+        outstanding = [b.outstanding for b in pool.backends]
+        await asyncio.gather(*tasks)
+        check("en curso repartidas", outstanding == [3] * len(urls), outstanding)
+        check("peticiones repartidas", [b.requests for b in pool.backends] == [3] * len(urls),
+              [b.requests for b in pool.backends])
+
+        # 2. Embeddings síncronos con reserva del backend
+        embeddings = PooledEmbeddings(pool, model="nomic-embed-text")
+        sync_call = asyncio.create_task(asyncio.to_thread(embeddings.embed_documents, ["uno", "dos"]))
+        await asyncio.sleep(0.1)
+        busy = [b.url for b in pool.backends if b.outstanding]
+        chosen = pool.pick("nomic-embed-text").url
+        vectors = await sync_call
+        check("embed sync reserva el backend", len(busy) == 1 and chosen not in busy, f"en curso={busy} elegido={chosen}")
+        check("embed sync responde", len(vectors) == 2 and all(vectors))
+        check("embed sync libera el backend", all(b.outstanding == 0 for b in pool.backends))
+
+        # 3. Failover con un backend caído
+        dead = urls[-1]
+        stubs[dead].terminate()
+        stubs[dead].wait()
+        results = await asyncio.gather(*(generate(pool, i) for i in range(2 * n)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        dead_backend = next(b for b in pool.backends if b.url == dead)
+        check("todas respondidas con un backend caído", not errors, errors[:1])
+        check("circuito abierto del caído", dead_backend.breaker.state == "open", dead_backend.breaker.stats())
+        # La primera tanda simultánea ya se repartió antes del primer error; la siguiente no lo toca
+        before = dead_backend.requests
+        await asyncio.gather(*(generate(pool, i) for i in range(n)))
+        sent = dead_backend.requests - before
+        check("el caído deja de recibir tráfico", sent == 0, f"{sent} intentos")
+
+        # 4. Recuperación
+        stubs[dead] = start_stub(int(dead.rsplit(":", 1)[1]))
+        await pool.probe_all()
+        check("sondeo cierra el circuito", dead_backend.breaker.state == "closed", dead_backend.breaker.stats())
+        before = dead_backend.requests
+        await asyncio.gather(*(generate(pool, i) for i in range(n)))
+        check("vuelve a recibir tráfico", dead_backend.requests > before, f"{dead_backend.requests - before} peticiones")
+    finally:
+        await pool.aclose()
+
+
+async def run_deadlines(url: str, dead_url: str):
+    pool = BackendPool([url], model="llama3.2:latest", temperature=0, embedding_model="nomic-embed-text", max_failures=2)
+    pool.start()
+    breaker = pool.backends[0].breaker
+    try:
+        # 5. Cancelación ajena al plazo: no cuenta
+        task = asyncio.create_task(generate(pool, 0))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        check("cancelación sin plazo no cuenta", breaker.failures == 0, breaker.stats())
+
+        payload = {"model": pool.model, "prompt": "hola", "stream": False}
+        try:
+            await pool.post("/api/generate", payload, route="smoke", deadline=0.1)
+        except DeadlineExceededError:
+            pass
+        check("plazo vencido en post cuenta", breaker.failures == 1 and breaker.state == "closed", breaker.stats())
+        try:
+            async for _ in pool.stream("/api/generate", {**payload, "stream": True}, route="smoke", deadline=0.1):
+                pass
+        except DeadlineExceededError:
+            pass
+        check("plazo vencido en stream abre el circuito", breaker.state == "open", breaker.stats())
+    finally:
+        await pool.aclose()
+
+    pool = BackendPool([dead_url], model="llama3.2:latest", temperature=0, embedding_model="nomic-embed-text", max_failures=2)
+    pool.start()
+    breaker = pool.backends[0].breaker
+    try:
+        await pool.probe_all()
+        check("un sondeo fallido no abre el circuito", breaker.state == "closed", breaker.stats())
+        await pool.probe_all()
+        check("max_failures sondeos fallidos lo abren", breaker.state == "open", breaker.stats())
+    finally:
+        await pool.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=int, default=3)
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:{FIRST_PORT + i}" for i in range(args.backends)]
+    stubs = {}
+    started = time.perf_counter()
+    try:
+        for url in urls:
+            stubs[url] = start_stub(int(url.rsplit(":", 1)[1]))
+        asyncio.run(run(urls, stubs))
+        asyncio.run(run_deadlines(urls[0], f"http://127.0.0.1:{FIRST_PORT + args.backends}"))
+    finally:
+        for stub in stubs.values():
+            stub.terminate()
+            stub.wait()
+    print(f"\n{len(failures)} fallas en {time.perf_counter() - started:.1f} s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
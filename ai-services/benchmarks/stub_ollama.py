@@ -0,0 +1,151 @@
+"""
+Servidor falso de Ollama para benchmarks locales.
+
+Emula /api/generate, /api/chat, /api/embed y /api/embeddings de forma determinista, de modo
+que el benchmark mida el overhead del servicio y no la velocidad del modelo. También responde
+/api/tags y /api/ps (modelos de STUB_MODELS, separados por coma) para los sondeos del pool.
+
+Configuración por variables de entorno:
+    STUB_TTFT_MS         tiempo hasta el primer token (por defecto 200)
+    STUB_TOKENS_PER_SEC  velocidad de generación; 0 = todos los tokens juntos (por defecto 0)
+    STUB_TOKENS          tokens por respuesta (por defecto 3)
+    STUB_ERROR_RATE      fracción de generaciones que responden 500 (por defecto 0)
+    STUB_EMBED_MS        latencia de cada llamada de embeddings (por defecto 0)
+    STUB_SEED            semilla de los errores simulados (por defecto 0)
+    STUB_LATENCY_MS      alias de STUB_TTFT_MS (nombre anterior)
+
+GET /stub/connections devuelve cuántas conexiones TCP distintas (puerto de origen) recibió, para
+medir la reutilización de conexiones keep-alive.
+
+Con `stream` (por defecto en Ollama) la respuesta es NDJSON: un objeto por token y el último
+con done: true y los contadores de uso; sin stream, un único objeto al terminar.
+
+Uso:
+    STUB_TTFT_MS=200 STUB_TOKENS_PER_SEC=50 uvicorn stub_ollama:app --app-dir benchmarks --port 11500
+
+Varios backends: levantar una instancia por puerto y apuntar la app a todas con
+    OLLAMA_API_URLS='["http://127.0.0.1:11500", "http://127.0.0.1:11501"]'
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TTFT = float(os.getenv("STUB_TTFT_MS", os.getenv("STUB_LATENCY_MS", "200"))) / 1000
+TOKENS_PER_SEC = float(os.getenv("STUB_TOKENS_PER_SEC", "0"))
+TOKENS = max(1, int(os.getenv("STUB_TOKENS", "3")))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+EMBED_LATENCY = float(os.getenv("STUB_EMBED_MS", "0")) / 1000
+EMBEDDING_DIM = 64
+MODELS = [m for m in os.getenv("STUB_MODELS", "llama3.2:latest").split(",") if m]
+WORDS = ("respuesta", "de", "prueba")
+
+app = FastAPI()
+rng = random.Random(int(os.getenv("STUB_SEED", "0")))
+# (host, puerto) de origen de cada conexión vista: cada conexión TCP nueva usa otro puerto efímero
+connections = set()
+
+
+@app.middleware("http")
+async def count_connections(request: Request, call_next):
+    if request.client:
+        connections.add((request.client.host, request.client.port))
+    return await call_next(request)
+
+
+@app.get("/stub/connections")
+async def connection_count():
+    return {"connections": len(connections)}
+
+
+def fake_embedding(text: str) -> list:
+    """Vector determinista derivado del hash del texto."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(EMBEDDING_DIM)]
+
+
+def fake_tokens() -> list:
+    return [WORDS[i % len(WORDS)] + (" " if i < TOKENS - 1 else "") for i in range(TOKENS)]
+
+
+def usage(prompt: str, started: float, first_token_at: float) -> dict:
+    """Contadores con el mismo formato que Ollama (duraciones en nanosegundos)."""
+    now = time.perf_counter()
+    return {
+        "done": True,
+        "prompt_eval_count": max(1, len(prompt) // 4),
+        "eval_count": TOKENS,
+        "total_duration": int((now - started) * 1e9),
+        "load_duration": 1_000_000,
+        "prompt_eval_duration": int((first_token_at - started) * 1e9),
+        "eval_duration": int((now - first_token_at) * 1e9),
+    }
+
+
+async def generate_tokens(body: dict, prompt: str, wrap):
+    """Genera el cuerpo de una respuesta: en streaming línea a línea, si no un único objeto."""
+    started = time.perf_counter()
+    await asyncio.sleep(TTFT)
+    first_token_at = time.perf_counter()
+    base = {"model": body.get("model")}
+    tokens = fake_tokens()
+    if body.get("stream", True) is False:
+        if TOKENS_PER_SEC:
+            await asyncio.sleep((TOKENS - 1) / TOKENS_PER_SEC)
+        return JSONResponse({**base, **wrap("".join(tokens)), **usage(prompt, started, first_token_at)})
+
+    async def lines():
+        for i, token in enumerate(tokens):
+            if i and TOKENS_PER_SEC:
+                await asyncio.sleep(1 / TOKENS_PER_SEC)
+            yield json.dumps({**base, **wrap(token), "done": False}) + "\n"
+        yield json.dumps({**base, **wrap(""), **usage(prompt, started, first_token_at)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def fail():
+    return ERROR_RATE and rng.random() < ERROR_RATE
+
+
+@app.post("/api/generate")
+async def generate(body: dict):
+    if fail():
+        return JSONResponse({"error": "fallo simulado"}, status_code=500)
+    return await generate_tokens(body, body.get("prompt", ""), lambda text: {"response": text})
+
+
+@app.post("/api/chat")
+async def chat(body: dict):
+    if fail():
+        return JSONResponse({"error": "fallo simulado"}, status_code=500)
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+    return await generate_tokens(body, prompt, lambda text: {"message": {"role": "assistant", "content": text}})
+
+
+@app.post("/api/embed")
+async def embed(body: dict):
+    await asyncio.sleep(EMBED_LATENCY)
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    return {"model": body.get("model"), "embeddings": [fake_embedding(t) for t in texts]}
+
+
+@app.post("/api/embeddings")
+async def embeddings(body: dict):
+    await asyncio.sleep(EMBED_LATENCY)
+    return {"embedding": fake_embedding(body["prompt"])}
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name} for name in MODELS]}
+
+
+@app.get("/api/ps")
+async def ps():
+    return {"models": [{"name": name, "model": name} for name in MODELS]}
@@ -1,6 +1,109 @@
-from fastapi import FastAPI
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routers.admin_router import router as admin_router
+from app.routers.batch_router import router as batch_router
+from app.routers.health_router import router as health_router
+from app.routers.ingest_router import router as ingest_router
+from app.routers.metrics_router import router as metrics_router
 from app.routers.ollama_router import router as query_router
+from app.config import settings
+from app.services import metrics, request_context, tracing
+from app.services.backend_pool import NoBackendAvailableError
+from app.services.ingestion import IngestionService
+from app.services.ollama_service import OllamaService
+from app.services.resilience import DeadlineExceededError
+from app.services.scheduler import QueueFullError
 
-app = FastAPI(title="FastAPI AI API", description="API de ejemplo de consultas a los modelos Llama y OpenAi", version="1.0")
 
-app.include_router(query_router, prefix="/api", tags=["query"])
\ No newline at end of file
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.configure(settings.TRACE_PATH, settings.TRACE_MAX_BYTES, settings.TRACE_BACKUPS, settings.TRACE_SAMPLE_RATE)
+    # La app es dueña del cliente hacia Ollama: se abre al iniciar y se cierra al apagar
+    await OllamaService.startup()
+    yield
+    await IngestionService.shutdown()
+    await OllamaService.shutdown()
+
+
+app = FastAPI(title="FastAPI AI API", description="API de ejemplo de consultas a los modelos Llama y OpenAi", version="1.0", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def request_state(request: Request, call_next):
+    # Estado por petición; los encabezados que agregue el servicio (ej. X-Cache) se copian a la respuesta
+    state = request_context.begin()
+    started = time.perf_counter()
+    request_id = tracing.begin(
+        request.url.path,
+        request.method,
+        request_id=request.headers.get("x-request-id"),
+        force=request.headers.get("x-trace") == "1",
+    )
+    state["headers"]["X-Request-Id"] = request_id
+    response = await call_next(request)
+    response.headers.update(state["headers"])
+    request_context.mark_headers_sent()
+    labels = (_route_label(request), request.method, str(response.status_code))
+
+    def done():
+        metrics.REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+        tracing.finish(state, response.status_code, route=labels[0])
+
+    response.body_iterator = _observe_when_done(response.body_iterator, done)
+    return response
+
+
+def _route_label(request: Request) -> str:
+    # Plantilla de la ruta (ej. /api/ingest/jobs/{job_id}) en lugar de la URL, para acotar la cardinalidad
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Según la versión de FastAPI, la ruta de un router incluido trae o no el prefijo (/api): el
+    # prefijo es lo que queda de la URL antes del tramo que coincide con la plantilla
+    path = request.url.path
+    for i, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+
+async def _observe_when_done(body, observe):
+    # En los streams la petición termina con el último evento, no al enviar los encabezados
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        observe()
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, exc: QueueFullError):
+    # Cola de generación llena: se rechaza enseguida en lugar de esperar indefinidamente
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(NoBackendAvailableError)
+async def no_backend(request: Request, exc: NoBackendAvailableError):
+    # Todos los circuitos abiertos: se falla enseguida e indica cuándo habrá una prueba
+    headers = {"Retry-After": str(max(1, math.ceil(exc.retry_after)))} if exc.retry_after is not None else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded(request: Request, exc: DeadlineExceededError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+app.include_router(query_router, prefix="/api", tags=["query"])
+app.include_router(batch_router, prefix="/api", tags=["batch"])
+app.include_router(ingest_router, prefix="/api", tags=["ingest"])
+app.include_router(health_router, prefix="/api", tags=["health"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
+app.include_router(metrics_router)
@@ -0,0 +1,173 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.backend_pool import BackendPool
+from app.services.resilience import CircuitBreaker, DeadlineExceededError, RetryBudget, deadline, deadline_expired
+
+
+class FakeClient:
+    """Cliente de Ollama falso: post espera `delay` segundos; get falla si `down`."""
+
+    def __init__(self, delay: float = 0.0, down: bool = False):
+        self.delay = delay
+        self.down = down
+
+    async def post(self, path: str, payload: dict) -> dict:
+        await asyncio.sleep(self.delay)
+        return {"response": "ok"}
+
+    async def get(self, path: str) -> dict:
+        if self.down:
+            raise httpx.ConnectError("caído")
+        return {"models": []}
+
+    async def aclose(self):
+        pass
+
+
+def make_pool(client: FakeClient, max_failures: int = 2) -> BackendPool:
+    pool = BackendPool(["http://backend"], model="m", temperature=0, embedding_model="e", max_failures=max_failures, retries=0)
+    pool.backends[0].client = client
+    return pool
+
+
+def test_breaker_opens_after_max_failures():
+    breaker = CircuitBreaker(max_failures=3, cooldown=60, max_cooldown=120)
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.available()
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(max_failures=1, cooldown=0, max_cooldown=10)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    # Pasado el enfriamiento deja pasar una sola prueba
+    assert breaker.available()
+    assert breaker.acquire()
+    assert breaker.state == "half_open"
+    assert not breaker.available()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_breaker_failed_trial_reopens_with_longer_cooldown():
+    breaker = CircuitBreaker(max_failures=1, cooldown=1, max_cooldown=3)
+    breaker.record_failure()
+    breaker.opened_at -= 1
+    assert breaker.acquire()
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.cooldown == 2
+    breaker.opened_at -= 2
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.cooldown == 3
+    breaker.record_success()
+    assert breaker.cooldown == 1
+
+
+def test_breaker_release_frees_the_trial():
+    breaker = CircuitBreaker(max_failures=1, cooldown=0, max_cooldown=10)
+    breaker.record_failure()
+    breaker.acquire()
+    breaker.release()
+    assert breaker.available()
+
+
+def test_retry_budget_exhaustion():
+    budget = RetryBudget(ratio=0.5, burst=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_deadline_raises_and_marks_expiry():
+    seen = []
+
+    async def run():
+        async with deadline(0.01, "test"):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                seen.append(deadline_expired())
+                raise
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run())
+    assert seen == [True]
+
+
+def test_deadline_without_seconds_does_not_limit():
+    async def run():
+        async with deadline(None, "test"):
+            await asyncio.sleep(0.01)
+        return deadline_expired()
+
+    assert asyncio.run(run()) is False
+
+
+def test_expired_deadline_counts_against_backend():
+    pool = make_pool(FakeClient(delay=1))
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(pool.post("/api/generate", {"model": "m"}, route="test", deadline=0.01))
+    backend = pool.backends[0]
+    assert backend.breaker.failures == 1
+    assert backend.outstanding == 0
+
+
+def test_cancellation_without_deadline_does_not_count():
+    pool = make_pool(FakeClient(delay=1))
+
+    async def run():
+        task = asyncio.create_task(pool.post("/api/generate", {"model": "m"}, route="test"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert pool.backends[0].breaker.failures == 0
+
+
+def test_failed_probes_count_toward_max_failures():
+    pool = make_pool(FakeClient(down=True), max_failures=2)
+    backend = pool.backends[0]
+    asyncio.run(pool.probe(backend))
+    assert backend.breaker.state == "closed"
+    asyncio.run(pool.probe(backend))
+    assert backend.breaker.state == "open"
+
+
+def test_failed_probe_reopens_half_open_breaker():
+    pool = make_pool(FakeClient(down=True), max_failures=1)
+    backend = pool.backends[0]
+    backend.breaker.base_cooldown = backend.breaker.cooldown = 0
+    backend.breaker.record_failure()
+    backend.breaker.acquire()
+    assert backend.breaker.state == "half_open"
+    asyncio.run(pool.probe(backend))
+    assert backend.breaker.state == "open"
+
+
+def test_successful_probe_closes_breaker():
+    client = FakeClient(down=True)
+    pool = make_pool(client, max_failures=1)
+    backend = pool.backends[0]
+    asyncio.run(pool.probe(backend))
+    assert backend.breaker.state == "open"
+    client.down = False
+    asyncio.run(pool.probe(backend))
+    assert backend.breaker.state == "closed"
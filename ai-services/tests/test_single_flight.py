@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.services.resilience import DeadlineExceededError
+from app.services.single_flight import SharedFlightError, SingleFlight
+
+
+def test_key_normalizes_whitespace_only():
+    key = SingleFlight.key("response", "ruta", "modelo", "Hola   mundo\n")
+    assert key == SingleFlight.key("response", "ruta", "modelo", " Hola mundo")
+    assert key != SingleFlight.key("response", "ruta", "modelo", "hola mundo")
+    assert key != SingleFlight.key("stream", "ruta", "modelo", "Hola mundo")
+
+
+def test_wrap_keeps_type_and_attributes():
+    error = DeadlineExceededError("ruta", 2.5)
+    wrapped = SharedFlightError.wrap(error)
+    assert isinstance(wrapped, DeadlineExceededError)
+    assert isinstance(wrapped, SharedFlightError)
+    assert wrapped is not error
+    assert str(wrapped) == str(error)
+    assert wrapped.seconds == 2.5
+
+
+def test_do_shares_result():
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "respuesta"
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", "ruta", call) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["respuesta"] * 3
+    assert calls == [1]
+    assert flights.saved == {"ruta": 2}
+
+
+def test_do_raises_a_fresh_error_per_subscriber():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise DeadlineExceededError("ruta", 1)
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", "ruta", call) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert len({id(e) for e in errors}) == 3
+    causes = {id(e.__cause__) for e in errors}
+    assert len(causes) == 1
+    for error in errors:
+        assert isinstance(error, DeadlineExceededError)
+        assert isinstance(error, SharedFlightError)
+        assert type(error.__cause__) is DeadlineExceededError
+
+
+def test_stream_error_is_wrapped_and_retrieved():
+    flights = SingleFlight()
+    tasks = []
+
+    async def events():
+        tasks.append(asyncio.current_task())
+        yield {"token": "a"}
+        await asyncio.sleep(0.01)
+        raise ConnectionError("se cortó")
+
+    async def subscribe():
+        received = []
+        with pytest.raises(ConnectionError) as info:
+            async for event in flights.stream("k", "ruta", events):
+                received.append(event)
+        return received, info.value
+
+    async def run():
+        return await asyncio.gather(subscribe(), subscribe())
+
+    results = asyncio.run(run())
+    assert [received for received, _ in results] == [[{"token": "a"}]] * 2
+    first, second = (error for _, error in results)
+    assert first is not second
+    assert isinstance(first, SharedFlightError)
+    assert first.__cause__ is second.__cause__
+    # La tarea compartida terminó sin excepción propia: nada queda sin recuperar
+    assert tasks[0].done() and not tasks[0].cancelled() and tasks[0].exception() is None
+
+
+def test_disabled_runs_each_call():
+    flights = SingleFlight(enabled=False)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", "ruta", call) for _ in range(2)))
+
+    assert asyncio.run(run()) == [1, 2]
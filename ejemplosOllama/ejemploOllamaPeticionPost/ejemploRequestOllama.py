@@ -1,5 +1,9 @@
+import sys
+
 import requests
-import json
+
+# Decodificador NDJSON incremental (usa orjson si está instalado)
+from ndjson_stream import TokenCoalescer, iter_lines, loads
 
 # Configurar servidor local que usa ollama por defecto
 url = "http://localhost:11434/api/chat"
@@ -22,17 +26,32 @@ try:
     # Check response status
     if response.status_code == 200:
         print("Streaming response from Ollama:")
-        for line in response.iter_lines(decode_unicode=True):
-            if line:  # Ignore empty lines
-                try:
-                    # Parse each line into JSON
-                    json_data = json.loads(line)
-                    # Extrer e imprimir la respuesta
-                    if "message" in json_data and "content" in json_data["message"]:
-                        print(json_data["message"]["content"], end="", flush=True)  
-                except json.JSONDecodeError as e:
-                    print(f"\nFailed to parse line: {line} - Error: {e}")
-        print()  
+        # Se escribe en stdout de a varios tokens (cada 50 ms) en lugar de un flush por token
+        coalescer = TokenCoalescer(max_delay=0.05)
+        # chunk_size=None: los bytes tal como llegan del socket, sin esperar a completar líneas
+        for line in iter_lines(response.iter_content(chunk_size=None)):
+            try:
+                json_data = loads(line)
+            except ValueError as e:
+                print(f"\nFailed to parse line: {line!r} - Error: {e}")
+                continue
+            # Ollama informa los errores en medio del stream como una línea {"error": ...}
+            if "error" in json_data:
+                text = coalescer.flush()
+                if text:
+                    sys.stdout.write(text)
+                print(f"\nError from Ollama: {json_data['error']}")
+                break
+            # Extrer e imprimir la respuesta
+            text = coalescer.add(json_data.get("message", {}).get("content", ""))
+            if text:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+        else:
+            text = coalescer.flush()
+            if text:
+                sys.stdout.write(text)
+            print()
     else:
         print(f"Error: {response.status_code}")
         print(response.text)
@@ -0,0 +1,69 @@
+"""
+Lectura incremental del NDJSON que devuelve Ollama en streaming (un objeto JSON por línea).
+
+Copia reducida de ai-services/app/services/ndjson.py para que el ejemplo funcione por sí solo.
+Con orjson instalado se usa para decodificar; si no, json de la biblioteca estándar.
+"""
+
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def iter_lines(chunks):
+    """
+    Genera las líneas completas (bytes, sin el salto de línea) de un iterable de bytes, como
+    requests `iter_content(chunk_size=None)`. Los pedazos se juntan solo si una línea quedó
+    partida entre dos.
+    """
+    pending = b""
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+        lines = chunk.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+class TokenCoalescer:
+    """
+    Junta fragmentos de texto de un stream para escribirlos de a varios.
+
+    add() devuelve el texto a escribir o None si conviene esperar: se escribe cuando pasaron
+    `max_delay` segundos desde la última escritura o se juntaron `max_chars` caracteres. El primer
+    fragmento sale enseguida y al final hay que llamar a flush().
+    """
+
+    def __init__(self, max_delay: float = 0.05, max_chars: int = 256):
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._last = float("-inf")
+
+    def add(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or time.monotonic() - self._last >= self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Devuelve lo acumulado (None si no hay nada) y reinicia la ventana."""
+        self._last = time.monotonic()
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return text
@@ -104,6 +104,9 @@ print("Comienzo ejecución código ejemplo SequentialChain")
 from langchain.chains import (
     SequentialChain,
 )  # Cadena secuencial para múltiples entradas/salidas
+from cadena_paralela import (
+    ParallelSequentialChain,
+)  # Igual que SequentialChain pero ejecuta en paralelo los pasos independientes
 
 
 # Plantilla de prompt 1: traducir una reseña al inglés
@@ -159,8 +162,11 @@ Cadena secuencial que procesa una reseña a través de cuatro pasos:
 2. Resume la reseña.
 3. Detecta el idioma original.
 4. Genera un mensaje de seguimiento.
+
+El paso 3 solo depende de la reseña original, así que ParallelSequentialChain lo ejecuta en
+paralelo con los pasos 1 y 2; el resultado es el mismo que con SequentialChain.
 """
-overall_chain = SequentialChain(
+overall_chain = ParallelSequentialChain(
     chains=[chain_one, chain_two, chain_three, chain_four],  # Cadenas a ejecutar
     input_variables=["Review"],  # Variable de entrada
     output_variables=[
@@ -168,7 +174,8 @@ overall_chain = SequentialChain(
         "summary",
         "followup_message",
     ],  # Variables de salida
-    verbose=True,  # Muestra detalles del proceso
+    verbose=True,  # Muestra detalles del proceso y el camino crítico
+    timings_key="tiempos",  # Agrega al resultado la latencia de cada paso y del camino crítico
 )
 
 # Obtener la reseña del DataFrame y ejecutar la cadena
@@ -180,6 +187,11 @@ try:
     print("Reseña traducida al inglés:", resultado["English_Review"])
     print("Resumen:", resultado["summary"])
     print("Mensaje de seguimiento:", resultado["followup_message"])
+    print(
+        "Camino crítico:",
+        " -> ".join(resultado["tiempos"]["critical_path"]),
+        f"({resultado['tiempos']['critical_path_ms']:.0f} ms de {resultado['tiempos']['sequential_ms']:.0f} ms en serie)",
+    )
 except KeyError as e:
     print(f"Error: No se encontró la clave {e} en el resultado")
 except TypeError as e:
@@ -0,0 +1,234 @@
+"""
+Versión masiva del ejemplo SequentialChain de 3-SequentialChainLlama3.2.py: traduce, resume, detecta el
+idioma y genera un mensaje de seguimiento para TODAS las reseñas de un CSV, no solo para df.Review[9].
+
+Descripción:
+    Lee el CSV por bloques (no lo carga entero en memoria) y procesa las filas en paralelo con un
+    número configurable de hilos. Cada fila pasa por los cuatro pasos de la cadena secuencial original
+    (English_Review -> summary, language -> followup_message) y se mide cuánto tarda cada paso.
+    Los resultados se escriben en archivos Parquet parciales dentro de <salida>.partes/, que hacen de
+    checkpoint: si el proceso se corta, al volver a ejecutarlo se saltan las filas que ya terminaron
+    bien y se reintentan las que fallaron. Al final se juntan todas las partes en un único Parquet.
+
+Entradas:
+    - CSV con una columna de reseñas (por defecto Data.csv, columna Review).
+    - Servidor de Ollama con el modelo llama3.2 (por defecto http://localhost:11434).
+
+Salidas:
+    - <salida> (por defecto resenas_procesadas.parquet): una fila por reseña con fila, Review,
+      English_Review, summary, language, followup_message, error y la latencia de cada paso en ms.
+    - Progreso periódico por consola (filas/min y p50/p95 de cada paso) y un resumen final.
+
+Uso:
+    python 3-SequentialChainMasivoLlama3.2.py --entrada Data.csv --trabajadores 8
+    python 3-SequentialChainMasivoLlama3.2.py --entrada resenas.csv --salida resenas.parquet --bloque 5000
+
+Dependencias:
+    - langchain, langchain-ollama, pandas, pyarrow
+"""
+
+import argparse
+import glob
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama import ChatOllama
+
+llm_model = "llama3.2:latest"
+
+# Los mismos cuatro pasos de la SequentialChain del ejemplo original: (clave de salida, plantilla).
+# Cada paso recibe todas las claves calculadas hasta ese momento, igual que en SequentialChain.
+STEPS = [
+    ("English_Review", "Translate the following review to english:\n\n{Review}"),
+    ("summary", "Can you summarize the following review in 1 sentence:\n\n{English_Review}"),
+    ("language", "What language is the following review:\n\n{Review}"),
+    (
+        "followup_message",
+        "Write a follow up response to the following summary in the specified language:"
+        "\n\nSummary: {summary}\n\nLanguage: {language}",
+    ),
+]
+
+
+def build_chains(model: str, base_url: str, temperature: float) -> list:
+    """Una cadena prompt | llm | texto por paso; ChatOllama es seguro de usar desde varios hilos."""
+    llm = ChatOllama(temperature=temperature, model=model, base_url=base_url)
+    return [(key, ChatPromptTemplate.from_template(template) | llm | StrOutputParser()) for key, template in STEPS]
+
+
+def process_row(chains: list, row_id: int, review: str) -> dict:
+    """Ejecuta los pasos en orden para una reseña; si un paso falla se guarda el error y se sigue con la próxima fila."""
+    values = {"Review": review}
+    latencies = {}
+    error = None
+    for key, chain in chains:
+        started = time.perf_counter()
+        try:
+            values[key] = chain.invoke(values)
+        except Exception as e:
+            error = f"{key}: {type(e).__name__}: {e}"
+            break
+        finally:
+            latencies[f"{key}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    result = {"fila": row_id, "Review": review}
+    result.update({key: values.get(key) for key, _ in STEPS})
+    result["error"] = error
+    result.update({f"{key}_ms": latencies.get(f"{key}_ms") for key, _ in STEPS})
+    return result
+
+
+class Progress:
+    """Cuenta filas terminadas y latencias por paso, y las imprime cada `every` segundos."""
+
+    def __init__(self, every: float):
+        self.every = every
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.done = 0
+        self.failed = 0
+        self.step_ms = {key: [] for key, _ in STEPS}
+        self.lock = threading.Lock()
+
+    def add(self, result: dict):
+        with self.lock:
+            self.done += 1
+            self.failed += result["error"] is not None
+            for key, _ in STEPS:
+                if result[f"{key}_ms"] is not None:
+                    self.step_ms[key].append(result[f"{key}_ms"])
+
+    def rows_per_minute(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed * 60 if elapsed else 0.0
+
+    def maybe_report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.every:
+            return
+        self.last_report = now
+        steps = "  ".join(
+            f"{key} p50 {percentile(values, 50):.0f}/p95 {percentile(values, 95):.0f} ms"
+            for key, values in self.step_ms.items()
+            if values
+        )
+        print(f"[{now - self.started:7.0f}s] {self.done} filas ({self.failed} con error), {self.rows_per_minute():.1f} filas/min  {steps}")
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def completed_rows(parts_dir: str) -> set:
+    """Filas que ya terminaron sin error en una ejecución anterior (las que fallaron se reintentan)."""
+    done = set()
+    for name in glob.glob(os.path.join(parts_dir, "parte-*.parquet")):
+        part = pd.read_parquet(name, columns=["fila", "error"])
+        done.update(part.loc[part["error"].isna(), "fila"].tolist())
+    return done
+
+
+def write_part(parts_dir: str, results: list):
+    """Escribe un Parquet parcial; se escribe a un temporal y se renombra para que un corte no deje partes a medias."""
+    if not results:
+        return
+    name = os.path.join(parts_dir, f"parte-{time.time_ns()}.parquet")
+    pd.DataFrame(results).to_parquet(name + ".tmp", index=False)
+    os.replace(name + ".tmp", name)
+
+
+def merge_parts(parts_dir: str, output: str) -> pd.DataFrame:
+    """Junta las partes en un único Parquet, quedándose con el último resultado de cada fila."""
+    names = sorted(glob.glob(os.path.join(parts_dir, "parte-*.parquet")))
+    if not names:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_parquet(name) for name in names], ignore_index=True)
+    df = df.drop_duplicates("fila", keep="last").sort_values("fila")
+    df.to_parquet(output, index=False)
+    return df
+
+
+def pending_rows(path: str, column: str, chunk_size: int, done: set):
+    """Recorre el CSV por bloques y entrega (fila, reseña) de las filas que faltan procesar."""
+    offset = 0
+    for chunk in pd.read_csv(path, usecols=[column], chunksize=chunk_size):
+        for row_id, review in enumerate(chunk[column].tolist(), start=offset):
+            if row_id not in done and isinstance(review, str) and review.strip():
+                yield row_id, review
+        offset += len(chunk)
+
+
+def run(args):
+    parts_dir = args.salida + ".partes"
+    os.makedirs(parts_dir, exist_ok=True)
+    done = completed_rows(parts_dir)
+    if done:
+        print(f"Retomando: {len(done)} filas ya procesadas en {parts_dir}")
+
+    chains = build_chains(args.modelo, args.base_url, args.temperatura)
+    progress = Progress(args.reporte)
+    buffer = []
+    # Se mantienen como mucho 2 filas por hilo en vuelo para no leer todo el CSV de antemano
+    max_in_flight = args.trabajadores * 2
+
+    with ThreadPoolExecutor(max_workers=args.trabajadores) as executor:
+        in_flight = set()
+
+        def collect(finished):
+            for future in finished:
+                result = future.result()
+                progress.add(result)
+                buffer.append(result)
+            if len(buffer) >= args.lote_escritura:
+                write_part(parts_dir, buffer)
+                buffer.clear()
+            progress.maybe_report()
+
+        try:
+            for row_id, review in pending_rows(args.entrada, args.columna, args.bloque, done):
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight.add(executor.submit(process_row, chains, row_id, review))
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+        except KeyboardInterrupt:
+            print("\nInterrumpido: se guardan las filas terminadas; volver a ejecutar para continuar.")
+            for future in in_flight:
+                future.cancel()
+            raise
+        finally:
+            write_part(parts_dir, buffer)
+
+    progress.maybe_report(force=True)
+    df = merge_parts(parts_dir, args.salida)
+    print(f"\nResultado en {args.salida}: {len(df)} filas, {int(df['error'].notna().sum()) if len(df) else 0} con error")
+    print(f"Esta ejecución: {progress.done} filas en {time.perf_counter() - progress.started:.1f} s ({progress.rows_per_minute():.1f} filas/min)")
+    for key, values in progress.step_ms.items():
+        if values:
+            print(f"  {key:<18} p50 {percentile(values, 50):8.0f} ms   p95 {percentile(values, 95):8.0f} ms   media {sum(values) / len(values):8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entrada", default="Data.csv", help="CSV con las reseñas")
+    parser.add_argument("--columna", default="Review", help="columna con el texto de la reseña")
+    parser.add_argument("--salida", default="resenas_procesadas.parquet", help="Parquet de salida")
+    parser.add_argument("--trabajadores", type=int, default=4, help="filas procesadas en paralelo")
+    parser.add_argument("--bloque", type=int, default=10_000, help="filas leídas del CSV por bloque")
+    parser.add_argument("--lote-escritura", type=int, default=200, help="filas por archivo Parquet parcial (checkpoint)")
+    parser.add_argument("--reporte", type=float, default=30.0, help="segundos entre reportes de progreso")
+    parser.add_argument("--modelo", default=llm_model)
+    parser.add_argument("--base-url", default=os.getenv("OLLAMA_API_URL", "http://localhost:11434"))
+    parser.add_argument("--temperatura", type=float, default=0.9)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
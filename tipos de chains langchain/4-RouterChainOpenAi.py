@@ -4,8 +4,11 @@ from langchain.prompts import PromptTemplate
 import os
 from dotenv import load_dotenv, find_dotenv
 from langchain_openai import ChatOpenAI  # Modelo de chat de OpenAI
+from langchain_openai import OpenAIEmbeddings  # Embeddings para el enrutador
 from langchain.prompts import ChatPromptTemplate  # Plantilla para prompts
 from langchain.chains import LLMChain
+from enrutador_centroides import CentroidRouter, CentroidRouterChain
+from despacho_especulativo import SpeculativeMultiPromptChain
 
 # Cargar variables de entorno desde el archivo .env
 # Esto permite acceder a OPENAI_API_KEY de forma segura
@@ -16,6 +19,13 @@ temp = 0  # Temperatura del modelo para respuestas más determinísticas
 llm_model = "gpt-3.5-turbo"
 llm = ChatOpenAI(temperature=temp, model=llm_model)
 
+# Cómo se elige el destino de cada pregunta:
+#   "centroides":   solo el enrutador por embeddings (sin generación extra, lo más rápido)
+#   "especulativo": decide LLMRouterChain, pero mientras tanto ya se ejecuta el destino que predicen
+#                   los embeddings (o una decisión anterior para la misma pregunta); si acierta se
+#                   ahorra la espera del router
+modo_enrutamiento = "centroides"
+
 # Definir plantillas de prompts para diferentes áreas de conocimiento
 physics_template = """
 Eres un profesor de física muy inteligente.
@@ -58,27 +68,47 @@ Eres excelente respondiendo preguntas de programación.
 Aquí hay una pregunta:
 {input}"""
 
-# Lista de prompts con su respectiva descripción
+# Lista de prompts con su respectiva descripción y consultas de ejemplo (las usa el enrutador)
 prompt_infos = [
     {
         "name": "physics",
         "description": "Good for answering questions about physics",
         "prompt_template": physics_template,
+        "examples": [
+            "¿Qué es la radiación del cuerpo negro?",
+            "¿Por qué el cielo es azul?",
+            "Explica la segunda ley de la termodinámica",
+        ],
     },
     {
         "name": "math",
         "description": "Good for answering math questions",
         "prompt_template": math_template,
+        "examples": [
+            "Cuánto es 2 + 2",
+            "Resuelve la ecuación 3x - 5 = 10",
+            "¿Cuál es la derivada de x al cuadrado?",
+        ],
     },
     {
         "name": "history",
         "description": "Good for answering history questions",
         "prompt_template": history_template,
+        "examples": [
+            "¿Quién es Manuel Belgrano?",
+            "¿Cuáles fueron las causas de la Revolución Francesa?",
+            "¿Cómo cayó el Imperio Romano de Occidente?",
+        ],
     },
     {
         "name": "computer science",
         "description": "Good for answering computer science questions",
         "prompt_template": computerscience_template,
+        "examples": [
+            "¿Cuál es el rol del Scheduler y del Dispatcher en un SO?",
+            "¿Qué diferencia hay entre un proceso y un hilo?",
+            "¿Cómo se implementa una lista enlazada en Python?",
+        ],
     },
 ]
 
@@ -91,7 +121,18 @@ for p_info in prompt_infos:
     chain = LLMChain(llm=llm, prompt=prompt)
     destination_chains[name] = chain
 
-# Crear la lista de destinos en formato de cadena
+# Crear el enrutador por embeddings
+# En lugar de LLMRouterChain (una generación completa del LLM antes de cada respuesta), se
+# precalcula un centroide por destino con su descripción y ejemplos, y cada pregunta se enruta
+# con un embedding y una comparación de similitud. Por debajo del umbral se usa default_chain.
+embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+router = CentroidRouter(
+    embeddings,
+    {p["name"]: {"description": p["description"], "examples": p["examples"]} for p in prompt_infos},
+    threshold=0.5,
+)
+
+# Crear la lista de destinos en formato de cadena (para el router con LLM del modo especulativo)
 destinations = [f"{p['name']}: {p['description']}" for p in prompt_infos]
 destinations_str = "\n".join(destinations)
 
@@ -119,22 +160,32 @@ Return a markdown code snippet con un objeto JSON con el siguiente formato:
 << OUTPUT >>
 ```json"""
 
-# Crear el enrutador de prompts
-router_template = MULTI_PROMPT_ROUTER_TEMPLATE.format(destinations=destinations_str)
-router_prompt = PromptTemplate(
-    template=router_template,
-    input_variables=["input"],
-    output_parser=RouterOutputParser(),
-)
-router_chain = LLMRouterChain.from_llm(llm, router_prompt)
-
-# Configurar la cadena MultiPromptChain para manejar múltiples áreas de conocimiento
-chain = MultiPromptChain(
-    router_chain=router_chain,
-    destination_chains=destination_chains,
-    default_chain=LLMChain(llm=llm, prompt=ChatPromptTemplate.from_template("{input}")),
-    verbose=True,
-)
+default_chain = LLMChain(llm=llm, prompt=ChatPromptTemplate.from_template("{input}"))
+
+if modo_enrutamiento == "especulativo":
+    # Crear el enrutador de prompts con LLM, que es el que decide
+    router_template = MULTI_PROMPT_ROUTER_TEMPLATE.format(destinations=destinations_str)
+    router_prompt = PromptTemplate(
+        template=router_template,
+        input_variables=["input"],
+        output_parser=RouterOutputParser(),
+    )
+    # Configurar la cadena que arranca el destino predicho mientras LLMRouterChain decide
+    chain = SpeculativeMultiPromptChain(
+        router_chain=LLMRouterChain.from_llm(llm, router_prompt),
+        destination_chains=destination_chains,
+        default_chain=default_chain,
+        predictor=lambda query: router.classify(query)[0],
+        verbose=True,
+    )
+else:
+    # Configurar la cadena MultiPromptChain para manejar múltiples áreas de conocimiento
+    chain = MultiPromptChain(
+        router_chain=CentroidRouterChain(router=router, verbose=True),
+        destination_chains=destination_chains,
+        default_chain=default_chain,
+        verbose=True,
+    )
 
 # Invocar la cadena con distintas preguntas y mostrar las respuestas
 pregunta1 = chain.invoke("¿Qué es la radiación del cuerpo negro?")
@@ -148,3 +199,7 @@ print(pregunta3["text"])
 
 pregunta4 = chain.invoke("¿Cuál es el rol del Scheduler y del Dispatcher en un SO?")
 print(pregunta4["text"])
+
+if modo_enrutamiento == "especulativo":
+    # Aciertos de la especulación y latencia ahorrada respecto de esperar al router
+    print(chain.speculation_stats())
@@ -2,6 +2,8 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv, find_dotenv
+from langchain_openai import OpenAIEmbeddings  # Embeddings de OpenAI para el enrutador
+from enrutador_centroides import CentroidRouter  # Enrutador por similitud de embeddings
 import os
 from typing import Dict
 
@@ -93,10 +95,63 @@ cs_chain = cs_prompt | llm  # Cadena para ciencias de la computación: prompt +
 default_chain = default_prompt | llm  # Cadena por defecto: prompt + modelo
 
 
+# Modelo de embeddings para enrutar: una llamada barata por consulta, sin generar texto
+embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+
+# Destinos del enrutador: una descripción y consultas de ejemplo por especialidad.
+# Con ellas se calcula un centroide por destino al iniciar (una sola llamada de embeddings).
+destinations = {
+    "physics": {
+        "description": "Preguntas sobre física: mecánica, termodinámica, electromagnetismo, óptica, radiación y energía",
+        "examples": [
+            "¿Qué es la radiación del cuerpo negro?",
+            "¿Por qué el cielo es azul?",
+            "Explica la segunda ley de la termodinámica",
+            "¿Cómo funciona la gravedad según la relatividad general?",
+        ],
+    },
+    "math": {
+        "description": "Preguntas de matemáticas: cálculos, álgebra, geometría, probabilidad y demostraciones",
+        "examples": [
+            "Cuanto es 2 + 2",
+            "Resuelve la ecuación 3x - 5 = 10",
+            "¿Cuál es la derivada de x al cuadrado?",
+            "Demuestra que la raíz de 2 es irracional",
+        ],
+    },
+    "history": {
+        "description": "Preguntas de historia: personajes, eventos, guerras, revoluciones y períodos históricos",
+        "examples": [
+            "Quien es Manuel Belgrano?",
+            "¿Cuáles fueron las causas de la Revolución Francesa?",
+            "¿Qué pasó en la Revolución de Mayo de 1810?",
+            "¿Cómo cayó el Imperio Romano de Occidente?",
+        ],
+    },
+    "computer science": {
+        "description": "Preguntas de ciencias de la computación: programación, algoritmos, estructuras de datos y sistemas operativos",
+        "examples": [
+            "Cual es el rol del Scheduler y del Dispatcher en un SO",
+            "¿Qué es la complejidad temporal de un algoritmo de ordenamiento?",
+            "¿Cómo se implementa una lista enlazada en Python?",
+            "¿Qué diferencia hay entre un proceso y un hilo?",
+        ],
+    },
+}
+destination_chains = {
+    "physics": physics_chain,
+    "math": math_chain,
+    "history": history_chain,
+    "computer science": cs_chain,
+}
+# Por debajo de esta similitud la consulta va a la cadena por defecto (depende del modelo de embeddings)
+router = CentroidRouter(embeddings, destinations, threshold=0.5)
+
+
 # Función de enrutamiento
 def route_query(query: str) -> RunnableLambda:
     """
-    Enruta una consulta a la cadena de especialización adecuada según palabras clave.
+    Enruta una consulta a la cadena de especialización más parecida según sus embeddings.
 
     Args:
         query (str): La consulta ingresada por el usuario.
@@ -104,34 +159,13 @@ def route_query(query: str) -> RunnableLambda:
     Returns:
         RunnableLambda: La cadena correspondiente (física, matemáticas, historia, ciencias de la computación o por defecto).
 
-    Esta función analiza la consulta en minúsculas y busca palabras clave específicas para determinar
-    qué cadena de especialización debe manejar la solicitud. Si no encuentra coincidencias, usa la cadena por defecto.
+    Calcula el embedding de la consulta y lo compara contra el centroide de cada destino; no llama
+    al LLM, así que el enrutamiento cuesta un embedding. Si ningún destino supera el umbral, usa la
+    cadena por defecto.
     """
-    query_lower = (
-        query.lower()
-    )  # Convertir la consulta a minúsculas para coincidencias insensibles a mayúsculas
-    if any(
-        keyword in query_lower
-        for keyword in ["física", "radiación", "cuerpo negro", "energía"]
-    ):
-        return physics_chain  # Enrutar a física si hay palabras clave relacionadas
-    elif any(
-        keyword in query_lower
-        for keyword in ["cuanto", "+", "-", "*", "/", "matemáticas"]
-    ):
-        return math_chain  # Enrutar a matemáticas si hay operadores o términos relacionados
-    elif any(
-        keyword in query_lower
-        for keyword in ["quién", "historia", "belgrano", "pasado"]
-    ):
-        return history_chain  # Enrutar a historia si hay términos históricos o preguntas sobre personas
-    elif any(
-        keyword in query_lower
-        for keyword in ["scheduler", "dispatcher", "so", "computación"]
-    ):
-        return cs_chain  # Enrutar a ciencias de la computación si hay términos técnicos de programación
-    else:
-        return default_chain  # Usar la cadena por defecto si no hay coincidencias
+    destination, score = router.classify(query)
+    print(f"Destino: {destination or 'default'} (similitud {score:.2f})")
+    return destination_chains.get(destination, default_chain)
 
 
 # Cadena principal usando RunnableLambda
@@ -0,0 +1,165 @@
+"""
+SequentialChain que ejecuta en paralelo los pasos que no dependen entre sí.
+
+Descripción:
+    SequentialChain ejecuta las cadenas una detrás de otra aunque algunas no usen la salida de las
+    anteriores. En el ejemplo de reseñas, la detección de idioma (chain_three) solo necesita {Review},
+    pero espera a que terminen la traducción y el resumen. ParallelSequentialChain arma un grafo con
+    las claves de entrada y salida de cada paso (un paso depende de los que producen alguna de sus
+    input_keys) y lanza cada paso apenas terminan sus dependencias:
+
+        Review ──> English_Review ──> summary ──┐
+           └─────> language ────────────────────┴──> followup_message
+
+    Acepta los mismos argumentos que SequentialChain (misma validación de claves) y devuelve el mismo
+    resultado, así que se puede reemplazar una por otra. En cada invocación calcula el camino crítico:
+    la cadena de dependencias más lenta, que es el mínimo que puede tardar la invocación aunque haya
+    paralelismo. Con verbose=True se imprime; con timings_key="tiempos" se agrega al resultado.
+
+Uso:
+    from cadena_paralela import ParallelSequentialChain
+
+    overall_chain = ParallelSequentialChain(
+        chains=[chain_one, chain_two, chain_three, chain_four],
+        input_variables=["Review"],
+        output_variables=["English_Review", "summary", "followup_message"],
+        timings_key="tiempos",
+    )
+    resultado = overall_chain.invoke(review)
+    print(resultado["tiempos"]["critical_path"], resultado["tiempos"]["critical_path_ms"])
+
+Dependencias:
+    - langchain
+"""
+
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+from langchain.chains import SequentialChain
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+
+
+class ParallelSequentialChain(SequentialChain):
+    """SequentialChain que respeta las dependencias entre pasos en lugar del orden de la lista."""
+
+    # Hilos para los pasos en paralelo (None = tantos como pasos)
+    max_workers: Optional[int] = None
+    # Si se define, el resultado incluye bajo esta clave los tiempos de la invocación
+    timings_key: Optional[str] = None
+
+    @property
+    def output_keys(self) -> list[str]:
+        return self.output_variables + ([self.timings_key] if self.timings_key else [])
+
+    def dependencies(self) -> list[set]:
+        """Para cada paso, los índices de los pasos anteriores que producen alguna de sus entradas."""
+        producers = {}
+        deps = []
+        for i, chain in enumerate(self.chains):
+            deps.append({producers[key] for key in chain.input_keys if key in producers})
+            for key in chain.output_keys:
+                producers[key] = i
+        return deps
+
+    def _step_name(self, i: int) -> str:
+        return ",".join(self.chains[i].output_keys)
+
+    def _timings(self, deps: list, durations: dict, wall: float) -> dict:
+        """Camino crítico: el paso que termina más tarde si cada uno arranca al terminar sus dependencias."""
+        finish = {}
+        previous = {}
+        for i in range(len(self.chains)):
+            slowest = max(deps[i], key=lambda d: finish[d], default=None)
+            previous[i] = slowest
+            finish[i] = durations[i] + (finish[slowest] if slowest is not None else 0.0)
+        path = []
+        step = max(finish, key=finish.get)
+        while step is not None:
+            path.append(self._step_name(step))
+            step = previous[step]
+        return {
+            "steps_ms": {self._step_name(i): round(durations[i] * 1000, 1) for i in range(len(self.chains))},
+            "critical_path": path[::-1],
+            "critical_path_ms": round(max(finish.values()) * 1000, 1),
+            "sequential_ms": round(sum(durations.values()) * 1000, 1),
+            "wall_ms": round(wall * 1000, 1),
+        }
+
+    def _outputs(self, known_values: dict, deps: list, durations: dict, started: float) -> dict[str, Any]:
+        timings = self._timings(deps, durations, time.perf_counter() - started)
+        if self.verbose:
+            print(
+                f"Camino crítico {' -> '.join(timings['critical_path'])}: {timings['critical_path_ms']:.0f} ms "
+                f"(en serie serían {timings['sequential_ms']:.0f} ms, total {timings['wall_ms']:.0f} ms)"
+            )
+        outputs = {k: known_values[k] for k in self.output_variables}
+        if self.timings_key:
+            outputs[self.timings_key] = timings
+        return outputs
+
+    def _call(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        known_values = inputs.copy()
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        deps = self.dependencies()
+        durations = {}
+        started = time.perf_counter()
+
+        def run_step(i: int, values: dict):
+            step_started = time.perf_counter()
+            outputs = self.chains[i].invoke(values, config={"callbacks": _run_manager.get_child()}, return_only_outputs=True)
+            return i, outputs, time.perf_counter() - step_started
+
+        pending = set(range(len(self.chains)))
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(self.chains)) as executor:
+            running = set()
+            while pending or running:
+                # known_values solo se modifica en este hilo, así que cada paso recibe una copia consistente
+                ready = [i for i in sorted(pending) if deps[i] <= durations.keys()]
+                for i in ready:
+                    pending.discard(i)
+                    running.add(executor.submit(run_step, i, dict(known_values)))
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i, outputs, elapsed = future.result()
+                    known_values.update(outputs)
+                    durations[i] = elapsed
+        return self._outputs(known_values, deps, durations, started)
+
+    async def _acall(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        known_values = inputs.copy()
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        deps = self.dependencies()
+        durations = {}
+        started = time.perf_counter()
+        done = {i: asyncio.Event() for i in range(len(self.chains))}
+
+        async def run_step(i: int):
+            for d in deps[i]:
+                await done[d].wait()
+            step_started = time.perf_counter()
+            outputs = await self.chains[i].ainvoke(
+                dict(known_values), config={"callbacks": _run_manager.get_child()}, return_only_outputs=True
+            )
+            known_values.update(outputs)
+            durations[i] = time.perf_counter() - step_started
+            done[i].set()
+
+        tasks = [asyncio.ensure_future(run_step(i)) for i in range(len(self.chains))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Si un paso falla, los que esperan su salida nunca arrancarían
+            for task in tasks:
+                task.cancel()
+            raise
+        return self._outputs(known_values, deps, durations, started)
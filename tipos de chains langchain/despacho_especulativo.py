@@ -0,0 +1,206 @@
+"""
+MultiPromptChain con despacho especulativo: arranca el destino más probable mientras el router decide.
+
+Descripción:
+    En MultiPromptChain la respuesta no empieza hasta que LLMRouterChain termina de generar su JSON
+    con el destino. SpeculativeMultiPromptChain predice el destino con algo barato y lanza esa cadena
+    en paralelo con el router:
+      1. Si la misma consulta (normalizada) ya se enrutó antes, usa esa decisión (caché LRU).
+      2. Si no, pregunta a `predictor` (por ejemplo CentroidRouter.classify de enrutador_centroides).
+    Cuando el router responde, si coincide con la predicción se usa el resultado especulativo (que ya
+    lleva ventaja); si no, se cancela y se ejecuta el destino correcto como siempre. La especulación
+    corre siempre con ainvoke (en invoke, sobre un event loop propio en un hilo aparte), así que
+    cancelarla corta la petición HTTP y el modelo deja de generar la respuesta descartada.
+
+    Se compara solo el destino: LLMRouterChain casi siempre reescribe la consulta en next_inputs,
+    y exigir que coincida descartaría casi todas las especulaciones. En un acierto el destino
+    responde a la consulta original, sin la reescritura del router. Con ignore_rewrites=False el
+    resultado es exactamente el de MultiPromptChain: solo se aprovecha si además next_inputs no
+    cambió.
+
+    `speculation_stats()` devuelve la tasa de aciertos y la latencia ahorrada: en un acierto, lo que
+    habría tardado en serie (router + destino) menos lo que tardó en paralelo.
+
+Uso:
+    chain = SpeculativeMultiPromptChain(
+        router_chain=router_chain,
+        destination_chains=destination_chains,
+        default_chain=default_chain,
+        predictor=lambda query: centroid_router.classify(query)[0],
+    )
+    chain.invoke("¿Qué es la radiación del cuerpo negro?")
+    print(chain.speculation_stats())
+
+Dependencias:
+    - langchain
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from langchain.chains.router import MultiPromptChain
+from langchain.chains.router.base import Route
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from pydantic import PrivateAttr
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin signos de puntuación y con espacios simples: la clave de la caché de decisiones."""
+    return " ".join(re.sub(r"[¿?¡!.,;:]", " ", str(query).lower()).split())
+
+
+class SpeculativeMultiPromptChain(MultiPromptChain):
+    """MultiPromptChain que ejecuta el destino predicho en paralelo con el router."""
+
+    # Función consulta -> nombre de destino (o None si no se anima a predecir)
+    predictor: Optional[Callable[[str], Optional[str]]] = None
+    # Decisiones anteriores del router que se recuerdan
+    cache_size: int = 1024
+    # Aceptar la especulación aunque el router haya reescrito la consulta en next_inputs
+    ignore_rewrites: bool = True
+
+    _decisions: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _stats: dict = PrivateAttr(
+        default_factory=lambda: {"requests": 0, "speculated": 0, "hits": 0, "saved_s": 0.0, "wasted_s": 0.0}
+    )
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    # Event loop en un hilo aparte donde corren las especulaciones de invoke (se crea al primer uso)
+    _loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(default=None)
+
+    def _predict(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._decisions:
+                self._decisions.move_to_end(key)
+                return self._decisions[key]
+        return self.predictor(query) if self.predictor else None
+
+    def _remember(self, query: str, destination: Optional[str]):
+        with self._lock:
+            self._decisions[normalize_query(query)] = destination
+            self._decisions.move_to_end(normalize_query(query))
+            while len(self._decisions) > self.cache_size:
+                self._decisions.popitem(last=False)
+
+    def _is_hit(self, route: Route, predicted: str, inputs: dict) -> bool:
+        return route.destination == predicted and (self.ignore_rewrites or route.next_inputs == inputs)
+
+    def _count(self, speculated: bool = False, hit: bool = False, saved: float = 0.0, wasted: float = 0.0):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["speculated"] += speculated
+            self._stats["hits"] += hit
+            self._stats["saved_s"] += saved
+            self._stats["wasted_s"] += wasted
+
+    def speculation_stats(self) -> dict:
+        """Tasa de aciertos sobre las consultas especuladas y latencia ahorrada (total y por consulta)."""
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "requests": stats["requests"],
+            "speculated": stats["speculated"],
+            "hits": stats["hits"],
+            "hit_rate": round(stats["hits"] / stats["speculated"], 3) if stats["speculated"] else 0.0,
+            "saved_ms_total": round(stats["saved_s"] * 1000, 1),
+            "saved_ms_per_request": round(stats["saved_s"] * 1000 / stats["requests"], 1) if stats["requests"] else 0.0,
+            "wasted_ms_total": round(stats["wasted_s"] * 1000, 1),
+        }
+
+    def _destination(self, route: Route):
+        """La cadena que ejecutaría MultiPromptChain para esta decisión del router."""
+        if not route.destination:
+            return self.default_chain
+        if route.destination in self.destination_chains:
+            return self.destination_chains[route.destination]
+        if self.silent_errors:
+            return self.default_chain
+        raise ValueError(f"Received invalid destination chain name '{route.destination}'")
+
+    def _speculation_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="especulacion", daemon=True).start()
+            return self._loop
+
+    @staticmethod
+    async def _atimed(chain, inputs: dict, callbacks) -> tuple[dict, float]:
+        started = time.perf_counter()
+        return await chain.ainvoke(inputs, config={"callbacks": callbacks}), time.perf_counter() - started
+
+    def _call(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        query = inputs[self.input_keys[0]]
+        predicted = self._predict(query)
+        if predicted not in self.destination_chains:
+            result = super()._call(inputs, run_manager)
+            self._count()
+            return result
+
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        started = time.perf_counter()
+        # Con ainvoke en otro event loop, y no invoke en un hilo, una especulación fallida se puede cancelar
+        speculative = asyncio.run_coroutine_threadsafe(
+            self._atimed(self.destination_chains[predicted], dict(inputs), callbacks), self._speculation_loop()
+        )
+        try:
+            route = self.router_chain.route(inputs, callbacks=callbacks)
+        except BaseException:
+            speculative.cancel()
+            raise
+        router_elapsed = time.perf_counter() - started
+        self._remember(query, route.destination)
+        _run_manager.on_text(f"{route.destination}: {route.next_inputs} (especulado: {predicted})", verbose=self.verbose)
+
+        if self._is_hit(route, predicted, inputs):
+            result, destination_elapsed = speculative.result()
+            # En serie el destino habría arrancado al terminar el router
+            self._count(speculated=True, hit=True, saved=router_elapsed + destination_elapsed - (time.perf_counter() - started))
+            return result
+
+        speculative.cancel()
+        self._count(speculated=True, wasted=time.perf_counter() - started)
+        return self._destination(route).invoke(route.next_inputs, config={"callbacks": callbacks})
+
+    async def _acall(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        query = inputs[self.input_keys[0]]
+        predicted = self._predict(query)
+        if predicted not in self.destination_chains:
+            result = await super()._acall(inputs, run_manager)
+            self._count()
+            return result
+
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        started = time.perf_counter()
+        speculative = asyncio.ensure_future(self._atimed(self.destination_chains[predicted], dict(inputs), callbacks))
+        try:
+            route = await self.router_chain.aroute(inputs, callbacks=callbacks)
+        except BaseException:
+            speculative.cancel()
+            raise
+        router_elapsed = time.perf_counter() - started
+        self._remember(query, route.destination)
+        await _run_manager.on_text(f"{route.destination}: {route.next_inputs} (especulado: {predicted})", verbose=self.verbose)
+
+        if self._is_hit(route, predicted, inputs):
+            result, destination_elapsed = await speculative
+            self._count(speculated=True, hit=True, saved=router_elapsed + destination_elapsed - (time.perf_counter() - started))
+            return result
+
+        speculative.cancel()
+        self._count(speculated=True, wasted=time.perf_counter() - started)
+        return await self._destination(route).ainvoke(route.next_inputs, config={"callbacks": callbacks})
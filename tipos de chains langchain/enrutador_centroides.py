@@ -0,0 +1,121 @@
+"""
+Enrutador de consultas por similitud de embeddings contra centroides precalculados.
+
+Descripción:
+    Reemplaza las dos formas de enrutar de los ejemplos 4-RouterChain*:
+      - route_query por palabras clave (4-RouterChain*Variante.py), que se equivoca seguido porque
+        busca subcadenas: "so" aparece dentro de cualquier palabra y "-" manda casi todo a matemáticas.
+      - LLMRouterChain (4-RouterChainOpenAi.py), que hace una generación completa del LLM solo para
+        elegir el destino antes de empezar la respuesta real.
+
+    Al crear el enrutador se calculan, en una sola llamada de embeddings, los vectores de la
+    descripción y las consultas de ejemplo de cada destino; el promedio normalizado de cada destino
+    es su centroide. Para clasificar una consulta se calcula un único embedding y se compara contra
+    todos los centroides con un producto matriz-vector (similitud coseno). Si la mejor similitud no
+    llega a `threshold` la consulta va a la cadena por defecto. No hay ninguna generación extra: el
+    costo es un embedding (milisegundos en un servidor local) más la multiplicación.
+
+    El umbral depende del modelo de embeddings; `explain` devuelve la similitud con cada destino para
+    ajustarlo con consultas reales.
+
+Uso:
+    router = CentroidRouter(embeddings, destinations, threshold=0.55)
+    nombre, similitud = router.classify("¿Qué es la radiación del cuerpo negro?")  # ("physics", 0.71)
+
+    # Como router_chain de MultiPromptChain (en lugar de LLMRouterChain)
+    chain = MultiPromptChain(router_chain=CentroidRouterChain(router=router), ...)
+
+Dependencias:
+    - langchain, numpy
+"""
+
+from typing import Any, Optional
+
+import numpy as np
+from langchain.chains.router.base import RouterChain
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.embeddings import Embeddings
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class CentroidRouter:
+    """
+    Clasifica consultas entre destinos descritos por una descripción y consultas de ejemplo.
+
+    `destinations` es {nombre: {"description": str, "examples": [str, ...]}}; los ejemplos son
+    opcionales pero mejoran mucho la separación entre destinos parecidos.
+    """
+
+    def __init__(self, embeddings: Embeddings, destinations: dict, threshold: float = 0.5):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.names = list(destinations)
+        texts, owners = [], []
+        for i, name in enumerate(self.names):
+            info = destinations[name]
+            for text in [info["description"], *info.get("examples", [])]:
+                texts.append(text)
+                owners.append(i)
+        vectors = _normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+        owners = np.asarray(owners)
+        # Una fila normalizada por destino: el producto con una consulta normalizada es la similitud coseno
+        self.centroids = _normalize(np.stack([vectors[owners == i].mean(axis=0) for i in range(len(self.names))]))
+
+    def _scores(self, vector: list) -> np.ndarray:
+        return self.centroids @ _normalize(np.asarray(vector, dtype=np.float32))
+
+    def _pick(self, scores: np.ndarray) -> tuple[Optional[str], float]:
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return (self.names[best] if score >= self.threshold else None), score
+
+    def classify(self, query: str) -> tuple[Optional[str], float]:
+        """Devuelve (destino, similitud); el destino es None si la similitud no llega al umbral."""
+        return self._pick(self._scores(self.embeddings.embed_query(query)))
+
+    async def aclassify(self, query: str) -> tuple[Optional[str], float]:
+        return self._pick(self._scores(await self.embeddings.aembed_query(query)))
+
+    def explain(self, query: str) -> dict:
+        """Similitud con cada destino, de mayor a menor (para calibrar el umbral)."""
+        scores = self._scores(self.embeddings.embed_query(query))
+        return dict(sorted(zip(self.names, scores.round(4).tolist()), key=lambda item: -item[1]))
+
+
+class CentroidRouterChain(RouterChain):
+    """RouterChain para MultiPromptChain que enruta con un CentroidRouter en lugar de un LLM."""
+
+    router: Any
+    input_key: str = "input"  #: :meta private:
+
+    @property
+    def input_keys(self) -> list[str]:
+        return [self.input_key]
+
+    def _outputs(self, inputs: dict[str, Any], destination: Optional[str]) -> dict[str, Any]:
+        # destination None hace que MultiPromptChain use la default_chain
+        return {"destination": destination, "next_inputs": {self.input_key: inputs[self.input_key]}}
+
+    def _call(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        destination, score = self.router.classify(inputs[self.input_key])
+        if run_manager:
+            run_manager.on_text(f"destino {destination or 'DEFAULT'} (similitud {score:.3f})\n", verbose=self.verbose)
+        return self._outputs(inputs, destination)
+
+    async def _acall(
+        self,
+        inputs: dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> dict[str, Any]:
+        destination, score = await self.router.aclassify(inputs[self.input_key])
+        if run_manager:
+            await run_manager.on_text(f"destino {destination or 'DEFAULT'} (similitud {score:.3f})\n", verbose=self.verbose)
+        return self._outputs(inputs, destination)